@@ -1,47 +1,334 @@
 #!/usr/bin/env python3
-"""Validate that asset flags in resorts.json match actual files on disk."""
+"""Validate the per-resort assets against resorts.json: piste files, camera angles and webcams.
 
+The piste directory is listed once. Every <slug>.geojson is then checked
+on a process pool:
+- it is a FeatureCollection of LineString runs and lifts with valid
+  coordinates;
+- its nearest vertex lies within NEAR_KM of the resort and its farthest
+  within FAR_KM;
+- its .skp and lod/ variants, when present, hold the same number of
+  features.
+Results are kept in a checksum manifest (.cache/asset-audit.json). A
+file is not parsed again while its size and mtime (or, failing that, its
+SHA-256), its resort's location and its variants' stamps are unchanged.
+
+Cross-checks then compare the files against resorts.json:
+- the pistes flag of every resort, and piste files with no resort;
+- public/data/camera-angles.json, which needs one entry per piste file,
+  centred near its resort;
+- the webcam registry, whose slugs must exist and whose pages must be
+  https URLs.
+
+Exits 1 when any error is found; warnings alone do not fail the audit.
+"""
+
+import argparse
+import hashlib
 import json
+import math
 import os
+import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrument
+import piste_binary
+from piste_output import LOD_DIR
+from resort_store import ResortStore, write_file
 
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-RESORTS_PATH = os.path.join(REPO_ROOT, "assets", "resorts.json")
 PISTES_DIR = os.path.join(REPO_ROOT, "public", "data", "pistes")
+CAMERA_ANGLES_PATH = os.path.join(REPO_ROOT, "public", "data", "camera-angles.json")
+WEBCAMS_PATH = os.path.join(REPO_ROOT, "src", "app", "utils", "webcamRegistry.js")
+MANIFEST_PATH = os.path.join(REPO_ROOT, ".cache", "asset-audit.json")
+AUDIT_VERSION = 1
 
+# The fetchers select ways passing within 5-8 km of the resort; ways can run on well past that.
+NEAR_KM = 10
+FAR_KM = 30
+TYPES = {"run", "lift"}
+DIFFICULTIES = {"", "green", "blue", "red", "black"}
+EARTH_RADIUS_KM = 6371.0
+_WEBCAM = re.compile(r'^\s*"([^"]+)":\s*\{(.*?)^\s*\},?', re.M | re.S)
+_CAM_PAGE = re.compile(r'camPageUrl:\s*"([^"]*)"')
 
-def audit():
-    with open(RESORTS_PATH) as f:
-        data = json.load(f)
 
+def distances_km(lat, lng, points):
+    """Great-circle distance from (lat, lng) to each [lon, lat] row of points."""
+    lat1, lat2 = math.radians(lat), np.radians(points[:, 1])
+    dlat = lat2 - lat1
+    dlng = np.radians(points[:, 0] - lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def check_collection(data, resort):
+    """Summary and errors for one piste FeatureCollection; resort is its (lng, lat) or None."""
     errors = []
-    for feat in data["features"]:
-        props = feat["properties"]
-        slug = props.get("slug", "unknown")
-        assets = props.get("assets")
+    if not isinstance(data, dict) or data.get("type") != "FeatureCollection" \
+            or not isinstance(data.get("features"), list):
+        return {"features": 0}, ["not a FeatureCollection"]
+    features = data["features"]
+    summary = {"features": len(features), "runs": 0, "lifts": 0, "vertices": 0}
+    if not features:
+        errors.append("no features")
+    lines = []
+    for i, feat in enumerate(features):
+        if not isinstance(feat, dict):
+            errors.append(f"feature {i}: not an object")
+            continue
+        props = feat.get("properties") or {}
+        geom = feat.get("geometry") or {}
+        coords = geom.get("coordinates")
+        if geom.get("type") != "LineString" or not isinstance(coords, list) or len(coords) < 2:
+            errors.append(f"feature {i}: not a LineString of 2+ positions")
+            continue
+        try:
+            line = np.array([c[:2] for c in coords], dtype=np.float64)
+        except (TypeError, ValueError, IndexError):
+            errors.append(f"feature {i}: malformed positions")
+            continue
+        if line.shape[1:] != (2,) or not np.isfinite(line).all() \
+                or (np.abs(line) > (180, 90)).any():
+            errors.append(f"feature {i}: coordinates out of range")
+            continue
+        if props.get("type") not in TYPES:
+            errors.append(f"feature {i}: type {props.get('type')!r}")
+        elif props.get("difficulty", "") not in DIFFICULTIES:
+            errors.append(f"feature {i}: difficulty {props.get('difficulty')!r}")
+        summary["runs" if props.get("type") == "run" else "lifts"] += 1
+        lines.append(line)
+    if lines:
+        points = np.concatenate(lines)
+        summary["vertices"] = len(points)
+        summary["bbox"] = [round(v, 6) for v in (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())]
+        if resort is not None:
+            dist = distances_km(resort[1], resort[0], points)
+            summary["nearest_km"], summary["farthest_km"] = round(float(dist.min()), 2), round(float(dist.max()), 2)
+            if summary["nearest_km"] > NEAR_KM:
+                errors.append(f"nearest piste is {summary['nearest_km']:.0f} km from the resort")
+            elif summary["farthest_km"] > FAR_KM:
+                errors.append(f"pistes reach {summary['farthest_km']:.0f} km from the resort")
+    if len(errors) > 5:
+        errors[5:] = [f"... and {len(errors) - 5} more"]
+    return summary, errors
+
+
+def check_variants(path, features):
+    """Errors for the .skp and lod/ files written beside a piste GeoJSON, when they exist."""
+    errors = []
+    slug = os.path.splitext(os.path.basename(path))[0]
+    skp = os.path.join(os.path.dirname(path), slug + piste_binary.EXT)
+    if os.path.exists(skp):
+        try:
+            n = len(piste_binary.read(skp)["features"])
+        except Exception as e:
+            errors.append(f"{slug}{piste_binary.EXT}: unreadable ({e})")
+        else:
+            if n != features:
+                errors.append(f"{slug}{piste_binary.EXT}: {n} features, GeoJSON has {features}")
+    lod = os.path.join(os.path.dirname(path), LOD_DIR, f"{slug}.geojson")
+    if os.path.exists(lod):
+        try:
+            with open(lod, "rb") as f:
+                n = len(json.load(f)["features"])
+        except Exception as e:
+            errors.append(f"{LOD_DIR}/{slug}.geojson: unreadable ({e})")
+        else:
+            if n != features:
+                errors.append(f"{LOD_DIR}/{slug}.geojson: {n} features, GeoJSON has {features}")
+    return errors
+
+
+def check_file(task):
+    """Validate one piste file (pool worker).
+
+    task is (path, key, previous manifest entry or None), key being the
+    resort's [lng, lat] and the .skp/lod [size, mtime] stamps. Returns the
+    file's new manifest entry; when the content hash and key match the
+    previous entry, its result is reused without parsing the file.
+    """
+    path, key, previous = task
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    sha = hashlib.sha256(raw).hexdigest()
+    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha, "key": key}
+    if previous and previous["sha256"] == sha and previous["key"] == key:
+        return {**previous, **entry, "reused": True}
+    resort = key["resort"]
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        return {**entry, "summary": {"features": 0}, "errors": [f"invalid JSON ({e})"]}
+    summary, errors = check_collection(data, resort)
+    errors += check_variants(path, summary["features"])
+    return {**entry, "summary": summary, "errors": errors}
 
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != AUDIT_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def load_webcams(path=WEBCAMS_PATH):
+    """{slug: camPageUrl or None} from the registry module's object literal."""
+    try:
+        with open(path) as f:
+            source = f.read()
+    except FileNotFoundError:
+        return {}
+    cams = {}
+    for slug, body in _WEBCAM.findall(source):
+        m = _CAM_PAGE.search(body)
+        cams[slug] = m.group(1) if m else None
+    return cams
+
+
+def list_files(path, suffix):
+    """{name: [size, mtime_ns]} of the files in path ending in suffix, from a single directory listing."""
+    try:
+        with os.scandir(path) as it:
+            return {e.name: [e.stat().st_size, e.stat().st_mtime_ns] for e in it
+                    if e.name.endswith(suffix) and e.is_file()}
+    except FileNotFoundError:
+        return {}
+
+
+def check_pistes(store, manifest, workers, force):
+    """Validate every piste file. Returns (entries by slug, files re-read, errors)."""
+    files = list_files(PISTES_DIR, ".geojson")
+    binaries = list_files(PISTES_DIR, piste_binary.EXT)
+    lods = list_files(os.path.join(PISTES_DIR, LOD_DIR), ".geojson")
+    tasks = []
+    entries = {}
+    for name, stamp in sorted(files.items()):
+        slug = name[:-len(".geojson")]
+        resort = store.get(slug)
+        key = {"resort": [round(resort.lng, 6), round(resort.lat, 6)] if resort else None,
+               "skp": binaries.get(slug + piste_binary.EXT), "lod": lods.get(name)}
+        previous = None if force else manifest.get(name)
+        if previous and [previous["size"], previous["mtime_ns"]] == stamp and previous["key"] == key:
+            entries[slug] = previous
+        else:
+            tasks.append((slug, (os.path.join(PISTES_DIR, name), key, previous)))
+
+    if len(tasks) > 1 and workers > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+            results = list(pool.map(check_file, [task for _, task in tasks],
+                                    chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        results = [check_file(task) for _, task in tasks]
+    reread = 0
+    for (slug, _), entry in zip(tasks, results):
+        reread += not entry.pop("reused", False)
+        entries[slug] = entry
+    errors = [f"{slug}.geojson: {e}" for slug, entry in sorted(entries.items()) for e in entry["errors"]]
+    return entries, reread, errors
+
+
+def cross_check(store, entries, angles, webcams):
+    """(errors, warnings) from comparing resorts.json with the piste files, camera angles and webcams."""
+    errors, warnings = [], []
+    for resort in store:
+        slug = resort.slug or "unknown"
+        assets = resort.properties.get("assets")
         if not assets:
             errors.append(f"{slug}: missing assets object")
             continue
+        if assets.get("pistes") and slug not in entries:
+            errors.append(f"{slug}: pistes=true but no file at {os.path.join(PISTES_DIR, slug + '.geojson')}")
+        if not assets.get("pistes") and slug in entries:
+            errors.append(f"{slug}: pistes=false but file exists at {os.path.join(PISTES_DIR, slug + '.geojson')}")
+        if not isinstance(assets.get("webcams", []), list):
+            errors.append(f"{slug}: assets.webcams is not a list")
+    for slug in sorted(entries):
+        if store.get(slug) is None:
+            errors.append(f"{slug}.geojson: no resort with this slug")
+
+    if angles is None:
+        errors.append(f"{CAMERA_ANGLES_PATH} is missing")
+        angles = {}
+    for slug, entry in sorted(entries.items()):
+        if slug not in angles and entry["summary"].get("vertices"):
+            errors.append(f"{slug}: no camera angles (re-run compute_camera_angles.py)")
+    for slug, view in sorted(angles.items()):
+        resort = store.get(slug)
+        if slug not in entries:
+            errors.append(f"camera angles for {slug}, which has no piste file")
+        if resort is None:
+            continue
+        try:
+            lng, lat = view["center"]
+            ok = 0 <= view["zoom"] <= 22 and 0 <= view["pitch"] <= 85 and 0 <= view["bearing"] < 360
+        except (KeyError, TypeError, ValueError):
+            errors.append(f"camera angles for {slug}: malformed entry")
+            continue
+        if not ok:
+            errors.append(f"camera angles for {slug}: zoom/pitch/bearing out of range")
+        distance = distances_km(resort.lat, resort.lng, np.array([[lng, lat]], dtype=np.float64))[0]
+        if distance > FAR_KM:
+            errors.append(f"camera angles for {slug}: centred {distance:.0f} km from the resort")
+
+    for slug, url in sorted(webcams.items()):
+        if store.get(slug) is None:
+            errors.append(f"webcam registry: no resort {slug!r}")
+        if not url:
+            warnings.append(f"webcam registry: {slug} has no camPageUrl")
+        elif not url.startswith("https://"):
+            errors.append(f"webcam registry: {slug} camPageUrl is not https ({url})")
+    return errors, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes validating piste files (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore the checksum manifest and re-read every file")
+    args = parser.parse_args()
 
-        # Check pistes flag vs file existence
-        piste_file = os.path.join(PISTES_DIR, f"{slug}.geojson")
-        has_file = os.path.isfile(piste_file)
+    started = time.perf_counter()
+    store = ResortStore()
+    with instrument.span("validate"):
+        entries, reread, errors = check_pistes(store, load_manifest(), args.workers, args.force)
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    write_file(MANIFEST_PATH, json.dumps({"version": AUDIT_VERSION,
+                                          "files": {f"{slug}.geojson": e for slug, e in entries.items()}}).encode())
 
-        if assets.get("pistes") and not has_file:
-            errors.append(f"{slug}: pistes=true but no file at {piste_file}")
-        if not assets.get("pistes") and has_file:
-            errors.append(f"{slug}: pistes=false but file exists at {piste_file}")
+    with instrument.span("cross_check"):
+        try:
+            with open(CAMERA_ANGLES_PATH) as f:
+                angles = json.load(f)
+        except FileNotFoundError:
+            angles = None
+        webcams = load_webcams()
+        cross_errors, warnings = cross_check(store, entries, angles, webcams)
+    errors += cross_errors
 
+    features = sum(e["summary"]["features"] for e in entries.values())
+    print(f"Checked {len(entries)} piste files ({features} features; {reread} read, "
+          f"{len(entries) - reread} unchanged), {len(angles or {})} camera angles and {len(webcams)} webcams "
+          f"in {time.perf_counter() - started:.2f}s")
+    for w in warnings:
+        print(f"  warning: {w}")
     if errors:
         print(f"❌ {len(errors)} issue(s) found:")
         for e in errors:
             print(f"  - {e}")
         sys.exit(1)
     else:
-        print("✅ All asset flags match actual files.")
-        sys.exit(0)
+        print("✅ All asset flags, piste files, camera angles and webcams check out.")
 
 
 if __name__ == "__main__":
-    audit()
+    instrument.main(main)
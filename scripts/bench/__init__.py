@@ -0,0 +1,13 @@
+"""Benchmarks for the data pipeline stages at synthetic scale.
+
+    cd scripts
+    python3 -m bench run                       # small scale, results in .cache/bench/
+    python3 -m bench run --scale medium large --stages osm_to_features
+    python3 -m bench compare base.json head.json
+
+generators.py writes synthetic Overpass payloads, resort collections and
+piste directories (cached in .cache/bench/data/, keyed by their parameters).
+stages.py wraps each pipeline stage. runner.py times every (stage, size)
+case in a fresh process, tracks its memory, and writes a results file that
+`compare` diffs between commits.
+"""
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+
+import bench
+from bench.runner import compare, header, run_all
+from bench.stages import SCALES, STAGES
+from resort_store import REPO_ROOT, write_file
+
+RESULTS_DIR = os.path.join(REPO_ROOT, ".cache", "bench")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m bench", description=bench.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run benchmarks and write a results file")
+    run.add_argument("--scale", nargs="+", choices=SCALES, default=["small"])
+    run.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    run.add_argument("--out", help="results file (default .cache/bench/results-<commit>.json)")
+
+    cmp = sub.add_parser("compare", help="compare two results files; exits 1 on a regression")
+    cmp.add_argument("base")
+    cmp.add_argument("head")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, as a fraction")
+    cmp.add_argument("--memory-threshold", type=float, default=0.10, help="allowed peak memory growth")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        regressed = compare(base, head, args.threshold, args.memory_threshold)
+        if regressed:
+            sys.exit(f"\n{len(regressed)} regressed case(s)")
+        return
+
+    cases = [(stage, SCALES[scale][stage]) for scale in args.scale for stage in args.stages]
+    print(header())
+    results = run_all(cases, args.repeat)
+    out = args.out or os.path.join(RESULTS_DIR, f"results-{(results['commit'] or 'nogit')[:12]}"
+                                                f"{'-dirty' if results['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    write_file(out, json.dumps(results, indent=1).encode())
+    print(f"\nResults: {out}")
+
+
+if __name__ == "__main__":
+    main()
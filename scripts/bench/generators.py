@@ -0,0 +1,170 @@
+"""Synthetic inputs shaped like the pipeline's real ones, written to disk once and reused.
+
+Every generator is deterministic in its parameters and seed and returns a
+path under CACHE_DIR, generating only when the file is missing. Bump
+VERSION when a generator's output changes so stale files are not reused.
+"""
+
+import json
+import os
+import random
+import shutil
+
+import numpy as np
+
+from resort_store import REPO_ROOT
+
+CACHE_DIR = os.path.join(REPO_ROOT, ".cache", "bench", "data")
+VERSION = 1
+
+WORDS = ["Mount", "Peak", "Valley", "Ridge", "Basin", "Bowl", "Lake", "Creek", "Hill", "Pass", "North", "Blue",
+         "Snow", "Pine", "Eagle", "Bear", "Wolf", "Crystal", "Summit", "Powder", "Alpine", "Grand", "Big", "Little"]
+SUFFIXES = ["", " Ski Area", " Resort", " Mountain Resort", " Ski Resort"]
+# Where synthetic resorts cluster: (lng, lat, spread in degrees)
+RANGES = [(-110, 43, 6), (-121, 47, 3), (-72, 44, 2), (8, 46, 3), (140, 37, 3), (172, -43, 2), (-70, -35, 3)]
+DIFFICULTIES = ["novice", "easy", "intermediate", "advanced", "expert", "freeride", ""]
+AERIALWAYS = ["chair_lift", "gondola", "drag_lift", "t-bar", "magic_carpet"]
+
+
+def _path(kind, ext, **params):
+    name = "-".join([kind, f"v{VERSION}"] + [f"{k}{v}" for k, v in sorted(params.items())])
+    return os.path.join(CACHE_DIR, name + ext)
+
+
+def _generate(path, write):
+    """Run write(tmp_path) unless path exists, then move the result into place."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    write(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def random_name(rng):
+    return " ".join(rng.sample(WORDS, rng.randint(1, 3))) + rng.choice(SUFFIXES)
+
+
+def _centre(rng):
+    lng, lat, spread = rng.choice(RANGES)
+    return lng + rng.uniform(-spread, spread), lat + rng.uniform(-spread / 2, spread / 2)
+
+
+def overpass_payload(nodes, way_len=40, seed=1):
+    """An Overpass JSON response of `nodes` nodes and the ways through them, nodes first (`out skel qt`).
+
+    Ways are random walks in resort-sized clusters; about a quarter are
+    aerialways, the rest downhill pistes. Node ids are sparse and come out
+    in no particular order, as with quadtile-sorted output.
+    """
+    def write(tmp):
+        rng = np.random.default_rng(seed)
+        py_rng = random.Random(seed)
+        n_ways = max(1, nodes // way_len)
+        ids = np.cumsum(rng.integers(1, 40, nodes)) + 10_000_000
+        ids = ids[rng.permutation(nodes)]
+        bounds = np.linspace(0, nodes, n_ways + 1).astype(np.int64)  # way w is nodes bounds[w]:bounds[w + 1]
+        lengths = np.diff(bounds)
+        centres = np.array([_centre(py_rng) for _ in range(0, n_ways, 200)])  # one resort per 200 ways
+        coords = np.empty((nodes, 2))
+        for w in range(0, n_ways, 10_000):
+            block = slice(w, min(w + 10_000, n_ways))
+            lo, hi = bounds[block.start], bounds[block.stop]
+            starts = centres[np.arange(block.start, block.stop) // 200] + rng.normal(0, 0.02, (block.stop - w, 2))
+            steps = rng.normal(0, 0.0005, (hi - lo, 2))
+            steps[bounds[block] - lo] = 0
+            walk = np.cumsum(steps, axis=0)  # a random walk per way, restarted at each way's first node
+            walk -= np.repeat(walk[bounds[block] - lo], lengths[block], axis=0)
+            coords[lo:hi] = np.repeat(starts, lengths[block], axis=0) + walk
+        lons, lats = coords.T
+        with open(tmp, "w") as f:
+            f.write('{\n  "version": 0.6,\n  "generator": "bench.generators",\n'
+                    '  "osm3s": {"timestamp_osm_base": "2026-01-01T00:00:00Z"},\n  "elements": [\n')
+            for lo in range(0, nodes, 100_000):
+                hi = min(lo + 100_000, nodes)
+                f.write("".join(f'{{"type":"node","id":{i},"lat":{lat:.7f},"lon":{lon:.7f}}},\n'
+                                for i, lat, lon in zip(ids[lo:hi].tolist(), lats[lo:hi].tolist(),
+                                                       lons[lo:hi].tolist())))
+            for w in range(n_ways):
+                refs = ids[bounds[w]:bounds[w + 1]].tolist()
+                if w and py_rng.random() < 0.3:  # junction with an earlier way
+                    refs[0] = int(ids[bounds[py_rng.randrange(w)]])
+                if py_rng.random() < 0.25:
+                    tags = {"aerialway": py_rng.choice(AERIALWAYS), "name": random_name(py_rng)}
+                else:
+                    tags = {"piste:type": "downhill", "piste:difficulty": py_rng.choice(DIFFICULTIES),
+                            "piste:name": random_name(py_rng)}
+                way = {"type": "way", "id": 500_000_000 + w, "nodes": refs, "tags": tags}
+                f.write(json.dumps(way, separators=(",", ":")) + (",\n" if w < n_ways - 1 else "\n"))
+            f.write("  ]\n}\n")
+
+    return _generate(_path("overpass", ".json", nodes=nodes, way=way_len, s=seed), write)
+
+
+def _pass_names():
+    from pass_matcher import load_tables
+    return [e if isinstance(e, str) else e["name"] for t in load_tables() for e in t.get("names", ())]
+
+
+def resort_collection(resorts, seed=1):
+    """A resorts.json-shaped FeatureCollection of `resorts` resorts, in resort_store's canonical encoding.
+
+    ~8% carry a name from assets/passes so update_passes has work to do,
+    ~10% are Ikon or Epic, and the rest start Independent with no region.
+    """
+    def write(tmp):
+        rng = random.Random(seed)
+        table_names = _pass_names()
+        with open(tmp, "w") as f:
+            f.write('{"type": "FeatureCollection", "features": [')
+            for i in range(resorts):
+                name = rng.choice(table_names) if rng.random() < 0.08 else random_name(rng)
+                r = rng.random()
+                pass_name = "Ikon" if r < 0.05 else "Epic" if r < 0.10 else "Independent"
+                lng, lat = _centre(rng) if rng.random() < 0.7 else (rng.uniform(-180, 180), rng.uniform(-55, 70))
+                feature = {"type": "Feature", "properties": {
+                    "name": name, "slug": f"{name.lower().replace(' ', '_')}_{i}", "website": "", "pass": pass_name,
+                    "global_region": "Unknown", "country": "Unknown", "state": "Unknown", "local_region": "Unknown",
+                    "vertical_drop": rng.randint(0, 1500), "skiable_acres": str(rng.randint(0, 5000)),
+                    "avg_snowfall": rng.randint(0, 600), "ownership": "Independent", "address": "",
+                    "description": "", "season": "",
+                    "assets": {"pistes": False, "webcams": [], "weather_prefetch": False, "view_angles": None,
+                               "detail_page": False},
+                    "region_id": None,
+                }, "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]}}
+                f.write((", " if i else "") + json.dumps(feature))
+            f.write("]}")
+
+    return _generate(_path("resorts", ".json", n=resorts, s=seed), write)
+
+
+def piste_dir(files, runs=150, points=30, seed=1):
+    """A directory of `files` per-resort piste GeoJSON files like public/data/pistes/, `runs` lines each.
+
+    About one line in ten carries an elevation on its positions.
+    """
+    def write(tmp):
+        rng = np.random.default_rng(seed)
+        py_rng = random.Random(seed)
+        os.makedirs(tmp)
+        for i in range(files):
+            lng, lat = _centre(py_rng)
+            features = []
+            for _ in range(runs):
+                n = max(2, int(rng.integers(points // 2, points * 3 // 2 + 1)))
+                coords = np.round(np.cumsum(rng.normal(0, 0.0005, (n, 2)), axis=0) + rng.normal((lng, lat), 0.01), 7)
+                coords = coords.tolist()
+                if py_rng.random() < 0.1:
+                    coords = [c + [round(py_rng.uniform(1000, 3500), 1)] for c in coords]
+                lift = py_rng.random() < 0.2
+                features.append({"type": "Feature", "properties": {
+                    "name": random_name(py_rng), "difficulty": "" if lift else py_rng.choice(DIFFICULTIES),
+                    "type": "lift" if lift else "run",
+                }, "geometry": {"type": "LineString", "coordinates": coords}})
+            with open(os.path.join(tmp, f"resort_{i:06d}.geojson"), "w") as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f)
+
+    return _generate(_path("pistes", "", files=files, runs=runs, pts=points, s=seed), write)
@@ -0,0 +1,139 @@
+"""Run benchmark cases in fresh processes and compare results files.
+
+Results file (JSON):
+
+    {"schema": 1, "created": ISO time, "commit": sha or null, "dirty": bool,
+     "environment": {"python", "numpy", "platform", "cpus"},
+     "cases": [{"stage", "size", "unit", "repeat", "times_s", "best_s",
+                "median_s", "items", "per_s", "peak_traced_bytes",
+                "max_rss_bytes"}, ...]}
+
+Each case runs in its own spawned process so one case's heap and RSS never
+leak into the next. It is timed `repeat` times without tracing, then run
+once more under tracemalloc for its peak Python allocation (NumPy buffers
+included); max_rss_bytes is the whole process's high-water mark, setup
+included.
+"""
+
+import gc
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench.stages import STAGES
+
+SCHEMA = 1
+
+
+def run_case(stage, size, repeat):
+    """Time one (stage, size) case in this process. Returns its results entry."""
+    spec = STAGES[stage]
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        times = []
+        for _ in range(repeat):
+            run = spec.setup(size, workdir)
+            gc.collect()
+            t0 = time.perf_counter()
+            items = run()
+            times.append(time.perf_counter() - t0)
+        run = spec.setup(size, workdir)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    median = statistics.median(times)
+    return {
+        "stage": stage,
+        "size": size,
+        "unit": spec.unit,
+        "repeat": repeat,
+        "times_s": [round(t, 6) for t in times],
+        "best_s": round(min(times), 6),
+        "median_s": round(median, 6),
+        "items": items,
+        "per_s": round(size / median, 1) if median else None,
+        "peak_traced_bytes": peak,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(cases, repeat):
+    """Run [(stage, size)] cases, each in a fresh process. Returns the results document."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for stage, size in cases:
+        STAGES[stage].prepare(size)  # generate inputs once, outside any case process
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            case = pool.submit(run_case, stage, size, repeat).result()
+        results.append(case)
+        print(f"{stage:18}{size:>12,} {case['unit']:8}{case['best_s']:10.3f}{case['median_s']:10.3f}"
+              f"{case['peak_traced_bytes'] / 2**20:10.1f}{case['max_rss_bytes'] / 2**20:10.1f}")
+    commit = _git("rev-parse", "HEAD")
+    return {
+        "schema": SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")) if commit else False,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "cases": results,
+    }
+
+
+def header():
+    return f"{'stage':18}{'size':>12} {'unit':8}{'best s':>10}{'median s':>10}{'peak MB':>10}{'rss MB':>10}"
+
+
+def compare(base, head, threshold=0.10, memory_threshold=0.10, out=sys.stdout):
+    """Print head against base case by case. Returns the regressed (stage, size) cases.
+
+    Time compares best-of-repeat (the least noisy figure); a case regresses
+    when it is slower by more than `threshold` or its traced peak grows by
+    more than `memory_threshold`.
+    """
+    base_cases = {(c["stage"], c["size"]): c for c in base["cases"]}
+    print(f"base {base.get('commit') or '?'}  head {head.get('commit') or '?'}", file=out)
+    print(f"{'stage':18}{'size':>12}{'base s':>10}{'head s':>10}{'time':>8}{'peak':>8}", file=out)
+    regressed = []
+    for case in head["cases"]:
+        key = (case["stage"], case["size"])
+        old = base_cases.get(key)
+        if old is None:
+            print(f"{case['stage']:18}{case['size']:>12,}{'':>10}{case['best_s']:10.3f}{'new':>8}", file=out)
+            continue
+        time_ratio = case["best_s"] / old["best_s"] if old["best_s"] else 1.0
+        mem_ratio = case["peak_traced_bytes"] / old["peak_traced_bytes"] if old["peak_traced_bytes"] else 1.0
+        flag = ""
+        if time_ratio > 1 + threshold or mem_ratio > 1 + memory_threshold:
+            regressed.append(key)
+            flag = "  REGRESSION"
+        print(f"{case['stage']:18}{case['size']:>12,}{old['best_s']:10.3f}{case['best_s']:10.3f}"
+              f"{time_ratio:7.2f}x{mem_ratio:7.2f}x{flag}", file=out)
+    return regressed
@@ -0,0 +1,100 @@
+"""The benchmarked pipeline stages and the input size of each at every scale.
+
+A stage's setup(size, workdir) prepares one repetition outside the timed
+region (generating or copying its input) and returns the callable that is
+timed; that callable returns the number of items it produced.
+"""
+
+import glob
+import importlib.util
+import os
+import shutil
+from collections import namedtuple
+
+import assign_regions
+import compute_camera_angles
+import regions
+import update_passes
+from pass_matcher import PassMatcher, load_tables
+from resort_store import ResortStore
+
+from bench import generators
+
+Stage = namedtuple("Stage", "unit prepare setup")
+
+SCALES = {
+    "small": {"osm_to_features": 10_000, "process_file": 50, "assign_regions": 1_000, "update_passes": 1_000},
+    "medium": {"osm_to_features": 1_000_000, "process_file": 500, "assign_regions": 100_000,
+               "update_passes": 100_000},
+    "large": {"osm_to_features": 10_000_000, "process_file": 2_000, "assign_regions": 1_000_000,
+              "update_passes": 1_000_000},
+}
+
+_SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_script(filename):
+    """Import a script whose file name is not a module name (build-pistes.py)."""
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _osm_to_features(size, workdir):
+    path = generators.overpass_payload(size)
+    build_pistes = _load_script("build-pistes.py")
+
+    def run():
+        with open(path, "rb") as fp:
+            runs, lifts = build_pistes.osm_to_features(fp)
+        return len(runs) + len(lifts)
+    return run
+
+
+def _process_file(size, workdir):
+    files = sorted(glob.glob(os.path.join(generators.piste_dir(size), "*.geojson")))
+
+    def run():
+        return sum(compute_camera_angles.process_file(path) is not None for path in files)
+    return run
+
+
+def _resorts_copy(size, workdir):
+    """A fresh copy of the synthetic collection for a stage that rewrites it."""
+    path = os.path.join(workdir, "resorts.json")
+    shutil.copyfile(generators.resort_collection(size), path)
+    return path
+
+
+def _assign_regions(size, workdir):
+    path = _resorts_copy(size, workdir)
+    region_list = regions.load()
+
+    def run():
+        store = ResortStore(path)
+        assign_regions.assign(store, region_list)
+        store.save()
+        return sum(r.region_id is not None for r in store)
+    return run
+
+
+def _update_passes(size, workdir):
+    path = _resorts_copy(size, workdir)
+    tables = load_tables()
+
+    def run():
+        store = ResortStore(path)
+        _, assigned = update_passes.update(store, tables, PassMatcher(tables))
+        store.save()
+        return sum(len(names) for names in assigned.values())
+    return run
+
+
+STAGES = {
+    "osm_to_features": Stage("nodes", generators.overpass_payload, _osm_to_features),
+    "process_file": Stage("files", generators.piste_dir, _process_file),
+    "assign_regions": Stage("resorts", generators.resort_collection, _assign_regions),
+    "update_passes": Stage("resorts", generators.resort_collection, _update_passes),
+}
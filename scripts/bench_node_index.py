@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Compare memory and lookup throughput of osm.NodeIndex against a plain dict."""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import osm
+
+
+def build_dict(ids, lons, lats):
+    # Copy each value so the dict owns its objects, as it does when built from parsed JSON.
+    nodes = {}
+    for nid, lon, lat in zip(ids, lons, lats):
+        nodes[nid + 0] = (lon * 1.0, lat * 1.0)
+    return nodes
+
+
+def build_index(ids, lons, lats):
+    nodes = osm.NodeIndex()
+    for nid, lon, lat in zip(ids, lons, lats):
+        nodes.add(nid, lon, lat)
+    nodes.get(ids[0])  # force the sort so it is counted in build memory
+    return nodes
+
+
+def measure(build, *args):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    obj = build(*args)
+    elapsed = time.perf_counter() - t0
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return obj, used, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=1_000_000)
+    parser.add_argument("--way-len", type=int, default=40, help="refs per way")
+    parser.add_argument("--ways", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # OSM ids are sparse and Overpass `qt` output is not id-ordered.
+    ids = rng.sample(range(1, args.nodes * 20), args.nodes)
+    lons = [rng.uniform(-125, -100) for _ in ids]
+    lats = [rng.uniform(35, 55) for _ in ids]
+    ways = [[ids[rng.randrange(args.nodes)] for _ in range(args.way_len)] for _ in range(args.ways)]
+    refs = args.ways * args.way_len
+
+    nodes_dict, dict_bytes, dict_build = measure(build_dict, ids, lons, lats)
+    nodes_index, index_bytes, index_build = measure(build_index, ids, lons, lats)
+
+    t0 = time.perf_counter()
+    for way in ways:
+        [nodes_dict[nid] for nid in way if nid in nodes_dict]
+    dict_lookup = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for way in ways:
+        nodes_index.gather(way)
+    index_lookup = time.perf_counter() - t0
+
+    backend = "numpy" if osm.np is not None else "bisect"
+    print(f"{args.nodes:,} nodes, {args.ways:,} ways x {args.way_len} refs")
+    print(f"{'':18}{'bytes/node':>12}{'build s':>10}{'Mrefs/s':>10}")
+    print(f"{'dict':18}{dict_bytes / args.nodes:12.1f}{dict_build:10.2f}{refs / dict_lookup / 1e6:10.2f}")
+    print(f"{'NodeIndex/' + backend:18}{index_bytes / args.nodes:12.1f}{index_build:10.2f}"
+          f"{refs / index_lookup / 1e6:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
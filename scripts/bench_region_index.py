@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Time regions.RegionIndex.assign against the old linear bbox scan.
+
+Runs on assets/regions.json and on a synthetic set of finer, overlapping
+polygon regions, and checks the batch result against per-point lookups.
+"""
+
+import argparse
+import math
+import random
+import time
+
+import regions
+
+
+def linear_scan(region_list, lngs, lats):
+    """The previous assign_regions.py loop: first region whose bounds contain the point."""
+    out = []
+    for lng, lat in zip(lngs, lats):
+        matched = None
+        for region in region_list:
+            (sw_lng, sw_lat), (ne_lng, ne_lat) = region["bounds"]
+            if sw_lng <= lng <= ne_lng and sw_lat <= lat <= ne_lat:
+                matched = region["id"]
+                break
+        out.append(matched)
+    return out
+
+
+def synthetic_regions(n, rng):
+    """n overlapping regions: jittered octagons and boxes scattered over land-ish latitudes."""
+    out = []
+    for i in range(n):
+        lng, lat = rng.uniform(-170, 170), rng.uniform(-50, 70)
+        r = rng.uniform(0.3, 4.0)
+        region = {"id": f"r{i:05d}", "bounds": [[lng - r, lat - r], [lng + r, lat + r]]}
+        if i % 2:
+            ring = [[lng + r * math.cos(a) * rng.uniform(0.7, 1.0), lat + r * math.sin(a) * rng.uniform(0.7, 1.0)]
+                    for a in (k * math.pi / 4 for k in range(8))]
+            region["geometry"] = {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+        out.append(region)
+    return out
+
+
+def run(label, region_list, lngs, lats, check):
+    t0 = time.perf_counter()
+    index = regions.RegionIndex(region_list)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    result = index.assign(lngs, lats)
+    batch = time.perf_counter() - t0
+    print(f"{label:28}{len(region_list):>8}{build * 1000:10.1f}{batch * 1000:10.1f}"
+          f"{sum(r is not None for r in result):>10}")
+    if check:
+        mismatches = sum(index.lookup(lng, lat) != r for lng, lat, r in zip(lngs, lats, result))
+        if mismatches:
+            raise SystemExit(f"{label}: {mismatches} batch/lookup mismatches")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--regions", type=int, default=2_000, help="synthetic region count")
+    parser.add_argument("--check", action="store_true", help="compare batch results with per-point lookup()")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lngs = [rng.uniform(-180, 180) for _ in range(args.points)]
+    lats = [rng.uniform(-60, 75) for _ in range(args.points)]
+    real = regions.load()
+
+    print(f"{args.points:,} points")
+    print(f"{'':28}{'regions':>8}{'build ms':>10}{'assign ms':>10}{'matched':>10}")
+    t0 = time.perf_counter()
+    scanned = linear_scan(real, lngs, lats)
+    scan = time.perf_counter() - t0
+    print(f"{'linear scan (regions.json)':28}{len(real):>8}{'':>10}{scan * 1000:10.1f}"
+          f"{sum(r is not None for r in scanned):>10}")
+    indexed = run("RegionIndex (regions.json)", real, lngs, lats, args.check)
+    run("RegionIndex (synthetic)", synthetic_regions(args.regions, rng), lngs, lats, args.check)
+
+    moved = sum(a != b for a, b in zip(scanned, indexed))
+    print(f"\n{moved} points resolve differently once overlaps go to the smallest region")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,24 @@
 """
 Build piste trail PMTiles from OpenStreetMap Overpass data.
 Uses small bounding boxes around resort clusters to avoid timeouts.
+
+Writes public/data/pistes-regions.pmtiles by default. public/data/pistes.pmtiles
+belongs to vector_tiles.py (the refresh.py vector_tiles stage), which tiles the
+per-resort files in public/data/pistes/ that the map draws from.
 """
+import argparse
 import json
-import subprocess
 import sys
-import tempfile
 import time
 from pathlib import Path
 
+import instrument
+import vector_tiles
+from osm import iter_ways
+from overpass import OverpassClient, TokenBucket, add_cache_args, cache_from_args
+
+OUT_PATH = Path(__file__).resolve().parent.parent / "public" / "data" / "pistes-regions.pmtiles"
+
 # Small, targeted bounding boxes around resort clusters
 REGIONS = {
     # Colorado
@@ -39,8 +49,6 @@ REGIONS = {
     "sugarloaf":     "45.0,-70.35,45.08,-70.3",      # Sugarloaf
 }
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-
 DIFF_MAP = {
     "novice": "green", "easy": "green",
     "intermediate": "blue",
@@ -50,34 +58,22 @@ DIFF_MAP = {
 }
 
 
-def fetch_region(name, bbox):
-    query = f'[out:json][timeout:60];(way["piste:type"="downhill"]({bbox});way["aerialway"]({bbox}););out body;>;out skel qt;'
-    result = subprocess.run(
-        ["curl", "-sS", "--max-time", "90", "-d", f"data={query}", OVERPASS_URL],
-        capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        print(f"   WARN: curl failed for {name}")
-        return {"elements": []}
+def fetch_region(client, name, bbox):
+    """Fetch and convert one region. Returns (runs, lifts), empty on failure."""
+    query = f'[out:json][timeout:60];(way["piste:type"="downhill"]({bbox});way["aerialway"]({bbox});)->.w;node(w.w);out skel qt;.w out body;'
     try:
-        return json.loads(result.stdout)
+        with client.open(query, timeout=90) as fp:
+            return osm_to_features(fp)
     except json.JSONDecodeError:
         print(f"   WARN: bad JSON for {name}")
-        return {"elements": []}
-
+    except Exception as e:
+        print(f"   WARN: fetch failed for {name}: {e}")
+    return [], []
 
-def osm_to_features(raw):
-    nodes = {}
-    for el in raw.get("elements", []):
-        if el["type"] == "node":
-            nodes[el["id"]] = (el["lon"], el["lat"])
 
+def osm_to_features(fp):
     runs, lifts = [], []
-    for el in raw.get("elements", []):
-        if el["type"] != "way":
-            continue
-        tags = el.get("tags", {})
-        coords = [nodes[nid] for nid in el.get("nodes", []) if nid in nodes]
+    for tags, coords in iter_ways(fp):
         if len(coords) < 2:
             continue
         geom = {"type": "LineString", "coordinates": coords}
@@ -99,23 +95,35 @@ def osm_to_features(raw):
 
 
 def main():
-    project_root = Path(__file__).resolve().parent.parent
-    out_dir = project_root / "public" / "data"
-    out_dir.mkdir(parents=True, exist_ok=True)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--raw", metavar="FILE",
+                        help="convert an already-downloaded Overpass JSON dump instead of fetching REGIONS")
+    parser.add_argument("--workers", type=int, default=None, help="tile encoding processes (default: CPUs)")
+    parser.add_argument("--tippecanoe", action="store_true", help="build the archive with the tippecanoe binary instead")
+    parser.add_argument("--out", type=Path, default=OUT_PATH, help="archive to write (default public/data/pistes-regions.pmtiles)")
+    add_cache_args(parser)
+    args = parser.parse_args()
+    # Five requests back to back, then roughly one per second.
+    client = OverpassClient(TokenBucket(1.0, capacity=5), cache_from_args(args))
+
+    out_path = args.out
+    out_path.parent.mkdir(parents=True, exist_ok=True)
 
     all_runs, all_lifts = [], []
 
-    print("==> Fetching piste data from Overpass API...")
-    for i, (name, bbox) in enumerate(REGIONS.items()):
-        if i > 0 and i % 5 == 0:
-            print("   (sleeping 2s to avoid rate limit)")
-            time.sleep(2)
-        print(f"   [{i+1}/{len(REGIONS)}] {name}...", end=" ", flush=True)
-        raw = fetch_region(name, bbox)
-        runs, lifts = osm_to_features(raw)
-        print(f"{len(runs)} runs, {len(lifts)} lifts")
-        all_runs.extend(runs)
-        all_lifts.extend(lifts)
+    if args.raw:
+        print(f"==> Converting {args.raw}...")
+        with instrument.span("convert"), open(args.raw, "rb") as fp:
+            all_runs, all_lifts = osm_to_features(fp)
+    else:
+        print("==> Fetching piste data from Overpass API...")
+        for i, (name, bbox) in enumerate(REGIONS.items()):
+            print(f"   [{i+1}/{len(REGIONS)}] {name}...", end=" ", flush=True)
+            with instrument.span("fetch_region", region=name):
+                runs, lifts = fetch_region(client, name, bbox)
+            print(f"{len(runs)} runs, {len(lifts)} lifts")
+            all_runs.extend(runs)
+            all_lifts.extend(lifts)
 
     print(f"\n==> Total: {len(all_runs)} runs, {len(all_lifts)} lifts")
 
@@ -123,32 +131,21 @@ def main():
         print("ERROR: No features found!")
         sys.exit(1)
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        runs_path = Path(tmpdir) / "runs.geojson"
-        lifts_path = Path(tmpdir) / "lifts.geojson"
-        out_path = out_dir / "pistes.pmtiles"
-
-        with open(runs_path, "w") as f:
-            json.dump({"type": "FeatureCollection", "features": all_runs}, f)
-        with open(lifts_path, "w") as f:
-            json.dump({"type": "FeatureCollection", "features": all_lifts}, f)
-
-        print(f"   runs.geojson: {runs_path.stat().st_size / 1024:.0f}KB")
-        print(f"   lifts.geojson: {lifts_path.stat().st_size / 1024:.0f}KB")
-
+    layers = {"runs": all_runs, "lifts": all_lifts}
+    if args.tippecanoe:
         print("==> Building PMTiles with tippecanoe...")
-        subprocess.run([
-            "tippecanoe",
-            "-o", str(out_path),
-            "-Z10", "-z14",
-            "--drop-densest-as-needed",
-            "--force",
-            "-L", f"runs:{runs_path}",
-            "-L", f"lifts:{lifts_path}",
-        ], check=True)
+        with instrument.span("tile", tippecanoe=True):
+            vector_tiles.run_tippecanoe(out_path, layers)
+    else:
+        print("==> Building PMTiles...")
+        t0 = time.perf_counter()
+        with instrument.span("tile"):
+            count = vector_tiles.build(out_path, layers, workers=args.workers)
+        print(f"   {count} tiles in {time.perf_counter() - t0:.1f}s")
 
-        print(f"==> Done! {out_path} ({out_path.stat().st_size / 1024:.0f}KB)")
+    instrument.count("bytes_written", out_path.stat().st_size)
+    print(f"==> Done! {out_path} ({out_path.stat().st_size / 1024:.0f}KB)")
 
 
 if __name__ == "__main__":
-    main()
+    instrument.main(main)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Build assets/geo/admin-places.npz, the offline dataset behind geocoder.py.
+
+Inputs are three GeoNames files (CC BY 4.0):
+
+cities1000.txt
+    the populated-places dump, tab-separated with no header, one row per
+    place of 1,000+ people. Only latitude, longitude, country code and
+    admin1 code are read. A place whose admin1 code is not in
+    admin1CodesASCII.txt (the two files from different dates) keeps its
+    country but gets no subdivision.
+admin1CodesASCII.txt
+    "CC.code", name, asciiname, geonameid per first-level subdivision.
+    Subdivisions take the UTF-8 name column, so resorts read "Östergötland",
+    not "OEstergoetland".
+a country table as JSON
+    {"AD": {"name": "Andorra", ...}, ...}, the layout geonamescache ships.
+
+Country names follow the spelling resorts.json and assets/regions.json
+already use: COUNTRY_NAMES overrides GeoNames where they differ, and the
+build fails if a country in regions.json would be spelled differently. The
+ISO code of each country is stored too, so OSM tags that give a code
+("DE") can be mapped to the same name.
+
+Places are stored in the order of a balanced KD-tree over their unit-sphere
+vectors, so geocoder.py gets the tree for free: the median of every slice is
+its split point, and nothing but the points needs to be saved.
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+import instrument
+from geocoder import DATA_PATH, LEAF_SIZE, COORD_SCALE, REPO_ROOT, unit_vectors
+
+# Country names as the rest of resorts.json spells them, where GeoNames differs.
+COUNTRY_NAMES = {"US": "USA"}
+REGIONS_PATH = os.path.join(REPO_ROOT, "assets", "regions.json")
+# Columns of the GeoNames dump files.
+PLACE_LAT, PLACE_LON, PLACE_CC, PLACE_ADMIN1 = 4, 5, 8, 10
+
+
+def kd_order(xyz, leaf_size=LEAF_SIZE):
+    """Permutation putting xyz in implicit KD-tree order (split axis = depth % 3, median at the middle)."""
+    order = np.arange(len(xyz))
+    stack = [(0, len(xyz), 0)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= leaf_size:
+            continue
+        mid = (lo + hi) // 2
+        axis = depth % 3
+        part = np.argpartition(xyz[order[lo:hi], axis], mid - lo)
+        order[lo:hi] = order[lo:hi][part]
+        stack.append((lo, mid, depth + 1))
+        stack.append((mid + 1, hi, depth + 1))
+    return order
+
+
+def read_tsv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("places", help="GeoNames cities1000.txt")
+    parser.add_argument("--admin1", required=True, help="GeoNames admin1CodesASCII.txt")
+    parser.add_argument("--countries", required=True, help="GeoNames country table JSON")
+    parser.add_argument("--out", default=DATA_PATH)
+    args = parser.parse_args()
+
+    with open(args.countries) as f:
+        names = {cc: COUNTRY_NAMES.get(cc, info["name"]) for cc, info in json.load(f).items()}
+    with open(REGIONS_PATH) as f:
+        spelled = {c for region in json.load(f) for c in region.get("countries") or ()}
+    if spelled - set(names.values()):
+        raise SystemExit(f"regions.json spells {sorted(spelled - set(names.values()))} differently; "
+                         "add them to COUNTRY_NAMES")
+    admin1_names = {row[0]: row[1].strip() for row in read_tsv(args.admin1) if len(row) >= 2}
+
+    lats, lons, countries, admin1s = [], [], [], []
+    country_index, admin1_index = {}, {"": 0}
+    unnamed = set()
+    stale = 0
+    for row in read_tsv(args.places):
+        cc = row[PLACE_CC]
+        if cc not in names:
+            continue
+        code = f"{cc}.{row[PLACE_ADMIN1]}"
+        if row[PLACE_ADMIN1] not in ("", "00") and code not in admin1_names:
+            # A code the subdivision table no longer has (Norway's pre-2020 counties, say).
+            unnamed.add(code)
+            stale += 1
+        lats.append(float(row[PLACE_LAT]))
+        lons.append(float(row[PLACE_LON]))
+        countries.append(country_index.setdefault(cc, len(country_index)))
+        admin1s.append(admin1_index.setdefault(admin1_names.get(code, ""), len(admin1_index)))
+
+    lat = np.round(np.array(lats) * COORD_SCALE).astype(np.int32)
+    lon = np.round(np.array(lons) * COORD_SCALE).astype(np.int32)
+    order = kd_order(unit_vectors(lon / COORD_SCALE, lat / COORD_SCALE))
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    np.savez_compressed(
+        args.out,
+        lat=lat[order],
+        lon=lon[order],
+        country=np.array(countries, dtype=np.uint16)[order],
+        admin1=np.array(admin1s, dtype=np.uint16)[order],
+        country_codes=np.array(list(country_index)),
+        country_names=np.array([names[cc] for cc in country_index]),
+        admin1_names=np.array(list(admin1_index)),
+    )
+    print(f"{len(order)} places, {len(country_index)} countries, {len(admin1_index) - 1} subdivisions "
+          f"-> {args.out} ({os.path.getsize(args.out) / 1024:.0f}KB)")
+    if unnamed:
+        print(f"  WARN: {stale} places have one of {len(unnamed)} admin1 codes missing from {args.admin1} "
+              f"and no subdivision: {', '.join(sorted(unnamed)[:10])}")
+
+
+if __name__ == "__main__":
+    instrument.main(main)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Split assets/resorts.json into a core bundle and spatial shards under public/data/resorts/.
+
+core.json holds every pass resort (anything not Independent), which the map
+and weather hooks always need. The independents are partitioned into Web
+Mercator quadtree tiles: starting at MIN_ZOOM, any tile holding more than
+--max-per-shard resorts is split into its four children, down to MAX_ZOOM.
+Each non-empty tile becomes <z>-<x>-<y>.json, a FeatureCollection in
+resorts.json order.
+
+manifest.json lists the core and every shard with its tile, the bbox of the
+resorts it actually holds ([west, south, east, north]), its resort count and
+size, plus a content hash of the whole set. A client loads the manifest and
+core.json up front, then fetches only the shards whose bbox intersects the
+viewport. Output is deterministic, files are rewritten only when their
+content changes, and shards the previous manifest listed that no longer
+exist are removed; nothing else in the output directory is touched.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import instrument
+import resort_store
+from resort_store import REPO_ROOT, RESORTS_PATH
+
+OUT_DIR = os.path.join(REPO_ROOT, "public", "data", "resorts")
+MIN_ZOOM = 2
+MAX_ZOOM = 8
+MAX_PER_SHARD = 200
+CORE = "core.json"
+MANIFEST = "manifest.json"
+MAX_LAT = 85.0511287798
+
+
+def tile_xy(lng, lat, z):
+    """Web Mercator tile containing a point."""
+    n = 1 << z
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def partition(points, max_per_shard=MAX_PER_SHARD, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Quadtree-partition (lng, lat) points. Returns {(z, x, y): [point indexes]}."""
+    deep = [tile_xy(lng, lat, max_zoom) for lng, lat in points]
+    shards = {}
+    pending = [(min_zoom, list(range(len(points))))]
+    while pending:
+        z, members = pending.pop()
+        shift = max_zoom - z
+        tiles = {}
+        for i in members:
+            x, y = deep[i]
+            tiles.setdefault((x >> shift, y >> shift), []).append(i)
+        for (x, y), indexes in tiles.items():
+            if len(indexes) > max_per_shard and z < max_zoom:
+                pending.append((z + 1, indexes))
+            else:
+                shards[(z, x, y)] = indexes
+    return shards
+
+
+def encode(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def extent(features):
+    lngs = [f["geometry"]["coordinates"][0] for f in features]
+    lats = [f["geometry"]["coordinates"][1] for f in features]
+    return [min(lngs), min(lats), max(lngs), max(lats)]
+
+
+def is_core(feature):
+    return feature["properties"].get("pass", "Independent") != "Independent"
+
+
+def build(collection, max_per_shard=MAX_PER_SHARD, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Return {file name: bytes} for the core, every shard and the manifest."""
+    features = collection["features"]
+    core = [f for f in features if is_core(f)]
+    rest = [f for f in features if not is_core(f)]
+    files = {CORE: encode({"type": "FeatureCollection", "features": core})}
+    entries = []
+    shards = partition([f["geometry"]["coordinates"][:2] for f in rest], max_per_shard, min_zoom, max_zoom)
+    for (z, x, y), indexes in sorted(shards.items()):
+        members = [rest[i] for i in sorted(indexes)]
+        name = f"{z}-{x}-{y}.json"
+        files[name] = encode({"type": "FeatureCollection", "features": members})
+        entries.append({"file": name, "tile": [z, x, y], "bbox": extent(members), "count": len(members),
+                        "bytes": len(files[name])})
+
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(name.encode() + b"\0" + files[name])
+    manifest = {
+        "version": digest.hexdigest()[:16],
+        "total": len(features),
+        "core": {"file": CORE, "bbox": extent(core) if core else None, "count": len(core),
+                 "bytes": len(files[CORE])},
+        "shards": entries,
+    }
+    files[MANIFEST] = encode(manifest)
+    return files
+
+
+def write(files, out_dir=OUT_DIR):
+    """Write build() output, skipping unchanged files and removing stale shards. Returns files written."""
+    os.makedirs(out_dir, exist_ok=True)
+    # Only shards the previous manifest listed are ever removed, so --out can point at a shared directory.
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "rb") as f:
+            previous = [s["file"] for s in json.load(f)["shards"]]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        previous = []
+    written = 0
+    # The manifest goes last so a client never sees it point at shards that are not there yet.
+    for name in sorted(files, key=lambda n: n == MANIFEST):
+        path = os.path.join(out_dir, name)
+        if resort_store.digest(path) != hashlib.sha256(files[name]).hexdigest():
+            resort_store.write_file(path, files[name])
+            written += 1
+    for name in previous:
+        if name not in files and os.path.basename(name) == name:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except FileNotFoundError:
+                pass
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resorts", default=RESORTS_PATH)
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--max-per-shard", type=int, default=MAX_PER_SHARD)
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    args = parser.parse_args()
+
+    with open(args.resorts, "rb") as f:
+        raw = f.read()
+    t0 = time.perf_counter()
+    with instrument.span("build"):
+        files = build(json.loads(raw), args.max_per_shard, args.min_zoom, args.max_zoom)
+    with instrument.span("write", files=len(files)):
+        written = write(files, args.out)
+    elapsed = time.perf_counter() - t0
+
+    manifest = json.loads(files[MANIFEST])
+    counts = [s["count"] for s in manifest["shards"]]
+    initial = manifest["core"]["bytes"] + len(files[MANIFEST])
+    print(f"{manifest['total']} resorts -> core {manifest['core']['count']} + {len(counts)} shards "
+          f"({min(counts, default=0)}-{max(counts, default=0)} resorts each) in {elapsed * 1000:.0f} ms, "
+          f"{written} files written")
+    print(f"Initial payload {initial / 1024:.0f}KB (core + manifest) vs {len(raw) / 1024:.0f}KB for resorts.json "
+          f"({len(raw) / initial:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    instrument.main(main)
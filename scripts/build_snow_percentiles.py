@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Build per-resort, per-day-of-season snow percentile tables from archived daily weather.
+
+Fetches SEASONS completed seasons of daily snowfall and snow depth for every
+forecast cell (the same CELL_DEG grid prefetch_snow.py uses) from the
+Open-Meteo archive API, then computes, for each cell and each day of the
+season, the PERCENTILES of
+
+    snowfall_7d   snowfall over that day and the next 6 (like snow.json's
+                  snowfall_7d, which sums the 7-day forecast from today)
+    snow_depth    the day's maximum snow depth
+
+pooled over every season and WINDOW_DAYS either side of the day. Seasons
+start on Nov 1 north of the equator and May 1 south of it and run
+SEASON_DAYS days.
+
+Output, keyed by the snow-keys.json resort index (see snow_store.py):
+
+public/data/snow-percentiles.bin
+    uint8 rows of SEASON_DAYS x fields x percentiles, one per cell. Values
+    are multiples of the field's scale (snowfall in cm, depth in m, like
+    snow.json), clipped to 254; 255 means no data. One row is ~1.8 KB, so
+    the client fetches a resort's row with an HTTP Range request.
+public/data/snow-percentiles.json
+    Layout, scales, seasons and "rows": the table row of each resort index
+    (-1 without data).
+
+Archive responses are cached in .cache/snow-archive/ per hemisphere and date
+range, so an interrupted run (or one cut off by the API's daily limit,
+which counts a multi-season request as several calls) resumes where it
+stopped. OPEN_METEO_ARCHIVE_URL points the fetcher elsewhere, e.g. at
+open_meteo_standin.py:
+
+    python3 scripts/open_meteo_standin.py --port 8765 &
+    OPEN_METEO_ARCHIVE_URL=http://127.0.0.1:8765 python3 scripts/build_snow_percentiles.py
+
+The snow-prefetch workflow runs this after each prefetch, with the archive
+cache kept in the Actions cache, and commits both output files; refresh.py
+runs it as the build_snow_percentiles stage.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import instrument
+import snow_store
+from prefetch_snow import AsyncBucket, Session, group_by_cell, request_batch
+from resort_store import REPO_ROOT, ResortStore, digest, write_file
+
+ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com")
+INDEX_PATH = os.path.join(REPO_ROOT, "public", "data", "snow-percentiles.json")
+TABLE_PATH = os.path.join(REPO_ROOT, "public", "data", "snow-percentiles.bin")
+CACHE_DIR = os.path.join(REPO_ROOT, ".cache", "snow-archive")
+DAILY = ["snowfall_sum", "snow_depth_max"]
+FIELDS = [("snowfall_7d", 1.0), ("snow_depth", 0.02)]  # (name, scale)
+PERCENTILES = [10, 25, 50, 75, 90]
+SEASONS = 10
+SEASON_START = {"north": (11, 1), "south": (5, 1)}
+SEASON_DAYS = 184
+WINDOW_DAYS = 7
+FORWARD_DAYS = 7
+ARCHIVE_LAG_DAYS = 7  # the archive trails today by a few days
+BATCH_SIZE = 20
+CONCURRENCY = 2
+LOCATIONS_PER_MINUTE = 100
+CHUNK = 256  # cells per percentile pass; bounds memory at ~CHUNK * SEASON_DAYS * SEASONS * 15 floats
+MISSING = 255
+
+
+def hemisphere(lat):
+    return "north" if lat >= 0 else "south"
+
+
+def season_starts(hemi, seasons=SEASONS, today=None):
+    """Start dates of the last `seasons` seasons the archive covers completely, oldest first."""
+    today = today or date.today()
+    month, day = SEASON_START[hemi]
+    needed = timedelta(days=SEASON_DAYS + WINDOW_DAYS + FORWARD_DAYS + ARCHIVE_LAG_DAYS)
+    year = today.year
+    while date(year, month, day) + needed > today:
+        year -= 1
+    return [date(year - k, month, day) for k in reversed(range(seasons))]
+
+
+def fetch_range(starts):
+    """Inclusive (first, last) day to fetch for these seasons, windows and forward sums included."""
+    return (starts[0] - timedelta(days=WINDOW_DAYS),
+            starts[-1] + timedelta(days=SEASON_DAYS + WINDOW_DAYS + FORWARD_DAYS - 2))
+
+
+def archive_path(locations, first, last):
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for _, lat in locations),
+        "longitude": ",".join(f"{lng:.4f}" for lng, _ in locations),
+        "start_date": first.isoformat(),
+        "end_date": last.isoformat(),
+        "daily": ",".join(DAILY),
+        "timezone": "GMT",
+    }
+    return "/v1/archive?" + urllib.parse.urlencode(params, safe=",")
+
+
+def daily_values(d, days):
+    """(days, len(DAILY)) float32 array from one archive result, NaN where null."""
+    daily = d.get("daily") or {}
+    out = np.full((days, len(DAILY)), np.nan, dtype=np.float32)
+    for j, name in enumerate(DAILY):
+        values = daily.get(name) or []
+        if len(values) != days:
+            raise RuntimeError(f"{name}: {len(values)} days, expected {days}")
+        out[:, j] = np.array(values, dtype=np.float64)  # None -> nan
+    return out
+
+
+def cache_path(hemi, first, last):
+    return os.path.join(CACHE_DIR, f"{hemi}-{first}-{last}.npz")
+
+
+def load_cache(path):
+    """{(lng, lat) forecast location of a cell rounded to 4 places: (days, len(DAILY)) array} from an archive cache file."""
+    try:
+        with np.load(path) as f:
+            return {tuple(c): v for c, v in zip(f["cells"].tolist(), f["values"])}
+    except FileNotFoundError:
+        return {}
+
+
+def save_cache(path, cached):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, cells=np.array(list(cached), dtype=np.float64).reshape(-1, 2),
+             values=np.stack(list(cached.values())) if cached else np.empty((0, 0, len(DAILY)), np.float32))
+    os.replace(tmp, path)
+
+
+async def fetch_archive(locations, first, last, base_url=ARCHIVE_URL, batch_size=BATCH_SIZE,
+                        concurrency=CONCURRENCY, per_minute=LOCATIONS_PER_MINUTE):
+    """Daily history for every location. Returns ({location index: (days, len(DAILY))}, stats)."""
+    days = (last - first).days + 1
+    session = Session(base_url, concurrency)
+    bucket = AsyncBucket(per_minute / 60, max(per_minute, batch_size))
+    stats = {"retries": 0, "failed_batches": 0}
+    results = {}
+    batches = [list(range(i, min(i + batch_size, len(locations)))) for i in range(0, len(locations), batch_size)]
+
+    async def run(batch):
+        try:
+            with instrument.span("batch", locations=len(batch)):
+                data = await request_batch(session, bucket, archive_path([locations[i] for i in batch], first, last),
+                                           len(batch), stats)
+            results.update((i, daily_values(d, days)) for i, d in zip(batch, data))
+        except Exception as e:
+            stats["failed_batches"] += 1
+            print(f"  batch of {len(batch)} locations FAILED: {e}")
+
+    try:
+        await asyncio.gather(*(run(b) for b in batches))
+    finally:
+        session.close()
+    stats["requests"] = session.requests
+    return results, stats
+
+
+def forward_sums(x, n):
+    """Sums of x[..., t:t+n] along the last axis (length shrinks by n - 1); NaN if any day is missing."""
+    pad = np.zeros(x.shape[:-1] + (1,), dtype=np.float64)
+    total = np.concatenate([pad, np.cumsum(np.nan_to_num(x, nan=0.0), axis=-1)], axis=-1)
+    gaps = np.concatenate([pad, np.cumsum(np.isnan(x), axis=-1)], axis=-1)
+    sums = total[..., n:] - total[..., :-n]
+    sums[gaps[..., n:] - gaps[..., :-n] > 0] = np.nan
+    return sums
+
+
+def season_samples(series, offsets):
+    """(cells, SEASON_DAYS, seasons * window) samples for each day of the season.
+
+    series is (cells, days) and offsets the index of each season's first
+    day minus WINDOW_DAYS; each day pools every season's values within
+    WINDOW_DAYS of it.
+    """
+    span = SEASON_DAYS + 2 * WINDOW_DAYS
+    seasons = np.stack([series[:, o:o + span] for o in offsets], axis=1)  # (cells, seasons, span)
+    windows = sliding_window_view(seasons, 2 * WINDOW_DAYS + 1, axis=2)  # (cells, seasons, days, window)
+    return windows.transpose(0, 2, 1, 3).reshape(len(series), SEASON_DAYS, -1)
+
+
+def nan_percentiles(samples, q):
+    """Percentiles q of the last axis ignoring NaN (numpy's "linear" method), shape samples.shape[:-1] + (len(q),).
+
+    np.nanpercentile falls back to a per-row loop when rows hold NaN; sorting
+    once and interpolating by each row's own count keeps it vectorized.
+    """
+    ordered = np.sort(samples, axis=-1)  # NaN sorts last
+    count = (~np.isnan(samples)).sum(axis=-1, keepdims=True)
+    pos = np.asarray(q, dtype=np.float64) / 100 * np.maximum(count - 1, 0)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, np.maximum(count - 1, 0))
+    low, high = np.take_along_axis(ordered, lo, -1), np.take_along_axis(ordered, hi, -1)
+    out = low + (high - low) * (pos - lo)
+    out[np.broadcast_to(count == 0, out.shape)] = np.nan
+    return out
+
+
+def percentile_table(history, offsets):
+    """uint8 (cells, SEASON_DAYS, len(FIELDS), len(PERCENTILES)) table from (cells, days, len(DAILY)) history."""
+    table = np.empty((len(history), SEASON_DAYS, len(FIELDS), len(PERCENTILES)), dtype=np.uint8)
+    for start in range(0, len(history), CHUNK):
+        chunk = history[start:start + CHUNK].astype(np.float64)
+        snowfall = forward_sums(chunk[:, :, DAILY.index("snowfall_sum")], FORWARD_DAYS)
+        depth = chunk[:, :, DAILY.index("snow_depth_max")]
+        for j, (series, (_, scale)) in enumerate(zip((snowfall, depth), FIELDS)):
+            values = nan_percentiles(season_samples(series, offsets), PERCENTILES) / scale
+            quantized = np.clip(np.round(values), 0, MISSING - 1)
+            table[start:start + CHUNK, :, j] = np.where(np.isnan(values), MISSING, quantized)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=ARCHIVE_URL, help="archive API base URL (default $OPEN_METEO_ARCHIVE_URL)")
+    parser.add_argument("--seasons", type=int, default=SEASONS, help="completed seasons of history")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="locations per request")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight")
+    parser.add_argument("--per-minute", type=int, default=LOCATIONS_PER_MINUTE, help="location budget per minute")
+    parser.add_argument("--passes-only", action="store_true", help="only pass resorts")
+    parser.add_argument("--cache-only", action="store_true", help="build from cached history without fetching")
+    parser.add_argument("--out", default=INDEX_PATH, help="index JSON; the table goes next to it as .bin")
+    parser.add_argument("--keys", default=snow_store.KEYS_PATH)
+    args = parser.parse_args()
+    table_out = os.path.splitext(args.out)[0] + ".bin"
+
+    started = time.monotonic()
+    store = ResortStore()
+    resorts = [r for r in store if not args.passes_only or r.pass_name not in (None, "Independent")]
+    keys = snow_store.update_keys(sorted(store.slugs()), args.keys)
+    key_index = {slug: i for i, slug in enumerate(keys)}
+    rows = [-1] * len(keys)
+    tables, info = [], {}
+
+    for hemi in SEASON_START:
+        cells = [(location, members) for location, members in group_by_cell(resorts) if hemisphere(location[1]) == hemi]
+        if not cells:
+            continue
+        starts = season_starts(hemi, args.seasons)
+        first, last = fetch_range(starts)
+        path = cache_path(hemi, first, last)
+        cached = load_cache(path)
+        locations = [(round(lng, 4), round(lat, 4)) for (lng, lat), _ in cells]
+        missing = [c for c in locations if c not in cached]
+        print(f"{hemi}: {len(cells)} cells, seasons {starts[0].year}-{starts[-1].year}, "
+              f"{len(cells) - len(missing)} cached, {len(missing)} to fetch")
+        if missing and not args.cache_only:
+            with instrument.span("fetch_archive", hemisphere=hemi, cells=len(missing)):
+                fetched, stats = asyncio.run(fetch_archive(missing, first, last, args.url, args.batch_size,
+                                                           args.concurrency, args.per_minute))
+                cached.update((missing[i], values) for i, values in fetched.items())
+                save_cache(path, cached)
+            print(f"  fetched {len(fetched)}/{len(missing)} cells ({stats['requests']} requests, "
+                  f"{stats['retries']} retries, {stats['failed_batches']} failed batches)")
+
+        have = [i for i, c in enumerate(locations) if c in cached]
+        if not have:
+            continue
+        history = np.stack([cached[locations[i]] for i in have])
+        offsets = [(s - timedelta(days=WINDOW_DAYS) - first).days for s in starts]
+        base = sum(len(t) for t in tables)
+        with instrument.span("percentile_table", hemisphere=hemi, cells=len(have)):
+            tables.append(percentile_table(history, offsets))
+        for row, i in enumerate(have):
+            for resort in cells[i][1]:
+                rows[key_index[resort.slug]] = base + row
+        info[hemi] = {"start": "%02d-%02d" % SEASON_START[hemi], "seasons": [starts[0].year, starts[-1].year]}
+
+    if not tables:
+        raise SystemExit(f"No archive history available; {args.out} left as is")
+    table = np.concatenate(tables)
+    body = table.tobytes()
+    index = {
+        "version": hashlib.sha256(body).hexdigest()[:12],
+        "keys": len(keys),
+        "days": SEASON_DAYS,
+        "window": WINDOW_DAYS,
+        "hemispheres": info,
+        "fields": [{"name": name, "scale": scale} for name, scale in FIELDS],
+        "percentiles": PERCENTILES,
+        "missing": MISSING,
+        "rowBytes": table[0].size,
+        "rows": rows,
+    }
+    changed = digest(table_out) != hashlib.sha256(body).hexdigest()
+    if changed:
+        write_file(table_out, body)
+    write_file(args.out, json.dumps(index, separators=(",", ":")).encode())
+    covered = sum(r >= 0 for r in rows)
+    print(f"Wrote {len(table)} percentile rows ({len(body) // 1024} KB) covering {covered} resorts to {table_out}"
+          + ("" if changed else " (unchanged)") + f" in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    instrument.main(main)
@@ -1,64 +1,84 @@
 #!/usr/bin/env python3
-"""Compute optimal 3D camera angles from piste geometry for each resort."""
+"""Compute optimal 3D camera angles from piste geometry for each resort.
 
+Piste files are processed in a process pool. Results are cached in
+.cache/camera-angles.json by the SHA-256 of each piste file, so a run only
+recomputes resorts whose pistes changed; bump ALGORITHM_VERSION whenever
+process_file's output would change for the same input.
+"""
+
+import argparse
+import glob
+import hashlib
 import json
 import math
 import os
-import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'public', 'data', 'pistes')
-OUTPUT = os.path.join(os.path.dirname(__file__), '..', 'public', 'data', 'camera-angles.json')
+import numpy as np
+
+import instrument
+from resort_store import digest, write_file
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, 'public', 'data', 'pistes')
+OUTPUT = os.path.join(REPO_ROOT, 'public', 'data', 'camera-angles.json')
+CACHE_PATH = os.path.join(REPO_ROOT, '.cache', 'camera-angles.json')
+ALGORITHM_VERSION = 1
+EARTH_RADIUS_KM = 6371.0
 
 
 def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
     a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def bearing_deg(lat1, lon1, lat2, lon2):
-    dlon = math.radians(lon2 - lon1)
-    lat1r, lat2r = math.radians(lat1), math.radians(lat2)
-    x = math.sin(dlon) * math.cos(lat2r)
-    y = math.cos(lat1r) * math.sin(lat2r) - math.sin(lat1r) * math.cos(lat2r) * math.cos(dlon)
-    return (math.degrees(math.atan2(x, y)) + 360) % 360
+def bearings_deg(lat1, lon1, lat2, lon2):
+    """Initial bearings in degrees [0, 360) for arrays of start/end points."""
+    dlon = np.radians(lon2 - lon1)
+    lat1r, lat2r = np.radians(lat1), np.radians(lat2)
+    x = np.sin(dlon) * np.cos(lat2r)
+    y = np.cos(lat1r) * np.sin(lat2r) - np.sin(lat1r) * np.cos(lat2r) * np.cos(dlon)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
 
 
 def process_file(path):
     with open(path) as f:
         data = json.load(f)
 
-    all_coords = []
-    bearings = []
-
+    lines = []
     for feature in data.get('features', []):
-        geom = feature.get('geometry', {})
+        geom = feature.get('geometry') or {}
         if geom.get('type') != 'LineString':
             continue
         coords = geom.get('coordinates', [])
-        if len(coords) < 2:
-            continue
-        all_coords.extend(coords)
-        # Bearing from first to last coord: coords are [lng, lat]
-        b = bearing_deg(coords[0][1], coords[0][0], coords[-1][1], coords[-1][0])
-        bearings.append(b)
+        if len(coords) >= 2:
+            lines.append(coords)
 
-    if not all_coords or not bearings:
+    if not lines:
         return None
 
+    lengths = np.array([len(coords) for coords in lines])
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(lines)), np.float64)
+    if flat.size == 2 * lengths.sum():
+        points = flat.reshape(-1, 2)
+    else:  # some positions carry an elevation
+        points = np.array([c[:2] for coords in lines for c in coords], dtype=np.float64)
+    ends = np.cumsum(lengths)
+    first, last = points[ends - lengths], points[ends - 1]
+
     # Center: bbox midpoint
-    lngs = [c[0] for c in all_coords]
-    lats = [c[1] for c in all_coords]
-    min_lng, max_lng = min(lngs), max(lngs)
-    min_lat, max_lat = min(lats), max(lats)
+    min_lng, min_lat = points.min(axis=0).tolist()
+    max_lng, max_lat = points.max(axis=0).tolist()
     center = [round((min_lng + max_lng) / 2, 6), round((min_lat + max_lat) / 2, 6)]
 
-    # Bearing: circular mean + 180 (face uphill)
-    sin_sum = sum(math.sin(math.radians(b)) for b in bearings)
-    cos_sum = sum(math.cos(math.radians(b)) for b in bearings)
-    mean_bearing = (math.degrees(math.atan2(sin_sum, cos_sum)) + 360) % 360
+    # Bearing of each run from first to last coord: circular mean + 180 (face uphill)
+    bearings = np.radians(bearings_deg(first[:, 1], first[:, 0], last[:, 1], last[:, 0]))
+    mean_bearing = (math.degrees(math.atan2(np.sin(bearings).sum(), np.cos(bearings).sum())) + 360) % 360
     camera_bearing = round((mean_bearing + 180) % 360, 1)
 
     # Pitch: based on bbox aspect ratio
@@ -94,20 +114,62 @@ def process_file(path):
     return {'center': center, 'zoom': zoom, 'pitch': pitch, 'bearing': camera_bearing}
 
 
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if cache.get('version') != ALGORITHM_VERSION:
+        return {}
+    return cache.get('entries', {})
+
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes to spread piste files over (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='ignore the cache and recompute every resort')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
     files = sorted(glob.glob(os.path.join(DATA_DIR, '*.geojson')))
-    results = {}
-    for path in files:
-        slug = os.path.splitext(os.path.basename(path))[0]
-        result = process_file(path)
-        if result:
-            results[slug] = result
-
-    with open(OUTPUT, 'w') as f:
-        json.dump(results, f, indent=2)
-
-    print(f"Computed camera angles for {len(results)}/{len(files)} resorts")
-    print(f"Output: {OUTPUT}")
+    cache = {} if args.force else load_cache()
+    entries = {}
+    todo = []
+    with instrument.span('hash', files=len(files)):
+        for path in files:
+            slug = os.path.splitext(os.path.basename(path))[0]
+            sha = digest(path)
+            if cache.get(slug, {}).get('sha256') == sha:
+                entries[slug] = cache[slug]
+            else:
+                todo.append((slug, sha, path))
+
+    with instrument.span('compute', files=len(todo)):
+        if len(todo) > 1 and args.workers > 1:
+            with ProcessPoolExecutor(min(args.workers, len(todo))) as pool:
+                computed = list(pool.map(process_file, [path for _, _, path in todo],
+                                         chunksize=max(1, len(todo) // (4 * args.workers))))
+        else:
+            computed = [process_file(path) for _, _, path in todo]
+    for (slug, sha, _), result in zip(todo, computed):
+        entries[slug] = {'sha256': sha, 'result': result}
+
+    results = {slug: entries[slug]['result'] for slug in sorted(entries) if entries[slug]['result']}
+
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    write_file(CACHE_PATH, json.dumps({'version': ALGORITHM_VERSION, 'entries': entries}).encode())
+    body = json.dumps(results, indent=2).encode()
+    changed = digest(OUTPUT) != hashlib.sha256(body).hexdigest()
+    if changed:
+        write_file(OUTPUT, body)
+
+    print(f"Computed camera angles for {len(results)}/{len(files)} resorts "
+          f"({len(todo)} recomputed, {len(files) - len(todo)} cached) in {time.perf_counter() - started:.2f}s")
+    print(f"Output: {OUTPUT}" + ("" if changed else " (unchanged)"))
+    if not results:
+        return
     # Summary stats
     zooms = [r['zoom'] for r in results.values()]
     pitches = [r['pitch'] for r in results.values()]
@@ -118,4 +180,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    instrument.main(main)
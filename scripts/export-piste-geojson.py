@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 """Re-export piste data as static GeoJSON for mapbox-gl v2 (no PMTiles protocol support)."""
+import argparse
 import json
-import subprocess
-import time
 from pathlib import Path
 
+import instrument
+from osm import iter_ways
+from overpass import OverpassClient, TokenBucket, add_cache_args, cache_from_args
+
 REGIONS = {
     "vail_bc":       "39.5,-106.55,39.7,-106.3",
     "breck_keystone":"39.45,-106.15,39.65,-105.85",
@@ -27,26 +30,19 @@ REGIONS = {
     "sugarloaf":     "45.0,-70.35,45.08,-70.3",
 }
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 DIFF_MAP = {"novice":"green","easy":"green","intermediate":"blue","advanced":"red","expert":"black","freeride":"double-black"}
 
-def fetch_region(name, bbox):
-    query = f'[out:json][timeout:60];(way["piste:type"="downhill"]({bbox});way["aerialway"]({bbox}););out body;>;out skel qt;'
-    result = subprocess.run(["curl","-sS","--max-time","90","-d",f"data={query}",OVERPASS_URL], capture_output=True, text=True)
-    if result.returncode != 0: return {"elements": []}
-    try: return json.loads(result.stdout)
-    except: return {"elements": []}
+def fetch_region(client, name, bbox):
+    query = f'[out:json][timeout:60];(way["piste:type"="downhill"]({bbox});way["aerialway"]({bbox});)->.w;node(w.w);out skel qt;.w out body;'
+    try:
+        with client.open(query, timeout=90) as fp: return osm_to_features(fp)
+    except Exception: return [], []
 
-def osm_to_features(raw):
-    nodes = {}
-    for el in raw.get("elements", []):
-        if el["type"] == "node": nodes[el["id"]] = [round(el["lon"],6), round(el["lat"],6)]
+def osm_to_features(fp):
     runs, lifts = [], []
-    for el in raw.get("elements", []):
-        if el["type"] != "way": continue
-        tags = el.get("tags", {})
-        coords = [nodes[nid] for nid in el.get("nodes", []) if nid in nodes]
+    for tags, coords in iter_ways(fp):
         if len(coords) < 2: continue
+        coords = [[round(lon,6), round(lat,6)] for lon, lat in coords]
         geom = {"type": "LineString", "coordinates": coords}
         aerialway = tags.get("aerialway", "")
         piste_type = tags.get("piste:type", "")
@@ -59,16 +55,17 @@ def osm_to_features(raw):
     return runs, lifts
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_cache_args(parser)
+    args = parser.parse_args()
+    client = OverpassClient(TokenBucket(1.0, capacity=5), cache_from_args(args))
     out_dir = Path(__file__).resolve().parent.parent / "public" / "data"
     all_features = []
     print("Fetching piste data...")
     for i, (name, bbox) in enumerate(REGIONS.items()):
-        if i > 0 and i % 5 == 0:
-            print("  (rate limit pause)")
-            time.sleep(3)
         print(f"  [{i+1}/{len(REGIONS)}] {name}...", end=" ", flush=True)
-        raw = fetch_region(name, bbox)
-        runs, lifts = osm_to_features(raw)
+        with instrument.span("fetch_region", region=name):
+            runs, lifts = fetch_region(client, name, bbox)
         print(f"{len(runs)} runs, {len(lifts)} lifts")
         all_features.extend(runs)
         all_features.extend(lifts)
@@ -77,7 +74,8 @@ def main():
     out_path = out_dir / "pistes.geojson"
     with open(out_path, "w") as f:
         json.dump(geojson, f)
+    instrument.count("bytes_written", out_path.stat().st_size)
     print(f"\nDone! {out_path} ({out_path.stat().st_size / 1024:.0f}KB, {len(all_features)} features)")
 
 if __name__ == "__main__":
-    main()
+    instrument.main(main)
@@ -1,16 +1,40 @@
 #!/usr/bin/env python3
-"""Fetch world ski resorts from OSM and merge with existing resorts.json"""
+"""Fetch world ski resorts from OSM and merge with existing resorts.json
+
+By default this is one global Overpass query, which the server truncates at
+--limit elements and often times out. --tiled splits the globe into
+TILE_DEG tiles fetched --workers at a time, and subdivides any tile that
+times out or hits the limit. Finished tiles are spooled under .cache/, so an
+interrupted run picks up where it stopped.
+"""
+import argparse
 import json
+import os
 import re
-import urllib.request
-import urllib.parse
+import shutil
+import threading
+import urllib.error
+from collections import deque
 
-EXISTING = "assets/resorts.json"
-OUTPUT = "assets/resorts.json"
+import instrument
+import resort_dedupe
+from geocoder import ReverseGeocoder, is_unknown
+from osm import iter_elements
+from overpass import REPO_ROOT, OverpassClient, TokenBucket, add_cache_args, cache_from_args, remark, run_pool
+from resort_store import ResortStore
+RESULT_LIMIT = 10000
+RATE_PER_S = 1.0
+STATE_DIR = os.path.join(REPO_ROOT, ".cache", "world-ingest")
+TILE_DEG = 30
+MIN_TILE_DEG = 0.25
+TILE_TIMEOUT_S = 90
+# Only these tags are needed downstream; dropping the rest keeps spooled tiles small.
+CANDIDATE_TAGS = ('name', 'website', 'url', 'landuse', 'leisure', 'addr:country', 'is_in:country', 'is_in',
+                  'addr:state')
 
 # Overpass query for ski resorts worldwide
 OVERPASS_QUERY = """
-[out:json][timeout:180];
+[out:json][timeout:{timeout}]{bbox};
 (
   node["landuse"="winter_sports"];
   way["landuse"="winter_sports"];
@@ -23,9 +47,161 @@ OVERPASS_QUERY = """
   node["piste:type"]["name"];
   way["piste:type"]["name"]["landuse"="winter_sports"];
 );
-out center 10000;
+out center {limit};
 """
 
+def world_query(limit, tile=None, timeout=180):
+    """OVERPASS_QUERY, limited to a (south, west, north, east) tile if given."""
+    bbox = "[bbox:{},{},{},{}]".format(*tile) if tile else ""
+    return OVERPASS_QUERY.format(limit=limit, timeout=timeout, bbox=bbox)
+
+def iter_candidates(fp, stats):
+    """Yield a slim candidate dict for every named element; stats["received"] counts all elements."""
+    stats.setdefault('received', 0)
+    for el in iter_elements(fp):
+        stats['received'] += 1
+        tags = el.get('tags', {})
+        name = tags.get('name', '').strip()
+        if not name or len(name) < 2:
+            continue
+
+        # Get coordinates
+        if el['type'] == 'node':
+            lat, lng = el['lat'], el['lon']
+        elif 'center' in el:
+            lat, lng = el['center']['lat'], el['center']['lon']
+        else:
+            continue
+
+        yield {'id': f"{el['type'][0]}{el['id']}", 'name': name, 'lat': lat, 'lon': lng,
+               'tags': {k: tags[k] for k in CANDIDATE_TAGS if k in tags}}
+
+def root_tiles(deg=TILE_DEG):
+    return [(s, w, min(s + deg, 90), min(w + deg, 180)) for s in range(-90, 90, deg) for w in range(-180, 180, deg)]
+
+def split_tile(tile):
+    s, w, n, e = tile
+    lat, lng = (s + n) / 2, (w + e) / 2
+    return [(s, w, lat, lng), (s, lng, lat, e), (lat, w, n, lng), (lat, lng, n, e)]
+
+def tile_key(tile):
+    return "_".join(f"{v:g}" for v in tile)
+
+class IngestState:
+    """On-disk progress of a tiled ingest, so an interrupted run can resume.
+
+    log.txt is append-only with one line per finished tile ("done <key>") or
+    subdivided tile ("split <key>"). A finished tile's candidates are in
+    tiles/<key>.jsonl, written before its log line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.split = set()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, 'tiles'), exist_ok=True)
+        try:
+            with open(os.path.join(path, 'log.txt')) as f:
+                for line in f:
+                    kind, _, key = line.strip().partition(' ')
+                    (self.done if kind == 'done' else self.split).add(key)
+        except FileNotFoundError:
+            pass
+
+    def _log(self, kind, key):
+        with self._lock, open(os.path.join(self.path, 'log.txt'), 'a') as f:
+            f.write(f"{kind} {key}\n")
+
+    def record_done(self, tile, candidates):
+        key = tile_key(tile)
+        path = os.path.join(self.path, 'tiles', f"{key}.jsonl")
+        with open(path + '.tmp', 'w') as f:
+            for c in candidates:
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+        os.replace(path + '.tmp', path)
+        self._log('done', key)
+        self.done.add(key)
+
+    def record_split(self, tile):
+        self._log('split', tile_key(tile))
+        self.split.add(tile_key(tile))
+
+    def frontier(self, tiles):
+        """The tiles still to fetch, expanding any that an earlier run subdivided."""
+        todo = []
+        stack = list(tiles)
+        while stack:
+            tile = stack.pop()
+            key = tile_key(tile)
+            if key in self.split:
+                stack.extend(split_tile(tile))
+            elif key not in self.done:
+                todo.append(tile)
+        return todo
+
+    def candidates(self):
+        """Stream every spooled candidate, once per OSM element."""
+        seen = set()
+        for key in sorted(self.done):
+            with open(os.path.join(self.path, 'tiles', f"{key}.jsonl")) as f:
+                for line in f:
+                    c = json.loads(line)
+                    if c['id'] not in seen:
+                        seen.add(c['id'])
+                        yield c
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+def fetch_tile(client, tile, limit):
+    """Return (candidates, truncated reason or None) for one tile."""
+    stats = {}
+    with instrument.span("fetch_tile", tile=tile_key(tile)):
+        with client.open(world_query(limit, tile, TILE_TIMEOUT_S), timeout=TILE_TIMEOUT_S + 30) as fp:
+            candidates = list(iter_candidates(fp, stats))
+            note = remark(fp)
+    if note:
+        return candidates, note
+    if stats['received'] >= limit:
+        return candidates, f"hit the {limit} element limit"
+    return candidates, None
+
+def is_overload(err):
+    """True for errors a smaller tile may avoid: client-side timeouts and the server's 504."""
+    if isinstance(err, urllib.error.HTTPError):
+        return err.code == 504
+    if isinstance(err, urllib.error.URLError):
+        err = err.reason
+    return isinstance(err, TimeoutError)
+
+def fetch_tiled(client, args):
+    """Fetch every tile, subdividing as needed. Returns (state, tiles that could not be fetched)."""
+    state = IngestState(args.state_dir)
+    pending = deque(state.frontier(root_tiles()))
+    if state.done or state.split:
+        print(f"Resuming: {len(state.done)} tiles already fetched, {len(pending)} to go")
+    failed = []
+    for tile, result, err in run_pool(pending, lambda t: fetch_tile(client, t, args.limit), args.workers):
+        if err is not None and not is_overload(err):
+            print(f"  {tile_key(tile)}: failed ({err})")
+            failed.append(tile)
+            continue
+        candidates, truncated = result if err is None else (None, str(err))
+        if not truncated:
+            state.record_done(tile, candidates)
+            if candidates:
+                print(f"  {tile_key(tile)}: {len(candidates)} named elements")
+            continue
+        if tile[2] - tile[0] <= MIN_TILE_DEG:
+            print(f"  {tile_key(tile)}: giving up ({truncated})")
+            failed.append(tile)
+            continue
+        print(f"  {tile_key(tile)}: splitting ({truncated})")
+        state.record_split(tile)
+        pending.extend(split_tile(tile))
+    return state, failed
+
 def slugify(name):
     s = name.lower().strip()
     s = re.sub(r'[^\w\s-]', '', s)
@@ -38,6 +214,16 @@ def get_country_from_tags(tags):
             return tags[key].split(',')[0].strip()
     return "Unknown"
 
+def unique_slug(name, taken):
+    """slugify(name), suffixed _2, _3, ... if another resort already has it."""
+    base = slug = slugify(name)
+    n = 1
+    while slug in taken:
+        n += 1
+        slug = f"{base}_{n}"
+    taken.add(slug)
+    return slug
+
 def get_region(lat, lng):
     """Rough global region from coordinates"""
     if lat > 20 and -170 < lng < -50:
@@ -57,73 +243,66 @@ def get_region(lat, lng):
     else:
         return "Other"
 
-def get_country_guess(lat, lng):
-    """Very rough country guess from coordinates for resorts missing country"""
-    # This is just a fallback
-    return "Unknown"
-
 def main():
-    # Load existing
-    with open(EXISTING) as f:
-        existing = json.load(f)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=RESULT_LIMIT,
+                        help=f"maximum elements Overpass returns (default {RESULT_LIMIT})")
+    parser.add_argument("--radius", type=float, default=resort_dedupe.RADIUS_M,
+                        help=f"metres within which similarly named resorts merge (default {resort_dedupe.RADIUS_M})")
+    parser.add_argument("--min-similarity", type=float, default=resort_dedupe.MIN_SIMILARITY,
+                        help=f"name similarity needed to merge, 0-1 (default {resort_dedupe.MIN_SIMILARITY})")
+    parser.add_argument("--tiled", action="store_true", help="fetch in adaptive tiles instead of one global query")
+    parser.add_argument("--workers", type=int, default=2, help="concurrent tile queries (default 2)")
+    parser.add_argument("--rate", type=float, default=RATE_PER_S,
+                        help=f"request budget in requests/second (default {RATE_PER_S})")
+    parser.add_argument("--restart", action="store_true", help="discard progress of an interrupted tiled run")
+    parser.add_argument("--state-dir", default=STATE_DIR,
+                        help="where tiled progress is kept (default .cache/world-ingest)")
+    add_cache_args(parser)
+    args = parser.parse_args()
 
-    existing_coords = set()
-    existing_names = set()
-    for feat in existing['features']:
-        coords = feat['geometry']['coordinates']
-        existing_coords.add((round(coords[0], 2), round(coords[1], 2)))
-        existing_names.add(feat['properties']['name'].lower())
+    # Load existing, for deduplication and slugs only: the merge below reloads under the lock
+    existing = ResortStore()
+    anchors = [{'name': r.name, 'lat': r.lat, 'lon': r.lng} for r in existing]
+    slugs = set(existing.slugs())
 
-    print(f"Existing resorts: {len(existing['features'])}")
+    print(f"Existing resorts: {len(existing)}")
 
     # Fetch from Overpass
-    url = "https://overpass-api.de/api/interpreter"
-    data = urllib.parse.urlencode({'data': OVERPASS_QUERY}).encode()
-    req = urllib.request.Request(url, data=data)
-    print("Fetching from Overpass API...")
-    with urllib.request.urlopen(req, timeout=200) as resp:
-        osm_data = json.loads(resp.read())
+    client = OverpassClient(TokenBucket(args.rate), cache_from_args(args), retries=2)
+    # Merge near-duplicates into one canonical resort, dropping any that match an existing one.
+    # Candidates stream straight into the deduper, which keeps only each group's best records.
+    deduper = resort_dedupe.Deduper(anchors, args.radius, min_similarity=args.min_similarity)
+    failed = []
+    if args.tiled:
+        if args.restart:
+            IngestState(args.state_dir).clear()
+        print(f"Fetching from Overpass API in tiles ({args.workers} at a time)...")
+        ingest, failed = fetch_tiled(client, args)
+        print(f"Tiles fetched: {len(ingest.done)}, split: {len(ingest.split)}, failed: {len(failed)}")
+        with instrument.span("dedupe"):
+            for candidate in ingest.candidates():
+                deduper.add(candidate)
+    else:
+        print("Fetching from Overpass API...")
+        fetch_stats = {}
+        with instrument.span("fetch"), client.open(world_query(args.limit), timeout=200) as fp:
+            for candidate in iter_candidates(fp, fetch_stats):
+                deduper.add(candidate)
+        print(f"OSM elements received: {fetch_stats['received']}")
 
-    elements = osm_data.get('elements', [])
-    print(f"OSM elements received: {len(elements)}")
+    groups = deduper.groups()
+    print(f"Named candidates: {len(deduper)}, already known: {deduper.anchored}, "
+          f"merged into {len(groups)} resorts")
 
-    # Process and deduplicate
     new_features = []
-    seen = set()
-
-    for el in elements:
-        tags = el.get('tags', {})
-        name = tags.get('name', '').strip()
-        if not name or len(name) < 2:
-            continue
-
-        # Get coordinates
-        if el['type'] == 'node':
-            lat, lng = el['lat'], el['lon']
-        elif 'center' in el:
-            lat, lng = el['center']['lat'], el['center']['lon']
-        else:
-            continue
-
-        # Skip if too close to existing or duplicate name
-        coord_key = (round(lng, 2), round(lat, 2))
-        name_lower = name.lower()
-
-        if name_lower in existing_names:
-            continue
-        if name_lower in seen:
-            continue
-        if coord_key in existing_coords:
-            continue
-
-        seen.add(name_lower)
+    for best, website in groups:
+        tags = best['tags']
+        name, lat, lng = best['name'], best['lat'], best['lon']
 
         country = get_country_from_tags(tags)
         region = get_region(lat, lng)
-        slug = slugify(name)
-
-        # Extract any available stats
-        website = tags.get('website', tags.get('url', ''))
+        slug = unique_slug(name, slugs)
 
         feature = {
             "type": "Feature",
@@ -152,18 +331,42 @@ def main():
 
         new_features.append(feature)
 
-    print(f"New resorts to add: {len(new_features)}")
+    # Fill country/state the tags did not provide from the offline geocoder,
+    # and spell out tagged country codes ("DE") the way resorts.json names them
+    with instrument.span("geocode", resorts=len(new_features)):
+        geocoder = ReverseGeocoder()
+        located = geocoder.assign([f['geometry']['coordinates'][0] for f in new_features],
+                                  [f['geometry']['coordinates'][1] for f in new_features])
+    for feature, (country, state) in zip(new_features, located):
+        props = feature['properties']
+        if not is_unknown(props['country']):
+            props['country'] = geocoder.country_name(props['country'])
+        elif country:
+            props['country'] = country
+        if state and is_unknown(props['state']):
+            props['state'] = state
 
-    # Merge
-    existing['features'].extend(new_features)
-    existing['features'].sort(key=lambda f: f['properties']['name'])
+    print(f"New resorts to add: {len(new_features)}")
 
-    print(f"Total resorts: {len(existing['features'])}")
+    # Merge into a fresh load, keeping whatever other steps saved during the fetch
+    with ResortStore.edit() as store:
+        taken = set(store.slugs())
+        for feature in new_features:
+            props = feature['properties']
+            if props['slug'] in taken:  # claimed by a resort saved since the first load
+                props['slug'] = unique_slug(props['name'], taken)
+            taken.add(props['slug'])
+            store.add(feature)
+        store.sort()
 
-    with open(OUTPUT, 'w') as f:
-        json.dump(existing, f, indent=2, ensure_ascii=False)
+    print(f"Total resorts: {len(store)}")
+    if new_features:
+        print(f"Written to {store.path}")
 
-    print(f"Written to {OUTPUT}")
+    if failed:
+        print(f"WARNING: {len(failed)} tiles could not be fetched; run again to retry just those")
+    elif args.tiled:
+        ingest.clear()
 
 if __name__ == '__main__':
-    main()
+    instrument.main(main)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Offline reverse geocoder: country and first-level subdivision for a lon/lat.
+
+Backed by assets/geo/admin-places.npz (built by build_admin_places.py from
+GeoNames), about 170k populated places each tagged with its country and
+admin1 region. A point takes the country and subdivision of its nearest
+place, found with a KD-tree over unit-sphere vectors. Chord distance on the
+sphere has no antimeridian seam and ranks like great-circle distance.
+Points farther than MAX_DISTANCE_KM from any place stay unassigned.
+
+Run directly to fill "Unknown" country/state values in assets/resorts.json.
+Countries given as an ISO code ("US", "DE") or with stray whitespace are
+rewritten to the dataset's spelling of the name at the same time.
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+import instrument
+from resort_store import ResortStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(REPO_ROOT, "assets", "geo", "admin-places.npz")
+LEAF_SIZE = 16
+COORD_SCALE = 1e5  # places are stored as int32 degrees * COORD_SCALE
+EARTH_RADIUS_KM = 6371.0088
+# Ski areas sit in the hills above their towns, but rarely this far out.
+MAX_DISTANCE_KM = 60.0
+UNKNOWN = "Unknown"
+
+
+def unit_vectors(lon, lat):
+    """(n, 3) unit-sphere vectors for lon/lat arrays in degrees."""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class ReverseGeocoder:
+    def __init__(self, path=DATA_PATH, max_distance_km=MAX_DISTANCE_KM):
+        with np.load(path) as data:
+            self.xyz = unit_vectors(data["lon"] / COORD_SCALE, data["lat"] / COORD_SCALE)
+            self.country = data["country"]
+            self.admin1 = data["admin1"]
+            self.country_names = data["country_names"].tolist()
+            codes = data["country_codes"].tolist()
+            self.admin1_names = data["admin1_names"].tolist()
+        # Split coordinates as plain floats: the descent compares one at a time.
+        self.splits = self.xyz.tolist()
+        chord = 2 * math.sin(max_distance_km / EARTH_RADIUS_KM / 2)
+        self.max_d2 = chord * chord
+        self.names_by_code = dict(zip(codes, self.country_names))
+
+    def nearest(self, q):
+        """Index of the stored place nearest unit vector q and its squared chord distance."""
+        xyz, splits = self.xyz, self.splits
+        qv = np.asarray(q)
+        best_d2, best = self.max_d2, -1
+        stack = [(0, len(xyz), 0, 0.0)]
+        while stack:
+            lo, hi, depth, bound = stack.pop()
+            if bound >= best_d2:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                d2 = ((xyz[lo:hi] - qv) ** 2).sum(axis=1)
+                k = int(d2.argmin())
+                if d2[k] < best_d2:
+                    best_d2, best = float(d2[k]), lo + k
+                continue
+            mid = (lo + hi) // 2
+            axis = depth % 3
+            s = splits[mid]
+            d2 = (q[0] - s[0]) ** 2 + (q[1] - s[1]) ** 2 + (q[2] - s[2]) ** 2
+            if d2 < best_d2:
+                best_d2, best = d2, mid
+            diff = q[axis] - s[axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            # Far side first so the near side is searched first and tightens best_d2.
+            stack.append((*far, depth + 1, diff * diff))
+            stack.append((*near, depth + 1, 0.0))
+        return best, best_d2
+
+    def lookup(self, lng, lat):
+        """Return (country, subdivision) for one point; (None, None) when no place is close enough."""
+        return self.assign([lng], [lat])[0]
+
+    def assign(self, lngs, lats):
+        """Batch lookup over sequences of lon/lat. Returns a list of (country, subdivision) tuples.
+
+        The subdivision is None when GeoNames has none for the nearest place.
+        """
+        out = []
+        for q in unit_vectors(np.asarray(lngs, dtype=np.float64), np.asarray(lats, dtype=np.float64)).tolist():
+            i, _ = self.nearest(q)
+            if i < 0:
+                out.append((None, None))
+            else:
+                out.append((self.country_names[self.country[i]], self.admin1_names[self.admin1[i]] or None))
+        return out
+
+
+    def country_name(self, value):
+        """value with surrounding whitespace removed, or the country's name if it is an ISO 3166 alpha-2 code."""
+        value = value.strip()
+        return self.names_by_code.get(value.upper(), value) if len(value) == 2 else value
+
+
+def is_unknown(value):
+    return not value or not str(value).strip() or value == UNKNOWN
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--overwrite", action="store_true",
+                        help="replace every country/state, not just missing or Unknown ones")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    store = ResortStore()
+    resorts = list(store)
+
+    t0 = time.perf_counter()
+    with instrument.span("load_places"):
+        geocoder = ReverseGeocoder()
+    loaded = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with instrument.span("assign", resorts=len(resorts)):
+        results = geocoder.assign([r.lng for r in resorts], [r.lat for r in resorts])
+    elapsed = time.perf_counter() - t0
+
+    countries = states = unmatched = renamed = 0
+    for resort, (country, state) in zip(resorts, results):
+        props = resort.properties
+        if not is_unknown(props.get("country")):
+            name = geocoder.country_name(props["country"])
+            renamed += name != props["country"]
+            props["country"] = name
+        if country is None:
+            unmatched += 1
+            continue
+        if args.overwrite or is_unknown(props.get("country")):
+            countries += props.get("country") != country
+            props["country"] = country
+        if state and (args.overwrite or is_unknown(props.get("state"))):
+            states += props.get("state") != state
+            props["state"] = state
+
+    print(f"Geocoded {len(resorts)} resorts in {elapsed * 1000:.0f} ms (data loaded in {loaded * 1000:.0f} ms)")
+    print(f"  country set: {countries}, state set: {states}, no place within {MAX_DISTANCE_KM:.0f} km: {unmatched}, "
+          f"countries respelled: {renamed}")
+
+    if not args.dry_run:
+        store.save()
+
+
+if __name__ == "__main__":
+    instrument.main(main)
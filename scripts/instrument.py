@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Run reports for the pipeline scripts: timed spans, I/O counters and optional profiles.
+
+Scripts start through instrument.main(main), which writes one JSON object
+per line to the run report:
+
+    {"type": "start", "script", "argv", "pid", "time"}
+    {"type": "span", "id", "parent", "name", "start", "duration_s",
+     "attrs"?, "counters"?, "error"?}                       one per finished span
+    {"type": "alloc", "file", "line", "size", "count"}      tracemalloc top allocations
+    {"type": "run", "script", "status", "duration_s", "cpu_s",
+     "max_rss_bytes", "counters", "profile"?}               last line
+
+Spans nest: a span's counters include everything counted inside it, in any
+thread or asyncio task started from it. The shared modules already count
+bytes_downloaded, cache_hits, retries and sleep_s (overpass, prefetch_snow),
+elements_parsed (osm) and bytes_written (resort_store, piste_output).
+Outside instrument.main nothing is recorded and span/count are near-free.
+
+Environment:
+    PIPELINE_REPORT   report path (default .cache/runs/<script>-<time>-<pid>.jsonl);
+                      "off" disables the report
+    PIPELINE_PROFILE  comma-separated: "cprofile" writes <report>.prof,
+                      "tracemalloc" adds the top allocations to the report
+
+Summarize a report by span name, slowest first:
+
+    python3 scripts/instrument.py .cache/runs/update_passes-....jsonl
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS_DIR = os.path.join(REPO_ROOT, ".cache", "runs")
+TOP_ALLOCATIONS = 25
+
+_run = None
+_current = contextvars.ContextVar("instrument_span", default=None)
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "attrs", "counters")
+
+    def __init__(self, span_id, parent, name, attrs):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.counters = {}
+
+
+class Run:
+    def __init__(self, script, path):
+        self.script = script
+        self.path = path
+        self.pid = os.getpid()
+        self.counters = {}
+        self.lock = threading.Lock()
+        self._ids = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a")
+
+    def next_id(self):
+        with self.lock:
+            self._ids += 1
+            return self._ids
+
+    def emit(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            self._file.write(line)
+
+    def close(self):
+        self._file.close()
+
+
+def _active():
+    # Worker processes forked from an instrumented script inherit _run; only the parent reports.
+    run = _run
+    return run if run is not None and run.pid == os.getpid() else None
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a named span (e.g. span("fetch", resort=slug)). Yields the Span, or None when not recording."""
+    run = _active()
+    if run is None:
+        yield None
+        return
+    parent = _current.get()
+    current = Span(run.next_id(), parent, name, attrs)
+    token = _current.set(current)
+    start = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        _current.reset(token)
+        record = {"type": "span", "id": current.id, "parent": parent.id if parent else None, "name": name,
+                  "start": round(start, 6), "duration_s": round(duration, 6)}
+        if attrs:
+            record["attrs"] = attrs
+        if current.counters:
+            record["counters"] = current.counters
+        if error:
+            record["error"] = error
+        run.emit(record)
+
+
+def count(name, n=1):
+    """Add n to a counter for the run and for every open span around the caller."""
+    run = _active()
+    if run is None:
+        return
+    with run.lock:
+        run.counters[name] = run.counters.get(name, 0) + n
+        s = _current.get()
+        while s is not None:
+            s.counters[name] = s.counters.get(name, 0) + n
+            s = s.parent
+
+
+def sleep(seconds):
+    """time.sleep, counted as sleep_s."""
+    count("sleep_s", seconds)
+    time.sleep(seconds)
+
+
+def child_env(name):
+    """os.environ for a child script, reporting to <this run's report>.<name>.jsonl when this run reports."""
+    run = _active()
+    if run is None:
+        return dict(os.environ)
+    return {**os.environ, "PIPELINE_REPORT": f"{os.path.splitext(run.path)[0]}.{name}.jsonl"}
+
+
+def _report_path(script):
+    path = os.environ.get("PIPELINE_REPORT")
+    if path:
+        return None if path.lower() in ("off", "0", "false", "no") else path
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(RUNS_DIR, f"{script}-{stamp}-{os.getpid()}.jsonl")
+
+
+@contextmanager
+def run(script):
+    """Record a run of `script` to its report while the block executes."""
+    global _run
+    path = _report_path(script)
+    if path is None or _active() is not None:
+        yield
+        return
+    profiles = {p.strip() for p in os.environ.get("PIPELINE_PROFILE", "").lower().split(",") if p.strip()}
+    _run = current = Run(script, path)
+    current.emit({"type": "start", "script": script, "argv": sys.argv[1:], "pid": current.pid,
+                  "time": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+    profiler = None
+    if "cprofile" in profiles:
+        import cProfile
+        profiler = cProfile.Profile()
+    if "tracemalloc" in profiles:
+        import tracemalloc
+        tracemalloc.start()
+    status = "ok"
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        if profiler:
+            profiler.enable()
+        yield
+    except SystemExit as e:
+        status = "ok" if e.code in (None, 0) else f"exit {e.code}" if isinstance(e.code, int) else "exit 1"
+        raise
+    except BaseException as e:
+        status = f"error {type(e).__name__}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        record = {"type": "run", "script": script, "status": status,
+                  "duration_s": round(time.perf_counter() - t0, 6),
+                  "cpu_s": round(time.process_time() - cpu0, 6),
+                  "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                  "counters": current.counters}
+        if profiler:
+            record["profile"] = os.path.splitext(path)[0] + ".prof"
+            profiler.dump_stats(record["profile"])
+        if "tracemalloc" in profiles:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                current.emit({"type": "alloc", "file": frame.filename, "line": frame.lineno,
+                              "size": stat.size, "count": stat.count})
+        current.emit(record)
+        current.close()
+        _run = None
+        print(f"Run report: {path}", file=sys.stderr)
+
+
+def main(fn, script=None):
+    """Call a script's main function inside run()."""
+    with run(script or os.path.splitext(os.path.basename(sys.argv[0]))[0].replace("-", "_")):
+        return fn()
+
+
+def summarize(path, out=sys.stdout):
+    """Print a report's spans grouped by name (count, total, mean, max) and the run counters."""
+    groups = {}
+    totals = None
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "span":
+                g = groups.setdefault(record["name"], {"n": 0, "total": 0.0, "max": 0.0})
+                g["n"] += 1
+                g["total"] += record["duration_s"]
+                g["max"] = max(g["max"], record["duration_s"])
+            elif record["type"] == "run":
+                totals = record
+    print(f"{'span':28}{'count':>8}{'total s':>10}{'mean s':>10}{'max s':>10}", file=out)
+    for name, g in sorted(groups.items(), key=lambda item: -item[1]["total"]):
+        print(f"{name:28}{g['n']:>8}{g['total']:10.3f}{g['total'] / g['n']:10.4f}{g['max']:10.3f}", file=out)
+    if totals:
+        print(f"\n{totals['script']}: {totals['status']}, {totals['duration_s']:.2f}s wall, "
+              f"{totals['cpu_s']:.2f}s CPU, {totals['max_rss_bytes'] / 2**20:.0f} MB peak RSS", file=out)
+        for k, v in sorted(totals["counters"].items()):
+            print(f"  {k:20}{v:>16,.1f}" if isinstance(v, float) else f"  {k:20}{v:>16,}", file=out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("report", help="a JSON-lines run report")
+    summarize(parser.parse_args().report)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Open-Meteo forecast and archive APIs, for running the snow stages offline.
+
+Serves GET /v1/forecast with the fields prefetch_snow.py asks for, and
+GET /v1/archive with the daily history build_snow_percentiles.py asks for
+(snowfall_sum and snow_depth_max between start_date and end_date), for any
+number of comma-separated latitude/longitude pairs: one object for a single
+location, a list otherwise, like the real API. Values are deterministic
+functions of the coordinates and date (colder and snowier towards the
+poles, snowiest in the local winter), so repeated runs are comparable. --fail-rate answers that share of requests
+with HTTP 429, --latency-ms delays every response, and the server prints
+request/location counts when stopped.
+
+    python3 scripts/open_meteo_standin.py --port 8765
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_LOCATIONS = 1000
+
+
+def _noise(lat, lng, salt):
+    """Stable pseudo-random value in [0, 1) for a coordinate."""
+    return random.Random(f"{lat:.4f},{lng:.4f},{salt}").random()
+
+
+def forecast(lat, lng, days=7):
+    cold = min(abs(lat) / 60, 1.0)
+    snowy = _noise(lat, lng, "snow") * cold
+    daily = [round(max(0.0, (_noise(lat, lng, d) - 0.5) * 30 * snowy), 1) for d in range(days)]
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "current": {
+            "temperature_2m": round(25 - 35 * cold + 10 * _noise(lat, lng, "t"), 1),
+            "snow_depth": round(3 * snowy * _noise(lat, lng, "depth"), 2),
+            "snowfall": round(daily[0] / 24, 2),
+            "wind_speed_10m": round(40 * _noise(lat, lng, "wind"), 1),
+            "weather_code": [0, 1, 3, 71, 73, 75][int(6 * _noise(lat, lng, "code"))],
+        },
+        "daily": {"snowfall_sum": daily},
+    }
+
+
+def _season_year(lat, lng, year):
+    """Daily snowfall noise for one location and calendar year, and that winter's snowiness."""
+    rng = random.Random(f"{lat:.4f},{lng:.4f},{year}")
+    return [rng.random() for _ in range(366)], 0.6 + 0.8 * rng.random()
+
+
+def archive(lat, lng, start, end):
+    cold = min(abs(lat) / 60, 1.0)
+    snowy = _noise(lat, lng, "snow") * cold
+    peak = 31 if lat >= 0 else 212  # day of year of mid-winter
+    years = {}
+    times, snowfall, depth = [], [], []
+    day = start
+    while day <= end:
+        if day.year not in years:
+            years[day.year] = _season_year(lat, lng, day.year)
+        noise, winter = years[day.year]
+        doy = day.timetuple().tm_yday - 1
+        # 1 in mid-winter, 0 from half a year away until the season comes round again
+        season = max(0.0, math.cos(2 * math.pi * (doy - peak) / 365)) ** 1.5
+        times.append(day.isoformat())
+        snowfall.append(round(max(0.0, noise[doy] - 0.55) * 40 * snowy * season * winter, 2))
+        depth.append(round(3 * snowy * season * winter, 2))
+        day += timedelta(days=1)
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "daily": {"time": times, "snowfall_sum": snowfall, "snow_depth_max": depth},
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path not in ("/v1/forecast", "/v1/archive"):
+            return self._send(404, {"error": True, "reason": f"unknown endpoint {url.path}"})
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            lats = [float(v) for v in query["latitude"][0].split(",")]
+            lngs = [float(v) for v in query["longitude"][0].split(",")]
+            days = int(query.get("forecast_days", ["7"])[0])
+            if url.path == "/v1/archive":
+                start = date.fromisoformat(query["start_date"][0])
+                end = date.fromisoformat(query["end_date"][0])
+        except (KeyError, ValueError):
+            reason = "latitude and longitude are required"
+            if url.path == "/v1/archive":
+                reason += ", and start_date and end_date as YYYY-MM-DD"
+            return self._send(400, {"error": True, "reason": reason})
+        if len(lats) != len(lngs) or len(lats) > MAX_LOCATIONS:
+            return self._send(400, {"error": True, "reason": "latitude/longitude count mismatch or too many"})
+
+        server = self.server
+        if server.latency_s:
+            time.sleep(server.latency_s)
+        with server.lock:
+            server.requests += 1
+            fail = server.rng.random() < server.fail_rate
+            if not fail:
+                server.locations += len(lats)
+        if fail:
+            return self._send(429, {"error": True, "reason": "Too many concurrent requests"})
+        if url.path == "/v1/archive":
+            results = [archive(lat, lng, start, end) for lat, lng in zip(lats, lngs)]
+        else:
+            results = [forecast(lat, lng, days) for lat, lng in zip(lats, lngs)]
+        self._send(200, results[0] if len(results) == 1 else results)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port=8765, fail_rate=0.0, latency_ms=0, seed=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.fail_rate = fail_rate
+    server.latency_s = latency_ms / 1000
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = server.locations = 0
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--latency-ms", type=int, default=0, help="delay added to every response")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.fail_rate, args.latency_ms, args.seed)
+    print(f"Open-Meteo stand-in on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\nServed {server.requests} requests, {server.locations} locations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Shared Overpass API helpers for the piste and resort fetch scripts."""
+
+import contextvars
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+import instrument
+from piste_output import M_PER_DEG, segment_distance
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+USER_AGENT = "skimail-mvp/1.0"
+EARTH_RADIUS_M = 6_371_000
+
+CACHE_DIR = os.environ.get("OVERPASS_CACHE_DIR", os.path.join(REPO_ROOT, ".cache", "overpass"))
+CACHE_TTL_H = 7 * 24
+CACHE_MAX_MB = 1024
+CHUNK_SIZE = 1 << 16
+_REMARK = re.compile(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in --offline mode when a query has no cached response."""
+
+
+class ResponseCache:
+    """On-disk Overpass response cache keyed by the SHA-256 of the query text.
+
+    Entries older than ttl_s are ignored (except when offline, which replays
+    anything on disk). Hits bump the file mtime, so evicting the oldest mtimes
+    first once the directory exceeds max_bytes gives LRU order.
+    """
+
+    def __init__(self, path=CACHE_DIR, ttl_s=CACHE_TTL_H * 3600,
+                 max_bytes=CACHE_MAX_MB * 1024 * 1024, offline=False):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(query):
+        return hashlib.sha256(query.strip().encode()).hexdigest()
+
+    def _file(self, query):
+        return os.path.join(self.path, self.key(query) + ".json")
+
+    def open(self, query):
+        """Return the cached response as an open binary file, or None."""
+        path = self._file(query)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not self.offline and time.time() - st.st_mtime > self.ttl_s:
+            return None
+        os.utime(path)
+        return open(path, "rb")
+
+    def put(self, query, src):
+        """Store the remainder of the binary file object src as the response to query."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(src, f, CHUNK_SIZE)
+        os.replace(tmp, self._file(query))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".json"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def add_cache_args(parser):
+    parser.add_argument("--offline", action="store_true",
+                        help="replay Overpass responses from the cache only; never touch the network")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the Overpass response cache")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_H,
+                        help=f"hours a cached response stays fresh (default {CACHE_TTL_H})")
+
+
+def cache_from_args(args):
+    if args.no_cache and not args.offline:
+        return None
+    return ResponseCache(ttl_s=args.cache_ttl * 3600, offline=args.offline)
+
+
+class OverpassClient:
+    """Issues Overpass queries through an optional cache, rate budget and retry policy."""
+
+    def __init__(self, bucket=None, cache=None, retries=0, backoff_s=2, url=OVERPASS_URL):
+        self.bucket = bucket
+        self.cache = cache
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.url = url
+
+    def open(self, query, timeout=60):
+        """Return the response to an Overpass QL query as a binary file object.
+
+        Network responses are spooled to a temporary file rather than held in
+        memory, so callers can stream-parse arbitrarily large results.
+        """
+        if self.cache is not None:
+            f = self.cache.open(query)
+            if f is not None:
+                instrument.count("cache_hits")
+                return f
+            if self.cache.offline:
+                raise OfflineCacheMiss(f"no cached response for query {self.cache.key(query)[:12]}")
+
+        data = urllib.parse.urlencode({"data": query}).encode()
+        for attempt in range(self.retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            f = tempfile.TemporaryFile()
+            try:
+                with instrument.span("overpass", attempt=attempt):
+                    req = urllib.request.Request(self.url, data=data)
+                    req.add_header("User-Agent", USER_AGENT)
+                    with urllib.request.urlopen(req, timeout=timeout) as resp:
+                        shutil.copyfileobj(resp, f, CHUNK_SIZE)
+                    instrument.count("bytes_downloaded", f.tell())
+                break
+            except Exception as e:
+                f.close()
+                if attempt < self.retries:
+                    wait = self.backoff_s * (attempt + 2)
+                    print(f"  retry {attempt+1} in {wait}s: {e}", flush=True)
+                    instrument.count("retries")
+                    instrument.sleep(wait)
+                else:
+                    raise
+
+        # Never cache a response that was cut short (see remark()).
+        if self.cache is not None and remark(f) is None:
+            self.cache.put(query, f)
+        f.seek(0)
+        return f
+
+    def query(self, query, timeout=60):
+        """Return the raw response body for an Overpass QL query."""
+        with self.open(query, timeout) as f:
+            return f.read()
+
+
+def remark(f):
+    """Return the trailing "remark" of a spooled response, or None.
+
+    Overpass reports timeouts and memory exhaustion this way, on an otherwise
+    successful response whose elements are truncated. Leaves f rewound.
+    """
+    f.seek(0, os.SEEK_END)
+    f.seek(max(0, f.tell() - 2048))
+    tail = f.read().decode("utf-8", "replace")
+    f.seek(0)
+    m = _REMARK.search(tail)
+    return json.loads(m.group(1)) if m else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests/second with bursts of `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            instrument.sleep(delay)
+            waited += delay
+
+
+def run_pool(items, fn, workers=2):
+    """Call fn(item) for every item on a thread pool.
+
+    Yields (item, result, error) in completion order so callers can write each
+    result as soon as it is ready. Exactly one of result/error is meaningful.
+    At most `workers` items are in flight at once; if items is a deque, the
+    caller may append follow-up work to it while iterating.
+    """
+    pending = items if isinstance(items, deque) else deque(items)
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            while pending and len(running) < workers:
+                item = pending.popleft()
+                # Run in a copy of the caller's context so spans opened by fn nest under the caller's.
+                running[pool.submit(contextvars.copy_context().run, fn, item)] = item
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                item = running.pop(fut)
+                try:
+                    yield item, fut.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def cluster_points(points, link_m, max_members=8):
+    """Group (lat, lon) points whose distance is below link_m.
+
+    Single-linkage over a uniform grid so only neighbouring cells are compared.
+    Clusters are capped at max_members so one query never grows unbounded; the
+    overflow simply starts a new cluster. Returns lists of indexes into points.
+    """
+    cell = link_m / 111_320.0
+    grid = {}
+    for i, (lat, lon) in enumerate(points):
+        grid.setdefault((int(lat // cell), int(lon // cell)), []).append(i)
+
+    cluster_of = [None] * len(points)
+    clusters = []
+    for i in range(len(points)):
+        if cluster_of[i] is not None:
+            continue
+        members = [i]
+        cluster_of[i] = len(clusters)
+        queue = [i]
+        while queue and len(members) < max_members:
+            lat, lon = points[queue.pop()]
+            # Longitude cells shrink towards the poles, so widen the search there.
+            span = int(1 / max(math.cos(math.radians(lat)), 0.1)) + 1
+            ci, cj = int(lat // cell), int(lon // cell)
+            for di in (-1, 0, 1):
+                for dj in range(-span, span + 1):
+                    for j in grid.get((ci + di, cj + dj), ()):
+                        if cluster_of[j] is not None or len(members) >= max_members:
+                            continue
+                        if haversine_m(lat, lon, *points[j]) <= link_m:
+                            cluster_of[j] = cluster_of[i]
+                            members.append(j)
+                            queue.append(j)
+        clusters.append(members)
+    return clusters
+
+
+def split_by_distance(features, centers, radius_m):
+    """Assign LineString features to every (lat, lon) center they pass within radius_m of.
+
+    Mirrors the per-resort `around:` filter, which matches a way when any of
+    its segments (not just its vertices) comes within the radius, so a way
+    shared by two resorts is written to both. Returns one feature list per center.
+    """
+    out = [[] for _ in centers]
+    dlat = radius_m / M_PER_DEG
+    for feat in features:
+        coords = np.asarray(feat["geometry"]["coordinates"], dtype=np.float64)[:, :2]
+        (lon_min, lat_min), (lon_max, lat_max) = coords.min(axis=0), coords.max(axis=0)
+        for k, (lat, lon) in enumerate(centers):
+            k_lon = math.cos(math.radians(lat))
+            dlon = dlat / max(k_lon, 0.01)
+            if lat_min > lat + dlat or lat_max < lat - dlat or lon_min > lon + dlon or lon_max < lon - dlon:
+                continue
+            # Equirectangular metres around the center, which sits at the origin.
+            xy = (coords - (lon, lat)) * (M_PER_DEG * k_lon, M_PER_DEG)
+            if len(xy) == 1:
+                dist = float(np.hypot(*xy[0]))
+            else:
+                dist = float(segment_distance(np.zeros_like(xy[1:]), xy[:-1], xy[1:]).min())
+            if dist <= radius_m:
+                out[k].append(feat)
+    return out
@@ -0,0 +1,166 @@
+"""Match resorts to ski passes from the tables in assets/passes/.
+
+Each assets/passes/<pass>.json file describes one pass:
+
+    {
+      "pass": "Indy",
+      "names": ["Bolton Valley Resort", {"name": "Black Mountain Ski Area", "near": [lng, lat], "radius_km": 30}],
+      "patterns": [{"text": "chamonix", "near": [6.87, 45.92], "radius_km": 40}]
+    }
+
+"names" match the whole resort name and "patterns" match anywhere in it.
+Both are compared after normalize(), and either can be a bare string or an
+object with an optional "near" [lng, lat] and "radius_km" geo constraint.
+Files are applied in "priority" order (then file name) when a resort
+matches more than one pass.
+
+PassMatcher compiles every table once, into a hash index of normalized
+names and a single Aho-Corasick automaton over all patterns. Classifying a
+resort then costs one dict lookup plus one scan of its name, however many
+passes and entries there are.
+"""
+
+import glob
+import json
+import os
+import re
+import unicodedata
+from collections import deque
+
+from overpass import haversine_m
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSES_DIR = os.path.join(REPO_ROOT, "assets", "passes")
+
+_ABBREVIATIONS = {"mt": "mount", "st": "saint", "ste": "saint"}
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize(name):
+    """Lowercase, accent-free, punctuation-free form of a name with "Mt"/"St" spelled out."""
+    s = name
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(c for c in s if not unicodedata.combining(c))
+    s = _PUNCTUATION.sub(" ", s.lower())
+    return " ".join([_ABBREVIATIONS.get(w, w) for w in s.split()])
+
+
+def load_tables(path=PASSES_DIR):
+    tables = []
+    for file in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(file) as f:
+            table = json.load(f)
+        table.setdefault("priority", 100)
+        table["file"] = os.path.basename(file)
+        tables.append(table)
+    tables.sort(key=lambda t: (t["priority"], t["file"]))
+    return tables
+
+
+class AhoCorasick:
+    """Multi-pattern substring search: finds every pattern occurring in a text in one pass over it."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for i, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append(i)
+
+        # Breadth-first, so a node's failure link is final before its children need it.
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                nxt = self.goto[f].get(ch, 0)
+                self.fail[child] = nxt if nxt != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find(self, text):
+        """Return the set of indexes of the patterns that occur in text."""
+        found = set()
+        node = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+def _rule(entry, key, kind, table):
+    if isinstance(entry, str):
+        entry = {key: entry}
+    return {
+        "pass": table["pass"],
+        "priority": (table["priority"], table["file"]),
+        "kind": kind,
+        "text": entry[key],
+        "near": entry.get("near"),
+        "radius_m": entry.get("radius_km", 50) * 1000,
+    }
+
+
+class PassMatcher:
+    def __init__(self, tables):
+        self.rules = []
+        self.names = {}  # normalized name -> rule indexes
+        patterns = {}  # normalized pattern -> rule indexes
+        for table in tables:
+            for entry in table.get("names", ()):
+                rule = _rule(entry, "name", "name", table)
+                self.rules.append(rule)
+                self.names.setdefault(normalize(rule["text"]), []).append(len(self.rules) - 1)
+            for entry in table.get("patterns", ()):
+                rule = _rule(entry, "text", "pattern", table)
+                self.rules.append(rule)
+                patterns.setdefault(normalize(rule["text"]), []).append(len(self.rules) - 1)
+        self.pattern_rules = list(patterns.values())
+        self.automaton = AhoCorasick(list(patterns))
+
+    def _allowed(self, rule, lng, lat):
+        if rule["near"] is None:
+            return True
+        if lng is None:
+            return False
+        near_lng, near_lat = rule["near"]
+        return haversine_m(lat, lng, near_lat, near_lng) <= rule["radius_m"]
+
+    def match(self, name, lng=None, lat=None):
+        """Return the indexes of every rule matching a resort, best pass first."""
+        key = normalize(name)
+        candidates = list(self.names.get(key, ()))
+        for i in self.automaton.find(key):
+            candidates.extend(self.pattern_rules[i])
+        if not candidates:
+            return []
+        hits = {r for r in candidates if self._allowed(self.rules[r], lng, lat)}
+        return sorted(hits, key=lambda r: (self.rules[r]["priority"], r))
+
+    def classify(self, features):
+        """Match every GeoJSON resort feature. Returns one list of matching rule indexes per feature."""
+        results = []
+        for feat in features:
+            lng, lat = feat["geometry"]["coordinates"][:2]
+            results.append(self.match(feat["properties"]["name"], lng, lat))
+        return results
+
+    def unmatched(self, results):
+        """Rules that matched no resort in a classify() result, as (pass, kind, text)."""
+        used = {r for hits in results for r in hits}
+        return [(rule["pass"], rule["kind"], rule["text"]) for i, rule in enumerate(self.rules) if i not in used]
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Compact binary encoding of per-resort piste FeatureCollections (<slug>.skp).
+
+Layout (all integers are unsigned LEB128 varints unless noted):
+
+    magic           4 bytes, b"SKP1"
+    precision       decimal places p; coordinates are stored as round(value * 10**p)
+    string count    then for each string: byte length, UTF-8 bytes
+    feature length  byte length of the feature block
+    feature block   for each feature: point count, property count, then
+                    (key index, value index) pairs into the string table
+    coord length    byte length of the coordinate block
+    coord block     2 x total points zigzag varints: lon delta, lat delta, ...
+                    Deltas run across feature boundaries, starting from (0, 0).
+
+Only 2-D LineString geometries with string-valued properties are supported,
+which is everything the piste pipeline writes. Both blocks hold nothing but
+varints so decode() unpacks each in a single NumPy pass.
+
+Run directly to write a .skp beside every GeoJSON in public/data/pistes, or
+with --verify to round-trip every file and compare size and decode time.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+import instrument
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PISTES_DIR = os.path.join(REPO_ROOT, "public", "data", "pistes")
+PRECISION = 5  # the precision piste_output quantizes to, so nothing further is lost
+
+MAGIC = b"SKP1"
+EXT = ".skp"
+
+
+def _write_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _decode_varints(block):
+    """Decode a bytes object made only of varints into an int64 array."""
+    b = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shift = 7 * (np.arange(len(b)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((b & 0x7F).astype(np.int64) << shift, starts)
+
+
+def _quantize(coords, precision):
+    arr = np.asarray(coords, dtype=np.float64)
+    if arr.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    if arr.ndim != 2 or arr.shape[-1] != 2:
+        raise ValueError(f"only [lon, lat] positions are supported, got shape {arr.shape}")
+    return np.round(arr * 10 ** precision).astype(np.int64)
+
+
+def encode(collection, precision=PRECISION):
+    """Encode a GeoJSON FeatureCollection dict to bytes."""
+    strings = {}
+
+    def intern(s):
+        if not isinstance(s, str):
+            raise ValueError(f"only string properties are supported, got {s!r}")
+        return strings.setdefault(s, len(strings))
+
+    features = collection["features"]
+    header = bytearray()
+    coords = []
+    for feat in features:
+        geom = feat["geometry"]
+        if geom["type"] != "LineString":
+            raise ValueError(f"unsupported geometry {geom['type']}")
+        props = feat.get("properties") or {}
+        _write_varint(header, len(geom["coordinates"]))
+        _write_varint(header, len(props))
+        for k, v in props.items():
+            _write_varint(header, intern(k))
+            _write_varint(header, intern(v))
+        coords.extend(geom["coordinates"])
+
+    scaled = _quantize(coords, precision)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    block = bytearray()
+    for d in ((deltas << 1) ^ (deltas >> 63)).tolist():
+        _write_varint(block, d)
+
+    out = bytearray(MAGIC)
+    _write_varint(out, precision)
+    _write_varint(out, len(strings))
+    for s in strings:
+        raw = s.encode()
+        _write_varint(out, len(raw))
+        out += raw
+    _write_varint(out, len(header))
+    out += header
+    _write_varint(out, len(block))
+    out += block
+    return bytes(out)
+
+
+def decode_arrays(data):
+    """Decode without building GeoJSON: returns (properties, offsets, coords).
+
+    coords is an (n, 2) float64 array of lon/lat and feature i spans
+    coords[offsets[i]:offsets[i + 1]].
+    """
+    if data[:4] != MAGIC:
+        raise ValueError("not a .skp piste file")
+    pos = 4
+    precision, pos = _read_varint(data, pos)
+    n_strings, pos = _read_varint(data, pos)
+    strings = []
+    for _ in range(n_strings):
+        n, pos = _read_varint(data, pos)
+        strings.append(data[pos:pos + n].decode())
+        pos += n
+
+    n_header, pos = _read_varint(data, pos)
+    header = _decode_varints(data[pos:pos + n_header]).tolist() if n_header else []
+    pos += n_header
+    properties = []
+    offsets = [0]
+    i = 0
+    while i < len(header):
+        n_points, n_props = header[i], header[i + 1]
+        pairs = header[i + 2:i + 2 + 2 * n_props]
+        properties.append({strings[k]: strings[v] for k, v in zip(pairs[::2], pairs[1::2])})
+        offsets.append(offsets[-1] + n_points)
+        i += 2 + 2 * n_props
+
+    n_block, pos = _read_varint(data, pos)
+    if n_block:
+        z = _decode_varints(data[pos:pos + n_block])
+        coords = np.cumsum(((z >> 1) ^ -(z & 1)).reshape(-1, 2), axis=0) / 10 ** precision
+    else:
+        coords = np.zeros((0, 2))
+    return properties, offsets, coords
+
+
+def decode(data):
+    """Decode bytes produced by encode() back to a GeoJSON FeatureCollection dict."""
+    properties, offsets, coords = decode_arrays(data)
+    coords = coords.tolist()
+    features = [
+        {
+            "type": "Feature",
+            "properties": props,
+            "geometry": {"type": "LineString", "coordinates": coords[offsets[i]:offsets[i + 1]]},
+        }
+        for i, props in enumerate(properties)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def write(path, collection, precision=PRECISION):
+    with open(path, "wb") as f:
+        instrument.count("bytes_written", f.write(encode(collection, precision)))
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def _rounded(collection, precision):
+    return [
+        (feat["properties"], (_quantize(feat["geometry"]["coordinates"], precision) / 10 ** precision).tolist())
+        for feat in collection["features"]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precision", type=int, default=PRECISION,
+                        help=f"decimal places kept (default {PRECISION})")
+    parser.add_argument("--verify", action="store_true",
+                        help="round-trip every file and report size/decode time instead of writing")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(PISTES_DIR, "*.geojson")))
+    json_bytes = skp_bytes = 0
+    json_s = skp_s = arrays_s = 0.0
+    failures = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            raw = f.read()
+        t0 = time.perf_counter()
+        collection = json.loads(raw)
+        json_s += time.perf_counter() - t0
+
+        data = encode(collection, args.precision)
+        json_bytes += len(raw)
+        skp_bytes += len(data)
+
+        if args.verify:
+            t0 = time.perf_counter()
+            decoded = decode(data)
+            skp_s += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            decode_arrays(data)
+            arrays_s += time.perf_counter() - t0
+            if _rounded(decoded, args.precision) != _rounded(collection, args.precision):
+                failures += 1
+                print(f"MISMATCH: {os.path.basename(path)}")
+        else:
+            with open(path[: -len(".geojson")] + EXT, "wb") as f:
+                f.write(data)
+
+    print(f"{len(paths)} files: GeoJSON {json_bytes / 1e6:.2f} MB -> .skp {skp_bytes / 1e6:.2f} MB "
+          f"({json_bytes / max(skp_bytes, 1):.1f}x smaller)")
+    if args.verify:
+        print(f"decode: json.loads {json_s * 1000:.0f} ms, decode {skp_s * 1000:.0f} ms "
+              f"({json_s / max(skp_s, 1e-9):.1f}x), decode_arrays {arrays_s * 1000:.0f} ms "
+              f"({json_s / max(arrays_s, 1e-9):.1f}x); {failures} round-trip mismatches")
+        if failures:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    instrument.main(main)
@@ -0,0 +1,222 @@
+"""Fetch piste data from OSM Overpass for every resort on one pass.
+
+fetch_ikon_pistes.py and fetch_epic_pistes.py are thin entry points around
+main(), which differs per pass only in the search radius, the retry delay
+and whether resorts that already have a piste file are skipped by default.
+"""
+
+import argparse
+import os
+import time
+
+import instrument
+from overpass import (OverpassClient, TokenBucket, add_cache_args, cache_from_args,
+                      cluster_points, run_pool, split_by_distance)
+from osm import iter_ways
+import piste_manifest
+import piste_output
+from resort_store import ResortStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PISTES_DIR = os.path.join(REPO_ROOT, "public", "data", "pistes")
+WORKERS = 2
+RATE_PER_S = 1.0
+MAX_RETRIES = 2
+
+DIFFICULTY_MAP = {
+    "novice": "green",
+    "easy": "green",
+    "intermediate": "blue",
+    "advanced": "red",
+    "expert": "black",
+    "freeride": "black",
+}
+
+
+def piste_selector(points, radius_m):
+    """Overpass union body selecting pistes and lifts within radius_m of any (lat, lon) point."""
+    return "".join(
+        f'way["piste:type"="downhill"]{a};way["piste:type"="nordic"]{a};way["aerialway"]{a};'
+        for a in (f"(around:{radius_m},{lat},{lon})" for lat, lon in points)
+    )
+
+
+def piste_query(points, radius_m):
+    """Return (query, timeout). Nodes are emitted before ways so fetch_cluster can stream the result."""
+    timeout = 30 if len(points) == 1 else 90
+    query = f"""[out:json][timeout:{timeout}];
+({piste_selector(points, radius_m)})->.w;node(w.w);out skel qt;.w out meta;"""
+    return query, timeout
+
+
+def way_feature(tags, coords):
+    is_lift = "aerialway" in tags
+    name = tags.get("name", "")
+    difficulty = DIFFICULTY_MAP.get(tags.get("piste:difficulty", ""), "")
+    return {
+        "type": "Feature",
+        "properties": {
+            "name": name,
+            "difficulty": difficulty if not is_lift else "",
+            "type": "lift" if is_lift else "run",
+        },
+        "geometry": {"type": "LineString", "coordinates": coords},
+    }
+
+
+def drawable(ways):
+    """The way features with enough resolved nodes to draw a line."""
+    return [f for f in ways if len(f["geometry"]["coordinates"]) >= 2]
+
+
+def center(resort):
+    lon, lat = resort["geometry"]["coordinates"]
+    return lat, lon
+
+
+def fetch_cluster(resorts, client, radius_m):
+    """Fetch a group of nearby resorts in one query and split the ways back out per resort.
+
+    Returns (query, stats, [(resort, features, ways), ...]), where ways is the
+    number of ways the resort's own `around:` query would return, the count
+    piste_manifest.needs_refresh compares against. It includes ways too short
+    to become features.
+    """
+    centers = [center(r) for r in resorts]
+    query, timeout = piste_query(centers, radius_m)
+    stats = {}
+    with instrument.span("fetch_cluster", resorts=[r["properties"]["slug"] for r in resorts]):
+        with client.open(query, timeout=timeout + 15) as fp:
+            ways = [way_feature(tags, coords) for tags, coords in iter_ways(fp, stats)]
+    if len(resorts) == 1:
+        return query, stats, [(resorts[0], drawable(ways), stats["ways"])]
+    located = [f for f in ways if f["geometry"]["coordinates"]]
+    return query, stats, [(resort, drawable(near), len(near))
+                          for resort, near in zip(resorts, split_by_distance(located, centers, radius_m))]
+
+
+def check_resort(resort, client, entry, radius_m):
+    with instrument.span("check", resort=resort["properties"]["slug"]):
+        return piste_manifest.needs_refresh(client, piste_selector([center(resort)], radius_m), entry)
+
+
+def main(pass_name, radius_m, delay_s, skip_existing=False):
+    """Fetch pistes for every `pass_name` resort.
+
+    With skip_existing, resorts that already have a piste file are left alone
+    unless --refresh is given; otherwise that is opt-in through --retry-failed.
+    """
+    parser = argparse.ArgumentParser(description=f"Fetch piste data from OSM Overpass API for all {pass_name} resorts.")
+    if not skip_existing:
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="only fetch resorts that don't have a piste file yet")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"concurrent Overpass requests (default {WORKERS})")
+    parser.add_argument("--rate", type=float, default=RATE_PER_S,
+                        help=f"request budget in requests/second (default {RATE_PER_S})")
+    parser.add_argument("--batch", action="store_true",
+                        help="group resorts with overlapping search radii into one query")
+    parser.add_argument("--refresh", action="store_true",
+                        help="only re-download resorts whose OSM data changed since the manifest entry")
+    add_cache_args(parser)
+    args = parser.parse_args()
+    skip_existing = not args.refresh if skip_existing else args.retry_failed
+
+    os.makedirs(PISTES_DIR, exist_ok=True)
+
+    resorts = [r.feature for r in ResortStore().with_pass(pass_name)]
+
+    print(f"Found {len(resorts)} {pass_name} resorts")
+
+    success = 0
+    skipped = 0
+    todo = []
+    for resort in resorts:
+        slug = resort["properties"]["slug"]
+        if skip_existing and os.path.isfile(os.path.join(PISTES_DIR, f"{slug}.geojson")):
+            print(f"{resort['properties']['name']} — skip (file exists)")
+            skipped += 1
+            success += 1
+            continue
+        todo.append(resort)
+
+    manifest = piste_manifest.load()
+    client = OverpassClient(TokenBucket(args.rate), cache_from_args(args), MAX_RETRIES, delay_s)
+    started = time.monotonic()
+
+    totals = {}
+    if args.refresh:
+        if args.offline:
+            parser.error("--refresh needs the network")
+        if client.cache is not None:
+            client.cache.ttl_s = 0  # a refresh must never be answered from an older response
+        checker = OverpassClient(client.bucket, None, MAX_RETRIES, delay_s)
+        known = [r for r in todo if r["properties"]["slug"] in manifest]
+        stale = set()
+        for resort, result, err in run_pool(
+                known, lambda r: check_resort(r, checker, manifest[r["properties"]["slug"]], radius_m),
+                args.workers):
+            slug = resort["properties"]["slug"]
+            if err is not None:
+                print(f"{resort['properties']['name']} — check FAILED ({err}), refetching")
+                stale.add(slug)
+                continue
+            changed, totals[slug] = result
+            if changed:
+                stale.add(slug)
+            else:
+                print(f"{resort['properties']['name']} — unchanged since {manifest[slug]['fetched_at']}")
+                skipped += 1
+                success += os.path.isfile(os.path.join(PISTES_DIR, f"{slug}.geojson"))
+        todo = [r for r in todo if r["properties"]["slug"] not in manifest or r["properties"]["slug"] in stale]
+        print(f"{len(todo)} resorts changed or never fetched")
+
+    if args.batch:
+        clusters = [[todo[i] for i in c] for c in cluster_points([center(r) for r in todo], 2 * radius_m)]
+        print(f"Batching {len(todo)} resorts into {len(clusters)} queries")
+    else:
+        clusters = [[r] for r in todo]
+
+    done = 0
+    has_pistes = {}
+    for cluster, result, err in run_pool(clusters, lambda c: fetch_cluster(c, client, radius_m), args.workers):
+        if err is not None:
+            for resort in cluster:
+                done += 1
+                print(f"[{done}/{len(todo)}] {resort['properties']['name']} "
+                      f"({resort['properties']['slug']})... FAILED: {err}")
+            continue
+
+        query, stats, results = result
+        if stats["incomplete_ways"]:
+            print(f"  WARN: dropped {stats['incomplete_ways']} ways missing {stats['missing_nodes']} nodes "
+                  f"for {', '.join(r['properties']['slug'] for r in cluster)}")
+        for resort, features, ways in results:
+            done += 1
+            slug = resort["properties"]["slug"]
+            name = resort["properties"]["name"]
+            prefix = f"[{done}/{len(todo)}] {name} ({slug})..."
+
+            body = b""
+            if features:
+                body = piste_output.write_resort(slug, features, PISTES_DIR)
+                print(f"{prefix} {len(features)} features")
+                has_pistes[slug] = True
+                success += 1
+            else:
+                print(f"{prefix} no data")
+                has_pistes[slug] = False
+            piste_manifest.record(manifest, slug, query, stats, totals.get(slug, ways), body)
+
+    # Write updated resorts.json and manifest
+    with instrument.span("save"):
+        piste_manifest.save(manifest, slugs=has_pistes)
+        with ResortStore.edit() as store:
+            for slug, flag in has_pistes.items():
+                resort = store.get(slug)
+                if resort is None:  # removed from resorts.json while we were fetching
+                    continue
+                resort.assets["pistes"] = flag
+
+    print(f"\nDone. {success}/{len(resorts)} resorts have piste data ({skipped} skipped, "
+          f"{time.monotonic() - started:.0f}s).")
@@ -0,0 +1,87 @@
+"""Per-resort record of what was fetched into public/data/pistes, used for incremental refreshes.
+
+assets/piste-manifest.json maps each slug to:
+
+    query          Overpass QL that produced the file
+    fetched_at     OSM data timestamp of the response (ISO 8601), the `newer:` cutoff for the next refresh
+    ways           number of ways the resort's search area returned
+    max_version    highest OSM way version seen
+    max_timestamp  newest OSM way timestamp seen
+    sha256         hash of the written GeoJSON
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from osm import iter_elements
+from resort_store import lock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(REPO_ROOT, "assets", "piste-manifest.json")
+
+
+def load(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save(manifest, path=MANIFEST_PATH, slugs=None):
+    """Write the manifest. With slugs, only those entries are merged into the file as it is on disk.
+
+    The Ikon and Epic fetchers each record their own resorts, so merging
+    under the resorts.json lock lets them run at the same time.
+    """
+    with lock(path):
+        if slugs is not None:
+            manifest = {**load(path), **{slug: manifest[slug] for slug in slugs if slug in manifest}}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def record(manifest, slug, query, stats, ways, body):
+    """Store the manifest entry for a freshly written piste file (body is its bytes).
+
+    stats comes from osm.iter_ways; the server's OSM base timestamp is preferred
+    over the wall clock so responses replayed from the cache are dated correctly.
+    """
+    manifest[slug] = {
+        "query": query,
+        "fetched_at": stats.get("timestamp_osm_base") or now_iso(),
+        "ways": ways,
+        "max_version": stats.get("max_version", 0),
+        "max_timestamp": stats.get("max_timestamp", ""),
+        "sha256": hashlib.sha256(body).hexdigest(),
+    }
+
+
+def changes_query(selector, since):
+    """Overpass QL counting the ways in `selector` and how many of them or their nodes changed since `since`."""
+    return (f'[out:json][timeout:30];({selector})->.w;node(w.w)->.n;'
+            f'.w out count;(way.w(newer:"{since}");node.n(newer:"{since}"););out count;')
+
+
+def needs_refresh(client, selector, entry):
+    """Ask Overpass whether anything in a resort's area changed since its manifest entry.
+
+    `newer:` cannot see deletions, so a change in the total way count also
+    counts as a change. Returns (changed, total_ways).
+    """
+    with client.open(changes_query(selector, entry["fetched_at"])) as fp:
+        counts = [el["tags"] for el in iter_elements(fp) if el["type"] == "count"]
+    if len(counts) < 2:
+        raise ValueError(f"expected two count elements, got {len(counts)}")
+    total = int(counts[0].get("ways", 0))
+    changed = int(counts[1].get("total", 0))
+    return changed > 0 or total != entry["ways"], total
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Output stage for per-resort piste GeoJSON: line simplification, coordinate quantization and LODs.
+
+Run directly to re-process the existing files in public/data/pistes and
+report per-file sizes; the pass fetchers call write_resort() on every fetch.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+
+import numpy as np
+
+import instrument
+import piste_binary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PISTES_DIR = os.path.join(REPO_ROOT, "public", "data", "pistes")
+LOD_DIR = "lod"
+
+# 1.5 m plus ~0.5 m of rounding (5 decimals) keeps the error near half a pixel at zoom 14.
+TOLERANCE_M = 1.5
+PRECISION = 5
+# Coarse variant for zoom <= 12, where a pixel is ~20 m.
+LOD_TOLERANCE_M = 10.0
+LOD_PRECISION = 4
+
+M_PER_DEG = 111_320.0
+# Ground metres per pixel at zoom 14 on the equator with 512px tiles (Mapbox GL).
+Z14_M_PER_PX = 40_075_016.686 / (512 * 2 ** 14)
+
+
+def _project(coords, lat0):
+    """Equirectangular projection of lon/lat rows to metres around latitude lat0."""
+    k = math.cos(math.radians(lat0))
+    return np.column_stack((coords[:, 0] * (M_PER_DEG * k), coords[:, 1] * M_PER_DEG))
+
+
+def segment_distance(points, a, b):
+    """Distance from each row of points to segment a-b (or to per-row segments if a/b are arrays)."""
+    d = b - a
+    len2 = np.einsum("...i,...i->...", d, d)
+    t = np.einsum("...i,...i->...", points - a, d) / np.where(len2 == 0, 1, len2)
+    t = np.clip(np.where(len2 == 0, 0, t), 0, 1)
+    proj = a + t[..., None] * d
+    return np.hypot(*(points - proj).T)
+
+
+def douglas_peucker(xy, tolerance):
+    """Return a boolean mask of the vertices of xy (n x 2, metres) kept by Douglas-Peucker.
+
+    Each split evaluates all vertices between its endpoints in one vectorized
+    pass, so the Python-level work is proportional to the number of kept points.
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        dist = segment_distance(xy[i + 1:j], xy[i], xy[j])
+        k = int(dist.argmax())
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+def simplify_line(coords, tolerance_m, precision):
+    """Simplify and quantize one [[lon, lat], ...] line.
+
+    Returns (coords, max_error_m) where the error is the largest distance from
+    any input vertex to the output line, quantization included.
+    """
+    pts = np.asarray(coords, dtype=np.float64)
+    lat0 = float(pts[:, 1].mean())
+    xy = _project(pts, lat0)
+    keep = douglas_peucker(xy, tolerance_m)
+    kept = np.flatnonzero(keep)
+    out = np.round(pts[kept], precision)
+
+    # Each input vertex is measured against the output segment that replaced it.
+    qxy = _project(out, lat0)
+    seg = np.clip(np.searchsorted(kept, np.arange(len(pts)), side="right") - 1, 0, len(kept) - 2)
+    err = float(segment_distance(xy, qxy[seg], qxy[seg + 1]).max()) if len(kept) > 1 else 0.0
+
+    # Quantization can collapse neighbours onto the same point.
+    dup = np.zeros(len(out), dtype=bool)
+    dup[1:] = (out[1:] == out[:-1]).all(axis=1)
+    out = out[~dup]
+    if len(out) < 2:
+        out = np.round(pts[[0, -1]], precision)
+    return out.tolist(), err
+
+
+def simplify_features(features, tolerance_m=TOLERANCE_M, precision=PRECISION, stats=None):
+    """Return copies of LineString features with simplified, quantized coordinates.
+
+    If a stats dict is passed it accumulates "vertices_in", "vertices_out",
+    "max_error_m" and "max_error_px_z14".
+    """
+    out = []
+    for feat in features:
+        geom = feat["geometry"]
+        if geom["type"] != "LineString" or len(geom["coordinates"]) < 2:
+            out.append(feat)
+            continue
+        coords, err = simplify_line(geom["coordinates"], tolerance_m, precision)
+        out.append({**feat, "geometry": {"type": "LineString", "coordinates": coords}})
+        if stats is not None:
+            lat = geom["coordinates"][0][1]
+            px = err / (Z14_M_PER_PX * math.cos(math.radians(lat)))
+            stats["vertices_in"] = stats.get("vertices_in", 0) + len(geom["coordinates"])
+            stats["vertices_out"] = stats.get("vertices_out", 0) + len(coords)
+            stats["max_error_m"] = max(stats.get("max_error_m", 0.0), err)
+            stats["max_error_px_z14"] = max(stats.get("max_error_px_z14", 0.0), px)
+    return out
+
+
+def collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def encode(features):
+    return json.dumps(collection(features), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def write_resort(slug, features, pistes_dir=PISTES_DIR, stats=None):
+    """Write <slug>.geojson, <slug>.skp and lod/<slug>.geojson for raw features.
+
+    Returns the GeoJSON bytes.
+    """
+    with instrument.span("write_pistes", resort=slug):
+        simplified = simplify_features(features, TOLERANCE_M, PRECISION, stats)
+        body = encode(simplified)
+        with open(os.path.join(pistes_dir, f"{slug}.geojson"), "wb") as f:
+            instrument.count("bytes_written", f.write(body))
+        piste_binary.write(os.path.join(pistes_dir, slug + piste_binary.EXT), collection(simplified), PRECISION)
+        os.makedirs(os.path.join(pistes_dir, LOD_DIR), exist_ok=True)
+        lod = encode(simplify_features(features, LOD_TOLERANCE_M, LOD_PRECISION))
+        with open(os.path.join(pistes_dir, LOD_DIR, f"{slug}.geojson"), "wb") as f:
+            instrument.count("bytes_written", f.write(lod))
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("slugs", nargs="*", help="resorts to process (default: every file)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE_M,
+                        help=f"simplification tolerance in metres (default {TOLERANCE_M})")
+    parser.add_argument("--precision", type=int, default=PRECISION,
+                        help=f"decimal places kept (default {PRECISION})")
+    parser.add_argument("--lod-tolerance", type=float, default=LOD_TOLERANCE_M)
+    parser.add_argument("--lod-precision", type=int, default=LOD_PRECISION)
+    parser.add_argument("--dry-run", action="store_true", help="report sizes without writing")
+    args = parser.parse_args()
+
+    if args.slugs:
+        paths = [os.path.join(PISTES_DIR, f"{s}.geojson") for s in args.slugs]
+    else:
+        paths = sorted(glob.glob(os.path.join(PISTES_DIR, "*.geojson")))
+
+    print(f"{'resort':28}{'before':>9}{'after':>9}{'lod':>9}{'vertices':>17}{'err px@z14':>12}")
+    totals = [0, 0, 0]
+    for path in paths:
+        slug = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        features = json.loads(raw)["features"]
+        stats = {}
+        simplified = simplify_features(features, args.tolerance, args.precision, stats)
+        body = encode(simplified)
+        lod = encode(simplify_features(features, args.lod_tolerance, args.lod_precision))
+
+        if not args.dry_run:
+            with open(path, "wb") as f:
+                instrument.count("bytes_written", f.write(body))
+            # Keep the binary twin in step with the GeoJSON, as write_resort does.
+            piste_binary.write(os.path.join(PISTES_DIR, slug + piste_binary.EXT), collection(simplified),
+                               args.precision)
+            os.makedirs(os.path.join(PISTES_DIR, LOD_DIR), exist_ok=True)
+            with open(os.path.join(PISTES_DIR, LOD_DIR, f"{slug}.geojson"), "wb") as f:
+                instrument.count("bytes_written", f.write(lod))
+
+        for i, n in enumerate((len(raw), len(body), len(lod))):
+            totals[i] += n
+        vertices = f"{stats.get('vertices_in', 0)}->{stats.get('vertices_out', 0)}"
+        print(f"{slug[:27]:28}{len(raw) / 1024:8.0f}K{len(body) / 1024:8.0f}K{len(lod) / 1024:8.0f}K"
+              f"{vertices:>17}{stats.get('max_error_px_z14', 0):12.2f}")
+
+    before, after, lod = totals
+    print(f"\n{len(paths)} files: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB "
+          f"({100 * (1 - after / max(before, 1)):.0f}% smaller), LOD {lod / 1e6:.1f} MB"
+          + (" [dry run]" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    instrument.main(main)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""Pre-fetch current snow conditions for every resort from Open-Meteo into public/data/snow.json.
+
+Each run rewrites the columnar snow.json, extends the snow-keys.json key
+table with any new resorts, and appends the run's snowfall and snow depth
+to the history store in assets/snow-history/ (see snow_store.py), which is
+kept out of git.
+
+Resorts in the same CELL_DEG grid cell share one forecast location, the
+exact coordinate of one member resort (see representative()): at 0.1
+degrees, about the resolution of the global models behind Open-Meteo's
+best_match, 4,107 resorts collapse to ~3,100 locations. Locations go out
+BATCH_SIZE per request, --concurrency requests at a time over one pool of
+keep-alive connections, under a per-minute location budget (Open-Meteo's free tier counts every location in a
+multi-location request as a call). A batch that still fails after
+MAX_RETRIES is logged and its resorts are left out of the output.
+
+OPEN_METEO_URL points the fetcher elsewhere, e.g. at open_meteo_standin.py
+for offline runs:
+
+    python3 scripts/open_meteo_standin.py --port 8765 &
+    OPEN_METEO_URL=http://127.0.0.1:8765 python3 scripts/prefetch_snow.py
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+import time
+import urllib.parse
+
+import instrument
+import snow_store
+from resort_store import RESORTS_PATH, ResortStore
+
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com")
+FORECAST_PARAMS = {
+    "current": "temperature_2m,snow_depth,snowfall,wind_speed_10m,weather_code",
+    "daily": "snowfall_sum",
+    "forecast_days": "7",
+    "timezone": "auto",
+}
+CELL_DEG = 0.1
+BATCH_SIZE = 100
+CONCURRENCY = 4
+LOCATIONS_PER_MINUTE = 500
+MAX_RETRIES = 3
+TIMEOUT_S = 60
+
+
+class AsyncBucket:
+    """Token bucket for asyncio: `rate` tokens/second with bursts of `capacity`, taken n at a time."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n=1):
+        n = min(n, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                delay = (n - self._tokens) / self.rate
+                instrument.count("sleep_s", delay)
+                await asyncio.sleep(delay)
+
+
+class Session:
+    """A fixed pool of keep-alive HTTP(S) connections to one host, shared by every request.
+
+    http.client is blocking, so each request runs on a worker thread while
+    holding one pooled connection; the pool size bounds concurrency.
+    """
+
+    def __init__(self, base_url, size):
+        url = urllib.parse.urlsplit(base_url)
+        self.scheme, self.host, self.prefix = url.scheme, url.netloc, url.path.rstrip("/")
+        self._pool = asyncio.Queue()
+        for _ in range(size):
+            self._pool.put_nowait(None)  # connections are opened lazily
+        self.requests = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, timeout=TIMEOUT_S)
+
+    def _get(self, conn, path):
+        conn = conn or self._connect()
+        try:
+            conn.request("GET", self.prefix + path, headers={"Accept-Encoding": "identity"})
+            resp = conn.getresponse()
+            return conn, resp.status, resp.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+
+    async def get_json(self, path):
+        conn = await self._pool.get()
+        try:
+            with instrument.span("http", host=self.host):
+                conn, status, body = await asyncio.to_thread(self._get, conn, path)
+        except Exception:
+            conn = None  # broken; the next user reconnects
+            raise
+        finally:
+            self._pool.put_nowait(conn)
+        self.requests += 1
+        instrument.count("bytes_downloaded", len(body))
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        return json.loads(body)
+
+    def close(self):
+        while not self._pool.empty():
+            conn = self._pool.get_nowait()
+            if conn is not None:
+                conn.close()
+
+
+def cell_of(lng, lat, cell_deg=CELL_DEG):
+    return math.floor(lng / cell_deg), math.floor(lat / cell_deg)
+
+
+def representative(members):
+    """The resort whose coordinate a cell is forecast at.
+
+    A pass resort if the cell has one, and among those the one nearest the
+    members' mean position, so the shared forecast sits on real ski terrain.
+    """
+    pool = [r for r in members if r.pass_name not in (None, "Independent")] or members
+    lng = sum(r.lng for r in members) / len(members)
+    lat = sum(r.lat for r in members) / len(members)
+    return min(pool, key=lambda r: (r.lng - lng) ** 2 + (r.lat - lat) ** 2)
+
+
+def group_by_cell(resorts, cell_deg=CELL_DEG):
+    """[(lng, lat) to forecast, [resorts in the cell]], in first-seen order.
+
+    The cell is only the grouping key. Open-Meteo downscales to the elevation
+    at the exact coordinate it is given, so each cell is forecast at a member
+    resort's own coordinate (see representative()), never at the cell centre.
+    """
+    cells = {}
+    for resort in resorts:
+        cells.setdefault(cell_of(resort.lng, resort.lat, cell_deg), []).append(resort)
+    out = []
+    for members in cells.values():
+        rep = representative(members)
+        out.append(((rep.lng, rep.lat), members))
+    return out
+
+
+def forecast_path(locations):
+    params = dict(FORECAST_PARAMS,
+                  latitude=",".join(f"{lat:.4f}" for _, lat in locations),
+                  longitude=",".join(f"{lng:.4f}" for lng, _ in locations))
+    return "/v1/forecast?" + urllib.parse.urlencode(params, safe=",")
+
+
+def conditions(d):
+    """The snow.json fields from one Open-Meteo location result."""
+    current = d.get("current") or {}
+    daily = (d.get("daily") or {}).get("snowfall_sum")
+    return {
+        "temperature": current.get("temperature_2m"),
+        "snow_depth": current.get("snow_depth"),
+        "snowfall_now": current.get("snowfall"),
+        "snowfall_24h": daily[0] if daily else None,
+        "snowfall_7d": sum(v or 0 for v in daily) if daily else None,
+        "wind_speed": current.get("wind_speed_10m"),
+        "weather_code": current.get("weather_code"),
+    }
+
+
+async def request_batch(session, bucket, path, count, stats):
+    """GET a multi-location request for `count` locations, retrying with backoff. Returns one result per location."""
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire(count)
+        try:
+            data = await session.get_json(path)
+            results = data if isinstance(data, list) else [data]
+            if len(results) != count:
+                raise RuntimeError(f"{len(results)} results for {count} locations")
+            return results
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            stats["retries"] += 1
+            instrument.count("retries")
+            delay = 2 ** attempt
+            print(f"  batch of {count} failed ({e}), retrying in {delay}s")
+            instrument.count("sleep_s", delay)
+            await asyncio.sleep(delay)
+
+
+async def fetch_batch(session, bucket, locations, stats):
+    results = await request_batch(session, bucket, forecast_path(locations), len(locations), stats)
+    return [conditions(d) for d in results]
+
+
+async def fetch_all(cells, base_url=OPEN_METEO_URL, batch_size=BATCH_SIZE, concurrency=CONCURRENCY,
+                    per_minute=LOCATIONS_PER_MINUTE):
+    """Fetch conditions for every cell. Returns ({cell index: conditions}, stats)."""
+    session = Session(base_url, concurrency)
+    bucket = AsyncBucket(per_minute / 60, max(per_minute, batch_size))
+    stats = {"retries": 0, "failed_batches": 0}
+    results = {}
+    batches = [list(range(i, min(i + batch_size, len(cells)))) for i in range(0, len(cells), batch_size)]
+
+    async def run(batch):
+        try:
+            with instrument.span("batch", locations=len(batch)):
+                values = await fetch_batch(session, bucket, [cells[i][0] for i in batch], stats)
+        except Exception as e:
+            stats["failed_batches"] += 1
+            print(f"  batch of {len(batch)} locations FAILED: {e}")
+            return
+        results.update(zip(batch, values))
+
+    try:
+        await asyncio.gather(*(run(b) for b in batches))
+    finally:
+        session.close()
+    stats["requests"] = session.requests
+    return results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=OPEN_METEO_URL, help="Open-Meteo base URL (default $OPEN_METEO_URL)")
+    parser.add_argument("--cell-deg", type=float, default=CELL_DEG,
+                        help=f"resorts in the same grid cell share one location (default {CELL_DEG})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="locations per request")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight")
+    parser.add_argument("--per-minute", type=int, default=LOCATIONS_PER_MINUTE, help="location budget per minute")
+    parser.add_argument("--passes-only", action="store_true", help="only pass resorts, like the old prefetch")
+    parser.add_argument("--resorts", default=RESORTS_PATH)
+    parser.add_argument("--out", default=snow_store.SNOW_PATH)
+    parser.add_argument("--keys", default=snow_store.KEYS_PATH)
+    parser.add_argument("--history", default=snow_store.HISTORY_DIR)
+    parser.add_argument("--no-history", action="store_true", help="don't append this run to the history store")
+    args = parser.parse_args()
+
+    resorts = [r for r in ResortStore(args.resorts) if not args.passes_only or r.pass_name not in (None, "Independent")]
+    cells = group_by_cell(resorts, args.cell_deg)
+    print(f"Fetching snow data for {len(resorts)} resorts in {len(cells)} grid cells "
+          f"({args.batch_size} per request, {args.concurrency} at a time)...")
+
+    started = time.monotonic()
+    with instrument.span("fetch", cells=len(cells)):
+        values, stats = asyncio.run(fetch_all(cells, args.url, args.batch_size, args.concurrency, args.per_minute))
+    elapsed = time.monotonic() - started
+
+    records = []
+    for i, (_, members) in enumerate(cells):
+        if i not in values:
+            continue
+        for resort in members:
+            records.append({"slug": resort.slug, **values[i]})
+
+    if not records:
+        # Keep the previous snapshot rather than publishing an empty one.
+        raise SystemExit(f"No snow data fetched ({stats['failed_batches']} failed batches); {args.out} left as is")
+
+    fetched_at = int(time.time() * 1000)
+    with instrument.span("write_snapshot", records=len(records)):
+        keys = snow_store.update_keys(sorted(r.slug for r in resorts), args.keys)
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        snow_store.write_snapshot(records, keys, fetched_at, args.out)
+    print(f"Wrote {len(records)} resort records to {args.out} in {elapsed:.1f}s "
+          f"({stats['requests']} requests, {stats['retries']} retries, {stats['failed_batches']} failed batches)")
+    if not args.no_history:
+        with instrument.span("append_history"):
+            history = snow_store.HistoryStore(args.history)
+            history.append(fetched_at, snow_store.history_row(records, keys))
+        runs = sum(len(seg["times"]) for seg in history.index["segments"])
+        print(f"Appended to {args.history} ({runs} runs, {len(keys)} resorts)")
+
+if __name__ == "__main__":
+    instrument.main(main)
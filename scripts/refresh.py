@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Refresh the resort data: run every pipeline stage that is out of date, independent ones in parallel.
+
+    python3 scripts/refresh.py                          everything out of date
+    python3 scripts/refresh.py --dry-run                what would run, and why
+    python3 scripts/refresh.py compute_camera_angles    that stage and the stages before it
+    python3 scripts/refresh.py --force fetch_ikon_pistes
+
+Each stage declares its inputs: the scripts it runs (found by following
+imports), data files and directories, and projections of resorts.json
+holding only the properties it reads, so a stage that sets region_id does
+not make the pass stages stale. A stage is skipped when the fingerprint of
+every input matches the one taken as its last successful run started and
+its outputs exist. Stages that fetch from the network also go stale after
+max_age_h, since the remote data changes without any local input changing.
+
+A stage is checked once the stages it comes after have finished, so an
+upstream stage that rewrote resorts.json without changing anything this
+stage reads does not trigger it. Its inputs are fingerprinted again just
+before its script is launched, and that snapshot is what a successful run
+records: an input edited while the stage runs (by a concurrent stage, or by
+the stage itself) is not marked as seen, and the stage goes stale again for
+the next refresh. Stages that
+touch resorts.json at the same time all save through ResortStore.edit(),
+which reloads under the lock.
+
+Fingerprints are SHA-256 of file contents. Per-file hashes are reused while
+a file's size and mtime are unchanged. State is kept in .cache/refresh.json;
+delete it (or pass --force) to rebuild everything.
+"""
+
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import instrument
+from overpass import run_pool
+from resort_store import REPO_ROOT, RESORTS_PATH, ResortStore, write_file
+
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+STATE_PATH = os.path.join(REPO_ROOT, ".cache", "refresh.json")
+JOBS = 2
+WEEK_H = 7 * 24
+
+Stage = namedtuple("Stage", "name argv inputs outputs after max_age_h", defaults=((), (), None))
+
+
+class Resorts(namedtuple("Resorts", "fields pass_name")):
+    """The listed properties of every resort (or only those on pass_name).
+
+    "geometry" stands for the coordinates; dotted names reach into nested
+    properties (assets.pistes).
+    """
+
+    def __new__(cls, *fields, pass_name=None):
+        return super().__new__(cls, fields, pass_name)
+
+    def __str__(self):
+        return f"resorts[{','.join(self.fields)}{'; ' + self.pass_name if self.pass_name else ''}]"
+
+
+def code(script):
+    """The script and every module of scripts/ it imports, directly or not, as repo paths."""
+    seen = set()
+    todo = [script]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        with open(os.path.join(SCRIPTS_DIR, name)) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                path = module.split(".")[0] + ".py"
+                if os.path.isfile(os.path.join(SCRIPTS_DIR, path)):
+                    todo.append(path)
+    return [f"scripts/{name}" for name in sorted(seen)]
+
+
+def stage(name, script, *args, inputs=(), **kwargs):
+    return Stage(name, [script, *args], tuple(code(script)) + tuple(inputs), **kwargs)
+
+
+STAGES = [
+    stage("fetch_world_resorts", "fetch-world-resorts.py", "--tiled", inputs=["assets/geo/admin-places.npz"],
+          outputs=["assets/resorts.json"], max_age_h=WEEK_H),
+    stage("update_passes", "update_passes.py", inputs=["assets/passes", Resorts("name", "pass")],
+          outputs=["assets/resorts.json"], after=["fetch_world_resorts"]),
+    stage("assign_regions", "assign_regions.py", inputs=["assets/regions.json", Resorts("geometry")],
+          outputs=["assets/resorts.json"], after=["fetch_world_resorts"]),
+    stage("fetch_ikon_pistes", "fetch_ikon_pistes.py", "--refresh",
+          inputs=[Resorts("slug", "geometry", pass_name="Ikon")],
+          outputs=["public/data/pistes", "assets/piste-manifest.json"], after=["update_passes"], max_age_h=WEEK_H),
+    stage("fetch_epic_pistes", "fetch_epic_pistes.py", "--refresh",
+          inputs=[Resorts("slug", "geometry", pass_name="Epic")],
+          outputs=["public/data/pistes", "assets/piste-manifest.json"], after=["update_passes"], max_age_h=WEEK_H),
+    stage("compute_camera_angles", "compute_camera_angles.py", inputs=["public/data/pistes/*.geojson"],
+          outputs=["public/data/camera-angles.json"], after=["fetch_ikon_pistes", "fetch_epic_pistes"]),
+    stage("vector_tiles", "vector_tiles.py", "--out", "public/data/pistes.pmtiles", "--no-compare",
+          inputs=["public/data/pistes/*.geojson"], outputs=["public/data/pistes.pmtiles"],
+          after=["fetch_ikon_pistes", "fetch_epic_pistes"]),
+    # The shards carry every property, so they wait for every stage that edits resorts.json.
+    stage("build_resort_shards", "build_resort_shards.py", inputs=["assets/resorts.json"],
+          outputs=["public/data/resorts/manifest.json"],
+          after=["update_passes", "assign_regions", "fetch_ikon_pistes", "fetch_epic_pistes"]),
+    # Percentiles come from the Open-Meteo archive, cached per cell in .cache/snow-archive, and are
+    # keyed by the snow-keys.json resort index. max_age_h retries cells an earlier run could not fetch.
+    stage("build_snow_percentiles", "build_snow_percentiles.py",
+          inputs=["public/data/snow-keys.json", ".cache/snow-archive", Resorts("slug", "geometry", "pass")],
+          outputs=["public/data/snow-percentiles.json", "public/data/snow-percentiles.bin"],
+          after=["update_passes"], max_age_h=WEEK_H),
+    stage("audit_assets", "audit_assets.py",
+          inputs=["public/data/pistes", "public/data/camera-angles.json", "src/app/utils/webcamRegistry.js",
+                  Resorts("slug", "geometry", "assets")],
+          after=["compute_camera_angles"]),
+]
+
+
+class Fingerprints:
+    """Content fingerprints of stage inputs, reusing file hashes recorded in state["files"]."""
+
+    def __init__(self, files):
+        self.files = files
+        self._resorts = None  # (resorts.json hash, ResortStore)
+        self._lock = threading.Lock()  # stages are fingerprinted from the pool threads as they launch
+
+    def file(self, path):
+        """SHA-256 of one file, or None if it does not exist."""
+        rel = os.path.relpath(path, REPO_ROOT)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.files.pop(rel, None)
+            return None
+        cached = self.files.get(rel)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.files[rel] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def resorts(self, spec):
+        sha = self.file(RESORTS_PATH)
+        if self._resorts is None or self._resorts[0] != sha:
+            self._resorts = (sha, ResortStore())
+        store = self._resorts[1]
+        rows = []
+        for resort in store.with_pass(spec.pass_name) if spec.pass_name else store:
+            row = []
+            for field in spec.fields:
+                if field == "geometry":
+                    row.append(resort.feature["geometry"]["coordinates"])
+                    continue
+                value = resort.properties
+                for key in field.split("."):
+                    value = value.get(key) if isinstance(value, dict) else None
+                row.append(value)
+            rows.append(row)
+        return hashlib.sha256(json.dumps(rows, sort_keys=True).encode()).hexdigest()
+
+    def of(self, spec):
+        """Fingerprint of an input: a Resorts projection, a file, a directory (every file below it) or a glob."""
+        if isinstance(spec, Resorts):
+            return self.resorts(spec)
+        path = os.path.join(REPO_ROOT, spec)
+        if os.path.isdir(path):
+            paths = [os.path.join(d, name) for d, _, names in os.walk(path) for name in names]
+        elif glob.has_magic(spec):
+            paths = glob.glob(path)
+        else:
+            return self.file(path)
+        h = hashlib.sha256()
+        for p in sorted(paths):
+            h.update(f"{os.path.relpath(p, REPO_ROOT)}\0{self.file(p)}\n".encode())
+        return h.hexdigest()
+
+    def inputs(self, stage):
+        with self._lock:
+            return {str(spec): self.of(spec) for spec in stage.inputs}
+
+    def snapshot(self):
+        """A copy of the file hash table, taken while no stage is being fingerprinted."""
+        with self._lock:
+            return dict(self.files)
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"files": {}, "stages": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_file(path, json.dumps(state, indent=1, sort_keys=True).encode())
+
+
+def stale(stage, record, fingerprints, now=None):
+    """Why stage must run given its last recorded run, or None when it is up to date."""
+    if record is None:
+        return "never run"
+    missing = [out for out in stage.outputs if not os.path.exists(os.path.join(REPO_ROOT, out))]
+    if missing:
+        return f"missing {missing[0]}"
+    changed = [name for name, fp in fingerprints.items() if record["inputs"].get(name) != fp]
+    if changed:
+        return "changed " + ", ".join(changed[:3]) + (f" (+{len(changed) - 3})" if len(changed) > 3 else "")
+    age_h = ((now or time.time()) - record["finished"]) / 3600
+    if stage.max_age_h is not None and age_h > stage.max_age_h:
+        return f"last run {age_h:.0f}h ago"
+    return None
+
+
+def select(stages, targets):
+    """The stages named in targets plus every stage they come after, in declaration order."""
+    by_name = {s.name: s for s in stages}
+    wanted = set()
+    todo = list(targets or by_name)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name].after)
+    return [s for s in stages if s.name in wanted]
+
+
+def run_stage(stage, width):
+    """Run one stage's script, echoing its output line by line. Returns (exit code, seconds)."""
+    t0 = time.monotonic()
+    with instrument.span(stage.name):
+        proc = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, stage.argv[0]), *stage.argv[1:]],
+                                cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                env={**instrument.child_env(stage.name), "PYTHONUNBUFFERED": "1"})
+        for line in proc.stdout:
+            print(f"{stage.name:>{width}} | {line}", end="", flush=True)
+        return proc.wait(), time.monotonic() - t0
+
+
+def dry_run(stages, state, fingerprints, force):
+    """Print what a refresh would do, assuming every stage that runs changes what comes after it."""
+    runs = set()
+    width = max(len(s.name) for s in stages)
+    for s in stages:
+        reason = "forced" if s.name in force else stale(s, state["stages"].get(s.name), fingerprints.inputs(s))
+        upstream = [a for a in s.after if a in runs]
+        if reason is None and upstream:
+            reason = f"may run, after {', '.join(upstream)}"
+        if reason is not None:
+            runs.add(s.name)
+        print(f"{s.name:{width}}  {'run' if reason else 'skip':5} {reason or 'up to date'}")
+    print(f"\n{len(runs)} of {len(stages)} stages would run")
+
+
+def refresh(stages, state, fingerprints, force, jobs):
+    """Run the out-of-date stages, each as soon as the stages it comes after are done. Returns {name: outcome}."""
+    width = max(len(s.name) for s in stages)
+    names = {s.name for s in stages}
+    outcome = {}
+    pending = deque()
+
+    def schedule():
+        # Stages whose predecessors have all finished: skip them now if up to date, else queue them.
+        for s in stages:
+            if s.name in outcome or any(a in names and outcome.get(a, "running") == "running" for a in s.after):
+                continue
+            failed = [a for a in s.after if outcome.get(a) in ("failed", "blocked")]
+            if failed:
+                outcome[s.name] = "blocked"
+                print(f"{s.name:>{width}} | not run: {', '.join(failed)} did not complete")
+                continue
+            reason = "forced" if s.name in force else stale(s, state["stages"].get(s.name), fingerprints.inputs(s))
+            if reason is None:
+                outcome[s.name] = "skipped"
+                print(f"{s.name:>{width}} | up to date")
+                continue
+            outcome[s.name] = "running"
+            print(f"{s.name:>{width}} | starting ({reason})")
+            pending.append(s)
+        return pending
+
+    def launch(s):
+        # Fingerprint the inputs the stage is about to read, before it (or a stage beside it) can change them.
+        inputs = fingerprints.inputs(s)
+        return (inputs, *run_stage(s, width))
+
+    schedule()
+    for s, result, err in run_pool(pending, launch, jobs):
+        if err is None and result[1] == 0:
+            inputs, _, duration_s = result
+            outcome[s.name] = "ran"
+            state["stages"][s.name] = {"inputs": inputs, "finished": time.time(), "duration_s": round(duration_s, 1)}
+            save_state({**state, "files": fingerprints.snapshot()})
+            print(f"{s.name:>{width}} | done in {duration_s:.0f}s")
+        else:
+            outcome[s.name] = "failed"
+            print(f"{s.name:>{width}} | FAILED ({err or f'exit {result[1]}'})")
+        schedule()  # queue what this unblocked; run_pool picks up stages appended to pending
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    names = [s.name for s in STAGES]
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to bring up to date, with those before them (default all: {', '.join(names)})")
+    parser.add_argument("--dry-run", action="store_true", help="show what would run and why, without running")
+    parser.add_argument("--force", nargs="*", metavar="STAGE",
+                        help="run these stages (or, with no names, every stage) even if up to date")
+    parser.add_argument("--jobs", type=int, default=JOBS, help=f"stages run at once (default {JOBS})")
+    args = parser.parse_args()
+    for name in args.stages + (args.force or []):
+        if name not in names:
+            parser.error(f"unknown stage {name!r} (choose from {', '.join(names)})")
+
+    stages = select(STAGES, args.stages)
+    force = set(names if args.force == [] else args.force or [])
+    state = load_state()
+    fingerprints = Fingerprints(state["files"])
+
+    if args.dry_run:
+        dry_run(stages, state, fingerprints, force)
+        return
+
+    t0 = time.monotonic()
+    outcome = refresh(stages, state, fingerprints, force, args.jobs)
+    save_state({**state, "files": fingerprints.snapshot()})
+    counts = {k: sum(v == k for v in outcome.values()) for k in ("ran", "skipped", "failed", "blocked")}
+    print(f"\nRefresh finished in {time.monotonic() - t0:.0f}s: "
+          + ", ".join(f"{n} {k}" for k, n in counts.items() if n))
+    if counts["failed"] or counts["blocked"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    instrument.main(main)
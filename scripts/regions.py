@@ -0,0 +1,181 @@
+"""Spatial index over assets/regions.json for assigning resorts to regions.
+
+A region is matched by its optional "geometry" (a GeoJSON Polygon or
+MultiPolygon, holes allowed) or, failing that, by its "bounds" box
+[[sw_lng, sw_lat], [ne_lng, ne_lat]]. When several regions contain a point the
+smallest one wins, then the lowest id, so overlapping regions resolve the same
+way whatever their order in the file.
+
+Regions are bucketed on a uniform lon/lat grid. A lookup only tests the
+regions whose bounding box touches the point's cell, in size order, and
+RegionIndex.assign() does the same for a whole batch of points with NumPy.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGIONS_PATH = os.path.join(REPO_ROOT, "assets", "regions.json")
+CELL_DEG = 1.0
+# Cap on point x edge comparisons per NumPy pass in assign(), to bound memory.
+PIP_CHUNK = 4_000_000
+
+
+def load(path=REGIONS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _rings(region):
+    """The region's polygons as a list of rings (each an (n, 2) lon/lat array), or None for a plain box."""
+    geom = region.get("geometry")
+    if not geom:
+        return None
+    if geom["type"] == "Polygon":
+        polygons = [geom["coordinates"]]
+    elif geom["type"] == "MultiPolygon":
+        polygons = geom["coordinates"]
+    else:
+        raise ValueError(f"region {region['id']}: unsupported geometry {geom['type']}")
+    return [np.asarray(ring, dtype=np.float64) for poly in polygons for ring in poly]
+
+
+def _area(region, rings):
+    """Area on a cylindrical equal-area projection (lon, sin(lat)); only used to rank regions."""
+    if rings is None:
+        (w, s), (e, n) = region["bounds"]
+        return (e - w) * (math.sin(math.radians(n)) - math.sin(math.radians(s)))
+    # Holes wind the opposite way to their outer ring, so the signed sum subtracts them.
+    total = 0.0
+    for ring in rings:
+        x, y = ring[:, 0], np.sin(np.radians(ring[:, 1]))
+        total += 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+    return abs(total)
+
+
+def _edges(rings):
+    """Concatenate every ring's edges into (x0, y0, x1, y1) arrays."""
+    starts = np.concatenate([ring for ring in rings])
+    ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    return starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]
+
+
+def _contains(edges, lng, lat):
+    """Even-odd ray cast of points (lng, lat arrays) against polygon edges."""
+    x0, y0, x1, y1 = edges
+    inside = np.zeros(len(lng), dtype=bool)
+    step = max(1, PIP_CHUNK // max(len(x0), 1))
+    for i in range(0, len(lng), step):
+        px, py = lng[i:i + step, None], lat[i:i + step, None]
+        crosses = (y0 > py) != (y1 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+        inside[i:i + step] = np.logical_xor.reduce(crosses & (px < x_at), axis=1)
+    return inside
+
+
+class RegionIndex:
+    """Grid-bucketed index answering "which region contains this point?"."""
+
+    def __init__(self, regions, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        entries = []
+        for region in regions:
+            rings = _rings(region)
+            if rings is None:
+                (w, s), (e, n) = region["bounds"]
+            else:
+                pts = np.concatenate(rings)
+                (w, s), (e, n) = pts.min(axis=0).tolist(), pts.max(axis=0).tolist()
+            entries.append((_area(region, rings), region["id"], (w, s, e, n), rings))
+        entries.sort(key=lambda entry: entry[:2])
+
+        # Position in this list is a region's rank: lower ranks win ties.
+        self.ids = [entry[1] for entry in entries]
+        self.bboxes = np.array([entry[2] for entry in entries], dtype=np.float64).reshape(-1, 4)
+        self.edges = [_edges(entry[3]) if entry[3] is not None else None for entry in entries]
+
+        # cell key -> region ranks in ascending order
+        self.cells = {}
+        for rank, (w, s, e, n) in enumerate(self.bboxes.tolist()):
+            for cx in range(self._cell(w), self._cell(e) + 1):
+                for cy in range(self._cell(s), self._cell(n) + 1):
+                    self.cells.setdefault((cx, cy), []).append(rank)
+
+    def _cell(self, v):
+        return math.floor(v / self.cell_deg)
+
+    def _test(self, rank, lng, lat):
+        """Mask of the points (arrays) that fall inside the region at rank."""
+        w, s, e, n = self.bboxes[rank]
+        in_box = (lng >= w) & (lng <= e) & (lat >= s) & (lat <= n)
+        if self.edges[rank] is None or not in_box.any():
+            return in_box
+        hit = np.flatnonzero(in_box)
+        in_box[hit] = _contains(self.edges[rank], lng[hit], lat[hit])
+        return in_box
+
+    def lookup(self, lng, lat):
+        """Return the id of the smallest region containing (lng, lat), or None."""
+        point_lng, point_lat = np.array([lng], dtype=np.float64), np.array([lat], dtype=np.float64)
+        for rank in self.cells.get((self._cell(lng), self._cell(lat)), ()):
+            if self._test(rank, point_lng, point_lat)[0]:
+                return self.ids[rank]
+        return None
+
+    def assign(self, lng, lat):
+        """Batch lookup. lng and lat are sequences of equal length; returns a list of ids (None where unmatched).
+
+        Each point is paired with the candidate regions of its grid cell, the
+        pairs are tested region by region, and the lowest-ranked hit per point
+        is kept, so the work grows with points x candidates rather than
+        points x regions.
+        """
+        lng = np.asarray(lng, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        best = np.full(len(lng), len(self.ids), dtype=np.int64)
+        if not len(lng) or not self.ids:
+            return [None] * len(lng)
+
+        cx = np.floor(lng / self.cell_deg).astype(np.int64)
+        cy = np.floor(lat / self.cell_deg).astype(np.int64)
+        # Pack cell keys into one integer so points can be grouped with np.unique;
+        # cy is shifted to be non-negative so divmod() unpacks it again.
+        shift = int(math.ceil(90 / self.cell_deg)) + 1
+        span = 2 * shift + 1
+        keys = cx * span + (cy + shift)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        # Candidates per occupied cell, flattened CSR-style.
+        cand_offsets = [0]
+        cand_ranks = []
+        for key in unique_keys.tolist():
+            q, r = divmod(key, span)
+            ranks = self.cells.get((q, r - shift), ())
+            cand_ranks.extend(ranks)
+            cand_offsets.append(len(cand_ranks))
+        cand_offsets = np.array(cand_offsets, dtype=np.int64)
+        cand_ranks = np.array(cand_ranks, dtype=np.int64)
+
+        counts = np.diff(cand_offsets)[inverse]
+        pair_point = np.repeat(np.arange(len(lng)), counts)
+        local = np.arange(len(pair_point)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_rank = cand_ranks[np.repeat(cand_offsets[:-1][inverse], counts) + local]
+
+        order = np.argsort(pair_rank, kind="stable")
+        pair_point, pair_rank = pair_point[order], pair_rank[order]
+        bounds = np.searchsorted(pair_rank, np.arange(len(self.ids) + 1))
+        for rank in range(len(self.ids)):
+            pts = pair_point[bounds[rank]:bounds[rank + 1]]
+            # Points already matched by a smaller region need no further tests.
+            pts = pts[best[pts] > rank]
+            if len(pts):
+                hit = pts[self._test(rank, lng[pts], lat[pts])]
+                best[hit] = rank
+
+        ids = self.ids + [None]
+        return [ids[r] for r in best.tolist()]
+
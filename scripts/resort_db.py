@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""SQLite resort database, with assets/resorts.json as its exported build artifact.
+
+One row per resort holds the feature's properties and geometry as JSON
+text, exactly as they appear in resorts.json, plus its position in the
+file. slug, name, pass, country, region_id, has_pistes, lng and lat are
+generated columns over that JSON, so they can never disagree with it, and
+slug/pass/country/region_id are indexed. Triggers keep resorts_rtree, an
+SQLite R*Tree over the coordinates, in step with every insert, update and
+delete.
+
+    resort_db.py import              # resorts.json -> assets/resorts.sqlite
+    resort_db.py export              # assets/resorts.sqlite -> resorts.json (byte-identical round trip)
+    resort_db.py export --shards     # ... and the viewport shards in public/data/resorts/
+    resort_db.py query --pass Epic --no-pistes
+    resort_db.py query --near -106.95 39.19 --radius-km 50
+
+Export rewrites resorts.json only when its content changed, atomically and
+under resort_store's lock. Its output depends only on the rows, so the same
+database always exports the same bytes.
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+
+import instrument
+import resort_store
+from resort_store import REPO_ROOT, RESORTS_PATH
+
+DB_PATH = os.path.join(REPO_ROOT, "assets", "resorts.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resorts (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    properties TEXT NOT NULL,
+    geometry TEXT NOT NULL,
+    slug TEXT GENERATED ALWAYS AS (json_extract(properties, '$.slug')) VIRTUAL,
+    name TEXT GENERATED ALWAYS AS (json_extract(properties, '$.name')) VIRTUAL,
+    pass TEXT GENERATED ALWAYS AS (json_extract(properties, '$.pass')) VIRTUAL,
+    country TEXT GENERATED ALWAYS AS (json_extract(properties, '$.country')) VIRTUAL,
+    region_id TEXT GENERATED ALWAYS AS (json_extract(properties, '$.region_id')) VIRTUAL,
+    has_pistes INTEGER GENERATED ALWAYS AS (coalesce(json_extract(properties, '$.assets.pistes'), 0)) VIRTUAL,
+    lng REAL GENERATED ALWAYS AS (json_extract(geometry, '$.coordinates[0]')) STORED,
+    lat REAL GENERATED ALWAYS AS (json_extract(geometry, '$.coordinates[1]')) STORED
+);
+CREATE UNIQUE INDEX IF NOT EXISTS resorts_slug ON resorts (slug);
+CREATE INDEX IF NOT EXISTS resorts_pass ON resorts (pass, has_pistes);
+CREATE INDEX IF NOT EXISTS resorts_country ON resorts (country);
+CREATE INDEX IF NOT EXISTS resorts_region ON resorts (region_id);
+CREATE INDEX IF NOT EXISTS resorts_position ON resorts (position);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS resorts_rtree USING rtree (id, min_lng, max_lng, min_lat, max_lat);
+CREATE TRIGGER IF NOT EXISTS resorts_rtree_insert AFTER INSERT ON resorts BEGIN
+    INSERT INTO resorts_rtree VALUES (new.id, new.lng, new.lng, new.lat, new.lat);
+END;
+CREATE TRIGGER IF NOT EXISTS resorts_rtree_update AFTER UPDATE OF geometry ON resorts BEGIN
+    UPDATE resorts_rtree SET min_lng = new.lng, max_lng = new.lng, min_lat = new.lat, max_lat = new.lat
+    WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS resorts_rtree_delete AFTER DELETE ON resorts BEGIN
+    DELETE FROM resorts_rtree WHERE id = old.id;
+END;
+"""
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def import_json(conn, path=RESORTS_PATH):
+    """Replace every row with the features of a resorts.json. Returns the resort count."""
+    with open(path) as f:
+        features = json.load(f)["features"]
+    with conn:
+        conn.execute("DELETE FROM resorts")
+        conn.executemany(
+            "INSERT INTO resorts (position, properties, geometry) VALUES (?, ?, ?)",
+            ((i, json.dumps(feat["properties"]), json.dumps(feat["geometry"])) for i, feat in enumerate(features)))
+    return len(features)
+
+
+def feature_collection(conn):
+    """The database as a resorts.json FeatureCollection, in file order."""
+    rows = conn.execute("SELECT properties, geometry FROM resorts ORDER BY position, id")
+    return {
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "properties": json.loads(p), "geometry": json.loads(g)} for p, g in rows],
+    }
+
+
+def export_json(conn, path=RESORTS_PATH):
+    """Write the database out as resorts.json. Returns True when the file changed."""
+    body = resort_store.encode(feature_collection(conn))
+    with resort_store.lock(path):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                if f.read() == body:
+                    return False
+        resort_store.write_file(path, body)
+    return True
+
+
+def add(conn, feature):
+    """Insert a resort feature after the current last one."""
+    (position,) = conn.execute("SELECT coalesce(max(position), -1) + 1 FROM resorts").fetchone()
+    conn.execute("INSERT INTO resorts (position, properties, geometry) VALUES (?, ?, ?)",
+                 (position, json.dumps(feature["properties"]), json.dumps(feature["geometry"])))
+
+
+def update(conn, slug, **props):
+    """Set properties of one resort by slug, e.g. update(conn, slug, region_id="alps")."""
+    for key, value in props.items():
+        conn.execute("UPDATE resorts SET properties = json_set(properties, ?, json(?)) WHERE slug = ?",
+                     (f"$.{key}", json.dumps(value), slug))
+
+
+def find(conn, pass_name=None, country=None, region_id=None, has_pistes=None, bbox=None):
+    """Rows matching every given filter, in file order. bbox is (west, south, east, north)."""
+    where, params = [], []
+    for column, value in (("pass", pass_name), ("country", country), ("region_id", region_id)):
+        if value is not None:
+            where.append(f"r.{column} = ?")
+            params.append(value)
+    if has_pistes is not None:
+        where.append("r.has_pistes = ?" if has_pistes else "NOT r.has_pistes")
+        if has_pistes:
+            params.append(1)
+    join = ""
+    if bbox is not None:
+        west, south, east, north = bbox
+        join = "JOIN resorts_rtree t ON t.id = r.id"
+        where.append("t.min_lng >= ? AND t.max_lng <= ? AND t.min_lat >= ? AND t.max_lat <= ?")
+        params += [west, east, south, north]
+    sql = f"SELECT r.* FROM resorts r {join}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " ORDER BY r.position, r.id", params).fetchall()
+
+
+def near(conn, lng, lat, radius_m):
+    """(row, distance_m) pairs within radius_m of a point, nearest first.
+
+    The R*Tree narrows to the enclosing box; haversine decides the rest.
+    """
+    from overpass import haversine_m
+
+    dlat = radius_m / 111_320.0
+    dlng = min(dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6), 180)
+    boxes = [(lng - dlng, lng + dlng)]
+    # Boxes crossing the antimeridian are queried as two.
+    if lng - dlng < -180:
+        boxes = [(-180, lng + dlng), (lng - dlng + 360, 180)]
+    elif lng + dlng > 180:
+        boxes = [(lng - dlng, 180), (-180, lng + dlng - 360)]
+    found = []
+    for west, east in boxes:
+        rows = conn.execute(
+            "SELECT r.* FROM resorts_rtree t JOIN resorts r ON r.id = t.id "
+            "WHERE t.min_lng >= ? AND t.max_lng <= ? AND t.min_lat >= ? AND t.max_lat <= ?",
+            (west, east, lat - dlat, lat + dlat))
+        for row in rows:
+            d = haversine_m(lat, lng, row["lat"], row["lng"])
+            if d <= radius_m:
+                found.append((row, d))
+    found.sort(key=lambda pair: pair[1])
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--json", default=RESORTS_PATH, help="resorts.json to import from / export to")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="load resorts.json into the database, replacing its contents")
+    export = sub.add_parser("export", help="regenerate resorts.json from the database")
+    export.add_argument("--shards", action="store_true",
+                        help="also rebuild the viewport shards in public/data/resorts (build_resort_shards.py)")
+    query = sub.add_parser("query", help="print matching resorts")
+    query.add_argument("--pass", dest="pass_name")
+    query.add_argument("--country")
+    query.add_argument("--region")
+    pistes = query.add_mutually_exclusive_group()
+    pistes.add_argument("--pistes", dest="has_pistes", action="store_const", const=True)
+    pistes.add_argument("--no-pistes", dest="has_pistes", action="store_const", const=False)
+    query.add_argument("--bbox", type=float, nargs=4, metavar=("WEST", "SOUTH", "EAST", "NORTH"))
+    query.add_argument("--near", type=float, nargs=2, metavar=("LNG", "LAT"))
+    query.add_argument("--radius-km", type=float, default=25)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    t0 = time.perf_counter()
+    if args.command == "import":
+        n = import_json(conn, args.json)
+        print(f"Imported {n} resorts into {args.db} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    elif args.command == "export":
+        changed = export_json(conn, args.json)
+        print(f"{'Wrote' if changed else 'Unchanged:'} {args.json} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        if args.shards:
+            import build_resort_shards
+
+            written = build_resort_shards.write(build_resort_shards.build(feature_collection(conn)))
+            print(f"Shards: {written} files written to {build_resort_shards.OUT_DIR}")
+    elif args.near:
+        rows = near(conn, args.near[0], args.near[1], args.radius_km * 1000)
+        elapsed = time.perf_counter() - t0
+        for row, d in rows:
+            print(f"  {d / 1000:6.1f} km  {row['name']} ({row['slug']}, {row['pass']})")
+        print(f"{len(rows)} resorts in {elapsed * 1000:.2f} ms")
+    else:
+        rows = find(conn, args.pass_name, args.country, args.region, args.has_pistes, args.bbox)
+        elapsed = time.perf_counter() - t0
+        for row in rows:
+            print(f"  {row['name']} ({row['slug']}, {row['pass']}, {row['country']})")
+        print(f"{len(rows)} resorts in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    instrument.main(main)
@@ -0,0 +1,180 @@
+"""Proximity-based deduplication of resort candidates from OSM.
+
+OSM often maps one ski area several times: the winter_sports landuse, a
+leisure=ski_resort node, a tourism=resort way, with names that differ in
+spelling or suffix ("Whitefish Mountain Resort" / "Whitefish Mountain"). Two
+candidates are the same resort when they lie within RADIUS_M of each other
+and their names are similar, or within SAME_SPOT_M whatever their names.
+
+Candidates are bucketed in a grid hash with cells RADIUS_M tall, so each
+one is compared only against its neighbouring cells, and matches are joined
+with union-find. The whole pass is linear in the number of candidates for
+any realistic density.
+"""
+
+import math
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from overpass import haversine_m
+
+RADIUS_M = 2000
+SAME_SPOT_M = 150
+MIN_SIMILARITY = 0.8
+
+# Words that say "ski area" rather than which one; dropped before comparing names.
+GENERIC_WORDS = {
+    "ski", "area", "resort", "resorts", "skiarea", "skigebiet", "skiresort", "station", "de", "du", "la",
+    "le", "domaine", "skiable", "stazione", "sciistica", "estacion", "esqui", "centre", "center",
+    "skicenter", "skizentrum", "lifts", "the",
+}
+
+
+def name_tokens(name):
+    """Accent-free lowercase words of a name, without generic ski-area words."""
+    s = unicodedata.normalize("NFKD", name)
+    s = "".join(c for c in s if not unicodedata.combining(c)).lower()
+    words = re.findall(r"\w+", s)
+    meaningful = [w for w in words if w not in GENERIC_WORDS]
+    return meaningful or words
+
+
+def similarity(a, b):
+    """Name similarity in [0, 1] between two token lists.
+
+    One name's words all appearing in the other ("Big Sky" / "Big Sky Resort")
+    counts as a full match; otherwise it is the character-level ratio.
+    """
+    if not a or not b:
+        return 0.0
+    sa, sb = set(a), set(b)
+    if sa <= sb or sb <= sa:
+        return 1.0
+    return SequenceMatcher(None, " ".join(a), " ".join(b)).ratio()
+
+
+class SpatialHash:
+    """Uniform lat/lon grid for "everything within r metres" queries."""
+
+    def __init__(self, radius_m):
+        self.radius_m = radius_m
+        self.cell = radius_m / 111_320.0
+        self.columns = math.ceil(360 / self.cell)
+        self.grid = {}
+        self.points = []
+
+    def _key(self, lat, lon):
+        # Columns count from the antimeridian so they wrap with a modulo.
+        return int(lat // self.cell), int((lon + 180) // self.cell) % self.columns
+
+    def add(self, lat, lon):
+        """Insert a point and return its index."""
+        self.points.append((lat, lon))
+        self.grid.setdefault(self._key(lat, lon), []).append(len(self.points) - 1)
+        return len(self.points) - 1
+
+    def near(self, lat, lon):
+        """Yield (index, distance_m) of every stored point within radius_m."""
+        # Longitude cells shrink towards the poles, so widen the search there.
+        span = int(1 / max(math.cos(math.radians(abs(lat) + self.cell)), 0.05)) + 1
+        ci, cj = self._key(lat, lon)
+        columns = {(cj + dj) % self.columns for dj in range(-span, span + 1)}
+        for di in (-1, 0, 1):
+            for c in columns:
+                for j in self.grid.get((ci + di, c), ()):
+                    d = haversine_m(lat, lon, *self.points[j])
+                    if d <= self.radius_m:
+                        yield j, d
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def website(candidate):
+    tags = candidate.get("tags", {})
+    return tags.get("website") or tags.get("url") or ""
+
+
+class Deduper:
+    """Group candidates that are the same resort, fed in one at a time.
+
+    candidates and anchors are dicts with "name", "lat" and "lon". Anchors are
+    resorts already in the dataset: any group containing one is dropped.
+    Earlier candidates are remembered only as a position and name tokens, plus
+    the best record of each group (see rank()) and the best one with a website,
+    so a tiled ingest can stream its candidates through without holding them.
+    """
+
+    def __init__(self, anchors=(), radius_m=RADIUS_M, same_spot_m=SAME_SPOT_M, min_similarity=MIN_SIMILARITY):
+        self.same_spot_m = same_spot_m
+        self.min_similarity = min_similarity
+        self.index = SpatialHash(radius_m)
+        self.tokens = []
+        self.parent = []
+        self.size = []  # candidates (not anchors) in the group, kept on roots
+        self.best = {}  # unanchored root -> (rank, index, candidate) of its best record
+        self.with_site = {}  # likewise, among the records with a website
+        self.pairs = 0
+        self.anchored = 0  # candidates that joined a group with an anchor
+        anchors = list(anchors)
+        self.n_anchors = len(anchors)
+        for anchor in anchors:
+            self._insert(anchor, 0)
+
+    def __len__(self):
+        return len(self.parent) - self.n_anchors
+
+    def add(self, candidate):
+        i = len(self.parent)
+        self.best[i] = (rank(candidate), i, candidate)
+        if website(candidate):
+            self.with_site[i] = self.best[i]
+        self._insert(candidate, 1)
+
+    def _insert(self, record, size):
+        i = len(self.parent)
+        tokens = name_tokens(record["name"])
+        self.tokens.append(tokens)
+        self.parent.append(i)
+        self.size.append(size)
+        for j, d in self.index.near(record["lat"], record["lon"]):
+            if d <= self.same_spot_m or similarity(tokens, self.tokens[j]) >= self.min_similarity:
+                self.pairs += 1
+                self._union(i, j)
+        self.index.add(record["lat"], record["lon"])
+
+    def _union(self, i, j):
+        a, b = _find(self.parent, i), _find(self.parent, j)
+        if a == b:
+            return
+        # Anchors stay roots so a group containing one is easy to spot.
+        keep, gone = min(a, b), max(a, b)
+        self.parent[gone] = keep
+        if keep < self.n_anchors:
+            if gone >= self.n_anchors:
+                self.anchored += self.size[gone]
+            self.best.pop(gone, None)
+            self.with_site.pop(gone, None)
+            return
+        self.size[keep] += self.size[gone]
+        for best in (self.best, self.with_site):
+            if gone in best:
+                other = best.pop(gone)
+                best[keep] = min(best[keep], other) if keep in best else other
+
+    def groups(self):
+        """[(canonical candidate, website), ...] for every group without an anchor, in first-seen order."""
+        return [(self.best[root][2], website(self.with_site[root][2]) if root in self.with_site else "")
+                for root in sorted(self.best)]
+
+
+def rank(candidate):
+    """Sort key choosing the canonical record of a group: the mapped ski area over its parts."""
+    tags = candidate.get("tags", {})
+    is_area = tags.get("landuse") == "winter_sports" or tags.get("leisure") == "ski_resort"
+    return (not is_area, not (tags.get("website") or tags.get("url")), -len(tags), candidate["name"])
@@ -0,0 +1,276 @@
+"""Shared access to assets/resorts.json for the pipeline scripts.
+
+ResortStore loads the FeatureCollection once and indexes it by slug, pass,
+region_id and a GRID_DEG lat/lon grid, so scripts ask for "the Ikon
+resorts" or "resorts within 10 km" instead of scanning every feature.
+Resorts are handed out as Resort views over the underlying GeoJSON
+features; changing pass, region_id or slug through the store keeps the
+indexes current.
+
+save() is the only writer. It serializes in one canonical form, skips the
+write when nothing changed, and otherwise writes a temp file in the same
+directory and renames it over resorts.json, so readers never see a
+half-written file. A save whose file was rewritten by another step since
+it was loaded raises ConcurrentModificationError rather than silently
+dropping the other step's changes; long-running steps apply their updates
+inside ResortStore.edit() instead, which reloads under a lock.
+"""
+
+import fcntl
+import hashlib
+import json
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+import instrument
+from overpass import haversine_m
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESORTS_PATH = os.path.join(REPO_ROOT, "assets", "resorts.json")
+GRID_DEG = 1.0
+INDEXED = {"slug", "pass", "region_id"}
+
+
+class ConcurrentModificationError(RuntimeError):
+    pass
+
+
+def encode(data):
+    """resorts.json's canonical serialization."""
+    return json.dumps(data).encode("utf-8")
+
+
+@contextmanager
+def lock(path=RESORTS_PATH):
+    """Exclusive lock shared by every writer of resorts.json (and files derived with it)."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(path)), ".resorts.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def write_file(path, body):
+    """Atomically replace path with body (bytes): temp file in the same directory, fsync, rename."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    instrument.count("bytes_written", len(body))
+
+
+def digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class Resort:
+    """A view over one resorts.json feature."""
+
+    __slots__ = ("feature",)
+
+    def __init__(self, feature):
+        self.feature = feature
+
+    @property
+    def properties(self):
+        return self.feature["properties"]
+
+    @property
+    def slug(self):
+        return self.feature["properties"].get("slug")
+
+    @property
+    def name(self):
+        return self.feature["properties"]["name"]
+
+    @property
+    def pass_name(self):
+        return self.feature["properties"].get("pass")
+
+    @property
+    def region_id(self):
+        return self.feature["properties"].get("region_id")
+
+    @property
+    def lng(self):
+        return self.feature["geometry"]["coordinates"][0]
+
+    @property
+    def lat(self):
+        return self.feature["geometry"]["coordinates"][1]
+
+    @property
+    def assets(self):
+        """The resort's asset flags, created empty if missing."""
+        return self.feature["properties"].setdefault("assets", {})
+
+    def __repr__(self):
+        return f"Resort({self.slug!r})"
+
+
+class ResortStore:
+    def __init__(self, path=RESORTS_PATH):
+        self.path = path
+        self._locked = False
+        with instrument.span("load_resorts"):
+            with open(path, "rb") as f:
+                raw = f.read()
+            instrument.count("bytes_read", len(raw))
+            self._digest = hashlib.sha256(raw).hexdigest()
+            self.data = json.loads(raw)
+            self.resorts = [Resort(feat) for feat in self.data["features"]]
+            self.reindex()
+
+    def reindex(self):
+        """Rebuild every index. Needed only after editing features directly rather than through set()."""
+        self._by_slug = {}
+        self._by_pass = {}
+        self._by_region = {}
+        self._grid = {}
+        for resort in self.resorts:
+            self._insert(resort)
+
+    def _insert(self, resort):
+        # Buckets are insertion-ordered dicts used as sets, so _remove is O(1) even for a bucket
+        # holding most resorts (region None before assign_regions, Independent in update_passes).
+        self._by_slug[resort.slug] = resort
+        self._by_pass.setdefault(resort.pass_name, {})[resort] = None
+        self._by_region.setdefault(resort.region_id, {})[resort] = None
+        self._grid.setdefault(self._cell(resort.lng, resort.lat), {})[resort] = None
+
+    @staticmethod
+    def _cell(lng, lat):
+        return int(math.floor(lat / GRID_DEG)), int(math.floor((lng + 180) / GRID_DEG)) % int(360 / GRID_DEG)
+
+    def __len__(self):
+        return len(self.resorts)
+
+    def __iter__(self):
+        return iter(self.resorts)
+
+    def get(self, slug):
+        """The resort with this slug, or None."""
+        return self._by_slug.get(slug)
+
+    def slugs(self):
+        return self._by_slug.keys()
+
+    def with_pass(self, pass_name):
+        return list(self._by_pass.get(pass_name, ()))
+
+    def passes(self):
+        """{pass: resort count}."""
+        return {p: len(rs) for p, rs in self._by_pass.items()}
+
+    def in_region(self, region_id):
+        """Resorts with this region_id; None gives the unassigned ones."""
+        return list(self._by_region.get(region_id, ()))
+
+    def regions(self):
+        """{region_id: resort count}."""
+        return {r: len(rs) for r, rs in self._by_region.items()}
+
+    def near(self, lng, lat, radius_m):
+        """(resort, distance_m) pairs within radius_m of a point, nearest first."""
+        dlat = radius_m / 111_320.0
+        dlng = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        lo_y, lo_x = self._cell(lng - dlng, lat - dlat)
+        hi_y, _ = self._cell(lng + dlng, lat + dlat)
+        columns = int(360 / GRID_DEG)
+        span = min(int(math.ceil(2 * dlng / GRID_DEG)) + 1, columns)
+        found = []
+        for y in range(lo_y, hi_y + 1):
+            for x in range(lo_x, lo_x + span):
+                for resort in self._grid.get((y, x % columns), ()):
+                    d = haversine_m(lat, lng, resort.lat, resort.lng)
+                    if d <= radius_m:
+                        found.append((resort, d))
+        found.sort(key=lambda pair: pair[1])
+        return found
+
+    def set(self, resort, key, value):
+        """Set one property, keeping the slug/pass/region indexes current."""
+        props = resort.properties
+        if props.get(key) == value:
+            return
+        if key in INDEXED:
+            self._remove(resort)
+            props[key] = value
+            self._insert(resort)
+        else:
+            props[key] = value
+
+    def _remove(self, resort):
+        self._by_slug.pop(resort.slug, None)
+        for index, key in ((self._by_pass, resort.pass_name), (self._by_region, resort.region_id),
+                           (self._grid, self._cell(resort.lng, resort.lat))):
+            members = index[key]
+            del members[resort]
+            if not members:
+                del index[key]
+
+    def add(self, feature):
+        """Append a new resort feature and return its Resort."""
+        if feature["properties"].get("slug") in self._by_slug:
+            raise ValueError(f"duplicate slug {feature['properties']['slug']!r}")
+        self.data["features"].append(feature)
+        resort = Resort(feature)
+        self.resorts.append(resort)
+        self._insert(resort)
+        return resort
+
+    def sort(self, key=lambda resort: resort.name):
+        """Reorder the features in the file (indexes are unaffected)."""
+        self.resorts.sort(key=key)
+        self.data["features"] = [r.feature for r in self.resorts]
+
+    def save(self, force=False):
+        """Write back if the content changed. Returns True when the file was rewritten.
+
+        force overwrites changes another process saved since this store was loaded.
+        """
+        with instrument.span("save_resorts"):
+            body = encode(self.data)
+            new_digest = hashlib.sha256(body).hexdigest()
+            if new_digest == self._digest:
+                return False
+            if self._locked:
+                self._write(body, force)
+            else:
+                # Hold the lock from the freshness check to the rename so two writers cannot interleave.
+                with lock(self.path):
+                    self._write(body, force)
+            self._digest = new_digest
+            return True
+
+    def _write(self, body, force):
+        if not force and digest(self.path) != self._digest:
+            raise ConcurrentModificationError(
+                f"{self.path} was rewritten since it was loaded; re-run to apply changes on top of it")
+        write_file(self.path, body)
+
+    @classmethod
+    @contextmanager
+    def edit(cls, path=RESORTS_PATH):
+        """Load, modify and save under the write lock.
+
+        For steps that spend minutes fetching before they update resorts.json:
+        applying their results to a fresh load keeps whatever other steps saved
+        in the meantime.
+        """
+        with lock(path):
+            store = cls(path)
+            store._locked = True
+            yield store
+            store.save()
@@ -0,0 +1,181 @@
+"""Compact snow snapshots and the append-only snow history.
+
+Three files, all keyed by resort index, a resort's position in the key table:
+
+public/data/snow-keys.json
+    {"slugs": [...]}. Append-only: new resorts get the next index, and
+    resorts that disappear keep theirs, so an index means the same resort in
+    every snapshot and every history segment.
+
+public/data/snow.json
+    The latest run, columnar: {"fetchedAt", "fetchedAtISO", "count", "keys",
+    "fields", "index", "values"}. "keys" is the length of the key table the
+    run was written against; index[j] is the resort index of the j-th
+    fetched resort and values[field][j] its value. Names, coordinates and
+    passes live in resorts.json and are not repeated.
+
+assets/snow-history/
+    One raw little-endian float32 file per segment, shaped
+    (runs, resorts, len(HISTORY_FIELDS)) with NaN for missing values, plus
+    index.json listing each segment's file, resort count and run
+    timestamps. A run is appended in place; a new segment starts each month
+    or when the key table grows. Segments open as numpy memmaps, so a
+    resort's history is a strided slice and never loads the other resorts.
+    The directory is not in git: appending to a binary every six hours would
+    add a full copy of the segment to the repository each run. The
+    snow-prefetch workflow restores it from the Actions cache before a run and
+    saves it under a new key afterwards.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import instrument
+from resort_store import REPO_ROOT, write_file
+
+KEYS_PATH = os.path.join(REPO_ROOT, "public", "data", "snow-keys.json")
+SNOW_PATH = os.path.join(REPO_ROOT, "public", "data", "snow.json")
+HISTORY_DIR = os.path.join(REPO_ROOT, "assets", "snow-history")
+FIELDS = ["temperature", "snow_depth", "snowfall_now", "snowfall_24h", "snowfall_7d", "wind_speed", "weather_code"]
+HISTORY_FIELDS = ["snowfall_24h", "snow_depth"]
+DTYPE = np.dtype("<f4")
+
+
+def _dump(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def load_keys(path=KEYS_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)["slugs"]
+    except FileNotFoundError:
+        return []
+
+
+def update_keys(slugs, path=KEYS_PATH):
+    """Append any slugs the key table lacks. Returns the full key list."""
+    keys = load_keys(path)
+    known = set(keys)
+    added = [s for s in slugs if s not in known]
+    if added:
+        keys = keys + sorted(set(added))
+        write_file(path, _dump({"slugs": keys}))
+    return keys
+
+
+def encode_snapshot(records, keys, fetched_at_ms):
+    """Columnar snow.json from per-resort records ({"slug", <FIELDS>...})."""
+    position = {slug: i for i, slug in enumerate(keys)}
+    records = sorted(records, key=lambda r: position[r["slug"]])
+    when = datetime.fromtimestamp(fetched_at_ms / 1000, timezone.utc)
+    return {
+        "fetchedAt": fetched_at_ms,
+        "fetchedAtISO": when.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "count": len(records),
+        "keys": len(keys),
+        "fields": FIELDS,
+        "index": [position[r["slug"]] for r in records],
+        "values": {field: [r.get(field) for r in records] for field in FIELDS},
+    }
+
+
+def write_snapshot(records, keys, fetched_at_ms, path=SNOW_PATH):
+    write_file(path, _dump(encode_snapshot(records, keys, fetched_at_ms)))
+
+
+def history_row(records, keys):
+    """(len(keys), len(HISTORY_FIELDS)) float32 array of one run, NaN where missing."""
+    index = {slug: i for i, slug in enumerate(keys)}
+    row = np.full((len(keys), len(HISTORY_FIELDS)), np.nan, dtype=DTYPE)
+    for record in records:
+        i = index[record["slug"]]
+        for j, field in enumerate(HISTORY_FIELDS):
+            if record.get(field) is not None:
+                row[i, j] = record[field]
+    return row
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DIR):
+        self.path = path
+        try:
+            with open(os.path.join(path, "index.json")) as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {"fields": HISTORY_FIELDS, "segments": []}
+        if self.index["fields"] != HISTORY_FIELDS:
+            raise ValueError(f"{path} stores {self.index['fields']}, expected {HISTORY_FIELDS}")
+
+    def _save_index(self):
+        write_file(os.path.join(self.path, "index.json"), json.dumps(self.index, indent=1).encode())
+
+    def append(self, time_ms, row):
+        """Add one run's (resorts, fields) row. Returns False if a run with that timestamp is already stored."""
+        segments = self.index["segments"]
+        if any(time_ms in seg["times"] for seg in segments):
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        month = datetime.fromtimestamp(time_ms / 1000, timezone.utc).strftime("%Y-%m")
+        seg = segments[-1] if segments else None
+        if seg is None or seg["month"] != month or seg["resorts"] != row.shape[0]:
+            n = sum(s["month"] == month for s in segments)
+            seg = {"file": f"{month}.{n}.f32" if n else f"{month}.f32", "month": month, "resorts": row.shape[0],
+                   "times": []}
+            segments.append(seg)
+        path = os.path.join(self.path, seg["file"])
+        # Trim anything past the last indexed run (an append interrupted before the index was saved).
+        expected = len(seg["times"]) * row.size * DTYPE.itemsize
+        with open(path, "ab") as f:
+            if f.tell() != expected:
+                f.truncate(expected)
+            instrument.count("bytes_written", f.write(np.ascontiguousarray(row, dtype=DTYPE).tobytes()))
+            f.flush()
+            os.fsync(f.fileno())
+        seg["times"].append(time_ms)
+        self._save_index()
+        return True
+
+    def segment(self, seg):
+        """Memmap of one segment, shaped (runs, resorts, fields)."""
+        return np.memmap(os.path.join(self.path, seg["file"]), dtype=DTYPE, mode="r",
+                         shape=(len(seg["times"]), seg["resorts"], len(HISTORY_FIELDS)))
+
+    def series(self, resort, field, since_ms=None):
+        """(times_ms, values) of one field for one resort index across every run, oldest first.
+
+        Runs from before the resort had an index are skipped.
+        """
+        j = HISTORY_FIELDS.index(field)
+        times, values = [], []
+        for seg in self.index["segments"]:
+            if resort >= seg["resorts"] or not seg["times"]:
+                continue
+            t = np.asarray(seg["times"], dtype=np.int64)
+            v = self.segment(seg)[:, resort, j]
+            keep = t >= since_ms if since_ms is not None else slice(None)
+            times.append(t[keep])
+            values.append(np.asarray(v[keep]))
+        if not times:
+            return np.empty(0, np.int64), np.empty(0, DTYPE)
+        return np.concatenate(times), np.concatenate(values)
+
+    def matrix(self, field, since_ms=None):
+        """(times_ms, values) of one field for every resort: values is (runs, resorts), NaN-padded."""
+        j = HISTORY_FIELDS.index(field)
+        segs = [s for s in self.index["segments"] if s["times"]]
+        width = max((s["resorts"] for s in segs), default=0)
+        times, blocks = [], []
+        for seg in segs:
+            t = np.asarray(seg["times"], dtype=np.int64)
+            keep = t >= since_ms if since_ms is not None else np.ones(len(t), bool)
+            block = np.full((int(keep.sum()), width), np.nan, dtype=DTYPE)
+            block[:, :seg["resorts"]] = self.segment(seg)[keep, :, j]
+            times.append(t[keep])
+            blocks.append(block)
+        if not times:
+            return np.empty(0, np.int64), np.empty((0, width), DTYPE)
+        return np.concatenate(times), np.concatenate(blocks)
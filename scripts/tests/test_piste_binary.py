@@ -0,0 +1,84 @@
+"""Round-trip tests for the .skp piste encoding.
+
+    cd scripts && python3 -m pytest tests
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+import piste_binary
+
+
+def line(coords, **props):
+    return {"type": "Feature", "properties": props, "geometry": {"type": "LineString", "coordinates": coords}}
+
+
+def collection(*features):
+    return {"type": "FeatureCollection", "features": list(features)}
+
+
+def assert_round_trip(original, precision=piste_binary.PRECISION):
+    decoded = piste_binary.decode(piste_binary.encode(original, precision))
+    assert decoded["type"] == "FeatureCollection"
+    assert len(decoded["features"]) == len(original["features"])
+    for got, want in zip(decoded["features"], original["features"]):
+        assert got["properties"] == (want.get("properties") or {})
+        assert got["geometry"]["type"] == "LineString"
+        got_coords = np.asarray(got["geometry"]["coordinates"], dtype=np.float64).reshape(-1, 2)
+        want_coords = np.round(np.asarray(want["geometry"]["coordinates"], dtype=np.float64).reshape(-1, 2), precision)
+        assert got_coords.shape == want_coords.shape
+        np.testing.assert_allclose(got_coords, want_coords, rtol=0, atol=1e-9)
+
+
+EDGE_CASES = {
+    "empty collection": collection(),
+    "no properties": collection(line([[6.1, 45.9], [6.2, 46.0]])),
+    "unicode strings": collection(line([[10.0, 47.0], [10.1, 47.1]], name="Piste des Déserts ☃ 白馬", type="run")),
+    "negative coordinates": collection(line([[-70.31234, -33.35678], [-70.30001, -33.34999]], name="Valle Nevado")),
+    "one-point line": collection(line([[-106.9, 39.6]], name="stub")),
+    "two-point line": collection(line([[-106.9, 39.6], [-106.8, 39.7]], name="a", difficulty="blue")),
+    "mixed": collection(
+        line([[179.99999, 0.00001], [-179.99999, -0.00001]], type="lift"),
+        line([[0.0, 0.0]]),
+        line([[1.5, -2.5], [1.5, -2.5], [1.6, -2.4]], name="", difficulty=""),
+    ),
+}
+
+
+@pytest.mark.parametrize("name", EDGE_CASES)
+def test_round_trip_edge_cases(name):
+    assert_round_trip(EDGE_CASES[name])
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(piste_binary.PISTES_DIR, "*.geojson")))[:10],
+                         ids=os.path.basename)
+def test_round_trip_real_files(path):
+    with open(path) as f:
+        assert_round_trip(json.load(f))
+
+
+def test_decode_arrays_matches_decode():
+    original = EDGE_CASES["mixed"]
+    data = piste_binary.encode(original)
+    properties, offsets, coords = piste_binary.decode_arrays(data)
+    assert properties == [f["properties"] for f in original["features"]]
+    assert offsets == [0, 2, 3, 6]
+    assert coords.shape == (6, 2)
+
+
+@pytest.mark.parametrize("geometry", [
+    {"type": "LineString", "coordinates": [[6.1, 45.9, 1200.0], [6.2, 46.0, 1350.0]]},
+    {"type": "Point", "coordinates": [6.1, 45.9]},
+])
+def test_unsupported_geometry_is_rejected(geometry):
+    with pytest.raises(ValueError):
+        piste_binary.encode(collection({"type": "Feature", "properties": {}, "geometry": geometry}))
+
+
+def test_non_string_property_is_rejected():
+    with pytest.raises(ValueError):
+        piste_binary.encode(collection(line([[0.0, 0.0], [1.0, 1.0]], lanes=2)))
@@ -0,0 +1,130 @@
+"""prefetch_snow.py against a local open_meteo_standin.py server.
+
+    cd scripts && python3 -m pytest tests
+"""
+
+import json
+import sys
+import threading
+
+import pytest
+
+import open_meteo_standin
+import prefetch_snow
+import snow_store
+from resort_store import Resort
+
+
+def resort(slug, lng, lat, pass_name="Independent"):
+    return {"type": "Feature", "properties": {"name": slug, "slug": slug, "pass": pass_name},
+            "geometry": {"type": "Point", "coordinates": [lng, lat]}}
+
+
+# Two shared cells, two cells of one; negative coordinates and both hemispheres.
+RESORTS = [
+    resort("alta", -111.6378, 40.5884, "Mountain Collective"),
+    resort("alta_nordic", -111.6301, 40.5832),
+    resort("snowbird", -111.6569, 40.5829, "Ikon"),
+    resort("zermatt", 7.7491, 46.0207, "Epic"),
+    resort("valle_nevado", -70.2487, -33.3567, "Ikon"),
+    resort("tiny_hill", -70.2412, -33.3512),
+    resort("corralco", -71.5761, -38.3707),
+]
+
+
+@pytest.fixture
+def standin():
+    """start(fail_rate, seed) -> (server, base URL) for a stand-in on a free port."""
+    servers = []
+
+    def start(fail_rate=0.0, seed=0):
+        server = open_meteo_standin.serve(0, fail_rate, 0, seed)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def expected(lng, lat):
+    """The conditions the stand-in reports for a location, as sent with 4 decimals."""
+    return prefetch_snow.conditions(open_meteo_standin.forecast(float(f"{lat:.4f}"), float(f"{lng:.4f}")))
+
+
+def test_group_by_cell_forecasts_at_member_coordinates():
+    cells = prefetch_snow.group_by_cell([Resort(f) for f in RESORTS])
+    groups = {tuple(r.slug for r in members): location for location, members in cells}
+    assert set(groups) == {("alta", "alta_nordic", "snowbird"), ("zermatt",),
+                           ("valle_nevado", "tiny_hill"), ("corralco",)}
+    # Cells of one are forecast at the resort itself.
+    assert groups[("zermatt",)] == (7.7491, 46.0207)
+    assert groups[("corralco",)] == (-71.5761, -38.3707)
+    # Shared cells use a pass resort's coordinate: the one nearest the members' mean position.
+    assert groups[("alta", "alta_nordic", "snowbird")] == (-111.6378, 40.5884)
+    assert groups[("valle_nevado", "tiny_hill")] == (-70.2487, -33.3567)
+
+
+def test_retries_recover_failed_requests(standin, monkeypatch):
+    monkeypatch.setattr(prefetch_snow, "MAX_RETRIES", 6)
+    monkeypatch.setattr(prefetch_snow.asyncio, "sleep", _no_sleep)
+    server, url = standin(fail_rate=0.5, seed=3)
+    cells = prefetch_snow.group_by_cell([Resort(f) for f in RESORTS])
+    values, stats = prefetch_snow.asyncio.run(
+        prefetch_snow.fetch_all(cells, url, batch_size=1, concurrency=1, per_minute=10 ** 6))
+    assert stats["retries"] > 0
+    assert stats["failed_batches"] == 0
+    # Every attempt is a request: one per cell, plus the retries.
+    assert stats["requests"] == server.requests == len(cells) + stats["retries"]
+    assert values == {i: expected(*location) for i, (location, _) in enumerate(cells)}
+
+
+def test_exhausted_retries_drop_the_batch(standin, monkeypatch):
+    monkeypatch.setattr(prefetch_snow, "MAX_RETRIES", 1)
+    monkeypatch.setattr(prefetch_snow.asyncio, "sleep", _no_sleep)
+    server, url = standin(fail_rate=1.0)
+    cells = prefetch_snow.group_by_cell([Resort(f) for f in RESORTS])
+    values, stats = prefetch_snow.asyncio.run(
+        prefetch_snow.fetch_all(cells, url, batch_size=3, concurrency=2, per_minute=10 ** 6))
+    assert values == {}
+    assert stats["failed_batches"] == 2
+    assert server.requests == 4
+
+
+def test_main_writes_snapshot_keys_and_history(standin, tmp_path, monkeypatch):
+    server, url = standin()
+    resorts_path = tmp_path / "resorts.json"
+    resorts_path.write_text(json.dumps({"type": "FeatureCollection", "features": RESORTS}))
+    paths = {name: str(tmp_path / name) for name in ("snow.json", "snow-keys.json", "history")}
+    monkeypatch.setattr(sys, "argv", [
+        "prefetch_snow.py", "--url", url, "--resorts", str(resorts_path), "--batch-size", "3",
+        "--per-minute", "1000000", "--out", paths["snow.json"], "--keys", paths["snow-keys.json"],
+        "--history", paths["history"],
+    ])
+    prefetch_snow.main()
+
+    slugs = sorted(f["properties"]["slug"] for f in RESORTS)
+    assert snow_store.load_keys(paths["snow-keys.json"]) == slugs
+    # One location per cell, in ceil(4 / 3) requests.
+    assert (server.requests, server.locations) == (2, 4)
+
+    with open(paths["snow.json"]) as f:
+        snapshot = json.load(f)
+    assert snapshot["count"] == len(RESORTS)
+    assert snapshot["fields"] == snow_store.FIELDS
+    cells = prefetch_snow.group_by_cell([Resort(f) for f in RESORTS])
+    location_of = {r.slug: location for location, members in cells for r in members}
+    for j, index in enumerate(snapshot["index"]):
+        want = expected(*location_of[slugs[index]])
+        assert {field: snapshot["values"][field][j] for field in snow_store.FIELDS} == want
+
+    history = snow_store.HistoryStore(paths["history"])
+    (segment,) = history.index["segments"]
+    assert segment["times"] == [snapshot["fetchedAt"]]
+    assert segment["resorts"] == len(slugs)
+
+
+async def _no_sleep(delay):
+    pass
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""In-process vector tiler: clips line features to Web Mercator tiles, encodes
+Mapbox Vector Tiles and writes a PMTiles v3 archive, without tippecanoe.
+
+Tiles are encoded on a process pool; the parent only assigns features to
+tiles and lays out the archive. Run directly to tile the per-resort files in
+public/data/pistes and benchmark against tippecanoe; refresh.py runs it with
+--no-compare to build public/data/pistes.pmtiles, which nothing else writes
+(build-pistes.py's region archive goes to pistes-regions.pmtiles). The map
+itself still draws each resort's public/data/pistes/<slug>.geojson.
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrument
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PISTES_DIR = os.path.join(REPO_ROOT, "public", "data", "pistes")
+
+EXTENT = 4096
+BUFFER = 64  # tile-edge buffer in extent units, tippecanoe's default of 5px is ~80
+MIN_ZOOM = 10
+MAX_ZOOM = 14
+ROOT_DIR_BYTES = 16384 - 127  # PMTiles requires header + root directory in the first 16 KiB
+
+# ---------------------------------------------------------------------------
+# Projection and clipping
+
+
+def mercator(coords):
+    """[[lon, lat], ...] to an (n, 2) array of normalized Web Mercator (0..1 from the top-left)."""
+    lonlat = np.asarray(coords, dtype=np.float64)
+    lat = np.radians(np.clip(lonlat[:, 1], -85.0511287798, 85.0511287798))
+    return np.column_stack(((lonlat[:, 0] + 180.0) / 360.0, 0.5 - np.arctanh(np.sin(lat)) / (2 * math.pi)))
+
+
+def clip_lines(points, starts, lo, hi):
+    """Clip polylines to the square [lo, hi]^2.
+
+    points is an (n, 2) array holding every line back to back, with line i
+    beginning at row starts[i]. Liang-Barsky runs on all segments at once:
+    each gets the parameter range [t0, t1] that lies inside, and a new part
+    begins wherever a segment enters the square, follows one that left it, or
+    starts a new line. Returns (clipped points, row where each part begins,
+    line index of each part).
+    """
+    a = points[:-1]
+    d = points[1:] - a
+    t0 = np.zeros(len(a))
+    t1 = np.ones(len(a))
+    valid = np.ones(len(a), dtype=bool)
+    valid[starts[1:] - 1] = False  # the "segments" joining consecutive lines
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-d[:, 0], a[:, 0] - lo), (d[:, 0], hi - a[:, 0]),
+                     (-d[:, 1], a[:, 1] - lo), (d[:, 1], hi - a[:, 1])):
+            r = q / p
+            valid &= ~((p == 0) & (q < 0))
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    valid &= t0 <= t1
+    idx = np.flatnonzero(valid)
+    if not len(idx):
+        return np.zeros((0, 2)), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    seg_start = a[idx] + t0[idx, None] * d[idx]
+    seg_end = a[idx] + t1[idx, None] * d[idx]
+    new_part = np.ones(len(idx), dtype=bool)
+    new_part[1:] = (idx[1:] != idx[:-1] + 1) | (t0[idx[1:]] > 0) | (t1[idx[:-1]] < 1)
+    # Every segment contributes its end point; the first of each part also its start.
+    emit = np.column_stack((new_part, np.ones_like(new_part))).ravel()
+    clipped = np.stack((seg_start, seg_end), axis=1).reshape(-1, 2)[emit]
+    part_rows = np.flatnonzero(new_part) + np.arange(int(new_part.sum()))
+    part_line = np.searchsorted(starts, idx[new_part], side="right") - 1
+    return clipped, part_rows, part_line
+
+
+# ---------------------------------------------------------------------------
+# Protobuf / MVT encoding
+
+
+def _varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _field(out, number, wire_type, payload=None, value=None):
+    _varint(out, (number << 3) | wire_type)
+    if wire_type == 0:
+        _varint(out, value)
+    else:
+        _varint(out, len(payload))
+        out += payload
+
+
+def _packed_varints(values):
+    """Varint-encode a non-negative int64 array in one pass. Returns (bytes, byte end offset of each value)."""
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> 7
+    while rest.any():
+        sizes += rest > 0
+        rest >>= 7
+    ends = np.cumsum(sizes)
+    out = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    starts = ends - sizes
+    for k in range(int(sizes.max()) if len(sizes) else 0):
+        m = sizes > k
+        out[starts[m] + k] = ((values[m] >> (7 * k)) & 0x7F) | ((sizes[m] > k + 1) << 7)
+    return out.tobytes(), ends
+
+
+def _geometry(points, lengths, first_parts):
+    """MVT command streams for a layer's features, packed in one pass.
+
+    points holds every part's integer coordinates back to back, lengths is
+    the point count of each part and first_parts the index of each feature's
+    first part. Returns the packed bytes and, per feature, the (start, end)
+    byte range of its stream.
+    """
+    part_start = np.cumsum(lengths) - lengths
+
+    # The cursor carries over between parts but restarts at (0, 0) for each feature.
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    feature_start = part_start[first_parts]
+    deltas[feature_start] = points[feature_start]
+    zz = (deltas << 1) ^ (deltas >> 63)
+
+    # Each part is [MoveTo(1), x, y, LineTo(n - 1), x, y, ...].
+    part_offset = 2 * part_start + 2 * np.arange(len(lengths))
+    stream = np.empty(2 * len(points) + 2 * len(lengths), dtype=np.int64)
+    part_of_point = np.repeat(np.arange(len(lengths)), lengths)
+    local = np.arange(len(points)) - part_start[part_of_point]
+    pos = part_offset[part_of_point] + 1 + 2 * local + (local > 0)
+    stream[pos] = zz[:, 0]
+    stream[pos + 1] = zz[:, 1]
+    stream[part_offset] = 1 | (1 << 3)
+    stream[part_offset + 3] = 2 | ((lengths - 1) << 3)
+
+    packed, ends = _packed_varints(stream)
+    value_bounds = np.append(part_offset[first_parts], len(stream))
+    byte_bounds = np.concatenate(([0], ends))[value_bounds].tolist()
+    return packed, list(zip(byte_bounds[:-1], byte_bounds[1:]))
+
+
+def encode_layer(name, properties, points, lengths, first_parts):
+    """Encode one MVT LINESTRING layer.
+
+    properties has one dict per feature; points, lengths and first_parts
+    describe the features' parts in tile extent coordinates, as for _geometry.
+    """
+    keys, values = {}, {}
+    body = bytearray()
+    packed, ranges = _geometry(points, lengths, first_parts)
+    for props, (start, end) in zip(properties, ranges):
+        tags = bytearray()
+        for k, v in props.items():
+            _varint(tags, keys.setdefault(k, len(keys)))
+            _varint(tags, values.setdefault(str(v), len(values)))
+        feat = bytearray()
+        _field(feat, 2, 2, tags)
+        _field(feat, 3, 0, value=2)  # LINESTRING
+        _field(feat, 4, 2, packed[start:end])
+        _field(body, 2, 2, feat)
+
+    layer = bytearray()
+    _field(layer, 15, 0, value=2)
+    _field(layer, 1, 2, name.encode())
+    layer += body
+    for k in keys:
+        _field(layer, 3, 2, k.encode())
+    for v in values:
+        value = bytearray()
+        _field(value, 1, 2, v.encode())
+        _field(layer, 4, 2, value)
+    _field(layer, 5, 0, value=EXTENT)
+    return bytes(layer)
+
+
+# ---------------------------------------------------------------------------
+# Tiling
+
+# Set in each worker by _init_worker: {layer: [(properties, (n, 2) mercator array), ...]}
+_LAYERS = None
+
+
+def _init_worker(layers):
+    global _LAYERS
+    _LAYERS = layers
+
+
+def _render_tile(job):
+    """Worker: clip the assigned features to tile (z, x, y) and return (z, x, y, gzipped MVT or None)."""
+    z, x, y, members = job
+    scale = 1 << z
+    lo, hi = -BUFFER / EXTENT, 1 + BUFFER / EXTENT
+    tile = bytearray()
+    for layer_name, indexes in members:
+        features = [_LAYERS[layer_name][i] for i in indexes]
+        lines = [points for _, points in features]
+        starts = np.cumsum([0] + [len(p) for p in lines[:-1]])
+        clipped, part_rows, part_line = clip_lines(np.concatenate(lines) * scale - (x, y), starts, lo, hi)
+        if not len(part_rows):
+            continue
+
+        # Points closer than one extent unit collapse onto each other; parts left
+        # with fewer than two points are dropped.
+        q = np.round(clipped * EXTENT).astype(np.int64)
+        part_of_point = np.repeat(np.arange(len(part_rows)), np.diff(np.append(part_rows, len(q))))
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = (q[1:] != q[:-1]).any(axis=1)
+        keep[part_rows] = True
+        lengths = np.bincount(part_of_point[keep], minlength=len(part_rows))
+        keep &= (lengths >= 2)[part_of_point]
+        good = lengths >= 2
+        if not good.any():
+            continue
+        lengths, part_line = lengths[good], part_line[good]
+
+        lines_kept, first_parts = np.unique(part_line, return_index=True)
+        properties = [features[i][0] for i in lines_kept.tolist()]
+        _field(tile, 3, 2, encode_layer(layer_name, properties, q[keep], lengths, first_parts))
+    if not tile:
+        return z, x, y, None
+    return z, x, y, gzip.compress(bytes(tile), compresslevel=6, mtime=0)
+
+
+def _assign(layers, minzoom, maxzoom):
+    """Yield (z, x, y, [(layer, [feature indexes])]) for every tile a feature's bbox touches."""
+    pad = BUFFER / EXTENT
+    for z in range(minzoom, maxzoom + 1):
+        scale = 1 << z
+        tiles = {}
+        for layer_name, features in layers.items():
+            for i, (_, points) in enumerate(features):
+                (mx0, my0), (mx1, my1) = points.min(axis=0), points.max(axis=0)
+                x0 = max(int(mx0 * scale - pad), 0)
+                x1 = min(int(mx1 * scale + pad), scale - 1)
+                y0 = max(int(my0 * scale - pad), 0)
+                y1 = min(int(my1 * scale + pad), scale - 1)
+                for tx in range(x0, x1 + 1):
+                    for ty in range(y0, y1 + 1):
+                        tiles.setdefault((tx, ty), {}).setdefault(layer_name, []).append(i)
+        for (tx, ty), members in tiles.items():
+            yield z, tx, ty, list(members.items())
+
+
+def prepare(layers):
+    """Project {layer: [GeoJSON LineString features]} to the worker representation."""
+    out = {}
+    for name, features in layers.items():
+        out[name] = [
+            (f.get("properties") or {}, mercator(f["geometry"]["coordinates"]))
+            for f in features
+            if f["geometry"]["type"] == "LineString" and len(f["geometry"]["coordinates"]) >= 2
+        ]
+    return out
+
+
+def render_tiles(layers, minzoom=MIN_ZOOM, maxzoom=MAX_ZOOM, workers=None):
+    """Return {(z, x, y): gzipped MVT bytes} for {layer: [GeoJSON features]}."""
+    prepared = prepare(layers)
+    jobs = list(_assign(prepared, minzoom, maxzoom))
+    tiles = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prepared,)) as pool:
+        chunk = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 8))
+        for z, x, y, data in pool.map(_render_tile, jobs, chunksize=chunk):
+            if data is not None:
+                tiles[(z, x, y)] = data
+    return tiles
+
+
+# ---------------------------------------------------------------------------
+# PMTiles v3
+
+
+def zxy_to_tileid(z, x, y):
+    """Hilbert-curve tile id as defined by the PMTiles v3 spec."""
+    acc = ((1 << (z * 2)) - 1) // 3
+    for a in range(z - 1, -1, -1):
+        s = 1 << a
+        rx = s & x
+        ry = s & y
+        acc += ((3 * rx) ^ ry) << a
+        if ry == 0:
+            if rx != 0:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+    return acc
+
+
+def _serialize_directory(entries):
+    """entries: [(tile_id, offset, length, run_length)] sorted by tile_id. Returns gzipped bytes."""
+    out = bytearray()
+    _varint(out, len(entries))
+    last = 0
+    for tile_id, _, _, _ in entries:
+        _varint(out, tile_id - last)
+        last = tile_id
+    for _, _, _, run in entries:
+        _varint(out, run)
+    for _, _, length, _ in entries:
+        _varint(out, length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        prev = entries[i - 1] if i else None
+        if prev and offset == prev[1] + prev[2]:
+            _varint(out, 0)
+        else:
+            _varint(out, offset + 1)
+    return gzip.compress(bytes(out), mtime=0)
+
+
+def _build_directories(entries):
+    """Return (root_bytes, leaves_bytes), splitting into leaf directories when the root is too big."""
+    root = _serialize_directory(entries)
+    if len(root) <= ROOT_DIR_BYTES:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        leaves = bytearray()
+        root_entries = []
+        for i in range(0, len(entries), leaf_size):
+            chunk = entries[i:i + leaf_size]
+            leaf = _serialize_directory(chunk)
+            root_entries.append((chunk[0][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = _serialize_directory(root_entries)
+        if len(root) <= ROOT_DIR_BYTES:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+def write_pmtiles(path, tiles, layers, minzoom=MIN_ZOOM, maxzoom=MAX_ZOOM, name="pistes"):
+    """Write {(z, x, y): gzipped MVT} to a clustered PMTiles v3 archive.
+
+    Identical tiles are stored once, and runs of consecutive tile ids with the
+    same content collapse into one directory entry.
+    """
+    entries = []
+    data = bytearray()
+    offsets = {}
+    for tile_id, blob in sorted((zxy_to_tileid(*k), v) for k, v in tiles.items()):
+        digest = hashlib.sha256(blob).digest()
+        if digest in offsets:
+            offset = offsets[digest]
+        else:
+            offset = offsets[digest] = len(data)
+            data += blob
+        last = entries[-1] if entries else None
+        if last and last[1] == offset and last[0] + last[3] == tile_id:
+            entries[-1] = (last[0], last[1], last[2], last[3] + 1)
+        else:
+            entries.append((tile_id, offset, len(blob), 1))
+
+    root, leaves = _build_directories(entries)
+    vector_layers = []
+    for layer_name, features in layers.items():
+        fields = {}
+        for f in features:
+            for k in (f.get("properties") or {}):
+                fields[k] = "String"
+        vector_layers.append({"id": layer_name, "fields": fields, "minzoom": minzoom, "maxzoom": maxzoom})
+    metadata = gzip.compress(json.dumps({"name": name, "format": "pbf", "vector_layers": vector_layers}).encode(),
+                             mtime=0)
+
+    lons = [c[0] for fs in layers.values() for f in fs for c in f["geometry"]["coordinates"]] or [0.0]
+    lats = [c[1] for fs in layers.values() for f in fs for c in f["geometry"]["coordinates"]] or [0.0]
+    bounds = [int(v * 1e7) for v in (min(lons), min(lats), max(lons), max(lats))]
+
+    root_offset = 127
+    metadata_offset = root_offset + len(root)
+    leaves_offset = metadata_offset + len(metadata)
+    data_offset = leaves_offset + len(leaves)
+    header = b"PMTiles" + struct.pack(
+        "<BQQQQQQQQQQQBBBBBBiiiiBii",
+        3,
+        root_offset, len(root),
+        metadata_offset, len(metadata),
+        leaves_offset, len(leaves),
+        data_offset, len(data),
+        len(tiles), len(entries), len(offsets),
+        1,  # clustered
+        2,  # internal compression: gzip
+        2,  # tile compression: gzip
+        1,  # tile type: mvt
+        minzoom, maxzoom,
+        *bounds,
+        minzoom,
+        (bounds[0] + bounds[2]) // 2, (bounds[1] + bounds[3]) // 2,
+    )
+    assert len(header) == 127
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(root)
+        f.write(metadata)
+        f.write(leaves)
+        f.write(data)
+
+
+def build(path, layers, minzoom=MIN_ZOOM, maxzoom=MAX_ZOOM, workers=None):
+    """Tile {layer: [GeoJSON features]} and write a PMTiles archive. Returns the tile count."""
+    tiles = render_tiles(layers, minzoom, maxzoom, workers)
+    write_pmtiles(path, tiles, layers, minzoom, maxzoom)
+    return len(tiles)
+
+
+def run_tippecanoe(path, layers, minzoom=MIN_ZOOM, maxzoom=MAX_ZOOM):
+    """Build the same archive with the tippecanoe binary via temporary GeoJSON files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        args = ["tippecanoe", "-o", str(path), f"-Z{minzoom}", f"-z{maxzoom}",
+                "--drop-densest-as-needed", "--force"]
+        for name, features in layers.items():
+            layer_path = os.path.join(tmpdir, f"{name}.geojson")
+            with open(layer_path, "w") as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f)
+            args += ["-L", f"{name}:{layer_path}"]
+        subprocess.run(args, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", default=os.path.join(tempfile.gettempdir(), "pistes-bench.pmtiles"))
+    parser.add_argument("--workers", type=int, default=None, help="tile encoding processes (default: CPUs)")
+    parser.add_argument("--minzoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--maxzoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--no-compare", action="store_true", help="skip the tippecanoe comparison")
+    args = parser.parse_args()
+
+    layers = {"runs": [], "lifts": []}
+    for path in sorted(glob.glob(os.path.join(PISTES_DIR, "*.geojson"))):
+        with open(path) as f:
+            for feat in json.load(f)["features"]:
+                layers["lifts" if feat["properties"].get("type") == "lift" else "runs"].append(feat)
+    n = sum(len(v) for v in layers.values())
+    print(f"{n} features ({len(layers['runs'])} runs, {len(layers['lifts'])} lifts), z{args.minzoom}-{args.maxzoom}")
+
+    t0 = time.perf_counter()
+    count = build(args.out, layers, args.minzoom, args.maxzoom, args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f"python:     {elapsed:6.1f}s  {count} tiles  {os.path.getsize(args.out) / 1024:.0f}KB  "
+          f"({n / elapsed:.0f} features/s)")
+
+    if args.no_compare:
+        return
+    if shutil.which("tippecanoe"):
+        out = args.out.replace(".pmtiles", "-tippecanoe.pmtiles")
+        t0 = time.perf_counter()
+        run_tippecanoe(out, layers, args.minzoom, args.maxzoom)
+        elapsed = time.perf_counter() - t0
+        print(f"tippecanoe: {elapsed:6.1f}s  {os.path.getsize(out) / 1024:.0f}KB  ({n / elapsed:.0f} features/s)")
+    else:
+        print("tippecanoe: not installed, skipped")
+
+
+if __name__ == "__main__":
+    instrument.main(main)
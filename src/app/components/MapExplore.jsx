@@ -42,6 +42,7 @@ export function MapExplore({ resortCollection, nav }) {
 
   // Hooks — called unconditionally before any returns
   const setCurrentZoom = useMapStore((s) => s.setCurrentZoom);
+  const setMapBounds = useMapStore((s) => s.setMapBounds);
   const { spinning, setSpinning, spinningRef, stopSpin, toggleSpin } = useGlobeSpin(mapRef, nav.isGlobe);
   const { flyToResort, resetView, flyToRegion, onRegionClick, clickedFromMapRef } =
     useMapNavigation(mapRef, stopSpin, nav);
@@ -129,6 +130,11 @@ export function MapExplore({ resortCollection, nav }) {
     const east = bounds.getEast();
     const south = bounds.getSouth();
     const north = bounds.getNorth();
+    // Shard bboxes are in [-180, 180]; a viewport past the antimeridian wraps (west > east).
+    const wrap = (lng) => ((((lng + 180) % 360) + 360) % 360) - 180;
+    if (east - west >= 360) setMapBounds([-180, south, 180, north]);
+    else if (west >= -180 && east <= 180) setMapBounds([west, south, east, north]);
+    else setMapBounds([wrap(west), south, wrap(east), north]);
     const slugs = resorts
       .filter((r) => {
         const coords = r.geometry?.coordinates;
@@ -139,7 +145,7 @@ export function MapExplore({ resortCollection, nav }) {
       .map((r) => r.properties?.slug)
       .filter(Boolean);
     setVisibleSlugs(slugs);
-  }, [spinningRef, resorts, setVisibleSlugs, setCurrentZoom]);
+  }, [spinningRef, resorts, setVisibleSlugs, setCurrentZoom, setMapBounds]);
 
   // Click on resort
   const onClick = useCallback(
@@ -2,6 +2,7 @@
 import React, { useRef, useEffect } from "react";
 import { getPercentile } from "../utils/percentiles";
 import useMapStore from "../store/useMapStore";
+import useSnowPercentiles from "../hooks/useSnowPercentiles";
 import { RegionCard } from "./RegionCard";
 // zoom imports removed — nav state drives UI now
 
@@ -65,6 +66,7 @@ function ExpandedDetailCard({ resort, onClick }) {
   const passLabel = p.pass === "Mountain Collective" ? "MC" : p.pass;
   const passLink = PASS_LINKS[p.pass];
   const snow = snowBySlug[p.slug];
+  const snowHistPct = useSnowPercentiles(resort, snow);
   const webcam = webcamBySlug[p.slug] || null;
 
   const location = [
@@ -113,12 +115,18 @@ function ExpandedDetailCard({ resort, onClick }) {
             <div className="text-center">
               <div className="text-sm font-bold text-sky-300">{Math.round(snow.snowfall_7d)}cm</div>
               <div className="text-[8px] text-sky-400/70 uppercase">7 day</div>
+              {snowHistPct?.snowfall_7d != null && (
+                <div className="text-[8px] text-sky-400/50" title="Percentile for this time of season">p{snowHistPct.snowfall_7d}</div>
+              )}
             </div>
           )}
           {snow.snow_depth > 0 && (
             <div className="text-center">
               <div className="text-sm font-bold text-slate-300">{Math.round(snow.snow_depth)}cm</div>
               <div className="text-[8px] text-slate-500 uppercase">base</div>
+              {snowHistPct?.snow_depth != null && (
+                <div className="text-[8px] text-slate-500/70" title="Percentile for this time of season">p{snowHistPct.snow_depth}</div>
+              )}
             </div>
           )}
           {snow.temperature !== null && snow.temperature !== undefined && (
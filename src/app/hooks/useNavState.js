@@ -25,15 +25,16 @@ export default function useNavState(resortCollection) {
   const region = useMapStore((s) => s.navRegion);
   const setNavRegion = useMapStore((s) => s.setNavRegion);
 
-  // On mount: if ?resort=slug exists, derive region from resort properties
+  // On mount: if ?resort=slug exists, derive region from resort properties.
+  // Resorts load in stages (see useResorts), so keep looking until it turns up.
   const didDeriveRef = useRef(false);
   useEffect(() => {
     if (didDeriveRef.current) return;
     if (!resort || !resortCollection) return;
-    didDeriveRef.current = true;
     const features = resortCollection.features || resortCollection;
     const found = features.find((f) => f.properties?.slug === resort);
     if (found) {
+      didDeriveRef.current = true;
       const regionId = found.properties?.region_id || found.properties?.region;
       if (regionId) setNavRegion(regionId);
     }
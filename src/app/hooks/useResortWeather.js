@@ -63,20 +63,35 @@ async function fetchBatchSnow(resorts) {
 
 /**
  * Load pre-fetched snow data from public/data/snow.json (built by CI).
- * Returns null if unavailable or stale.
+ *
+ * snow.json is columnar: values[field][j] belongs to the resort at position
+ * index[j] of snow-keys.json. Decodes it to { fetchedAt, fetchedAtISO, count, data } with
+ * one { slug, ...fields } record per fetched resort; names, coordinates and
+ * passes are joined from resorts.json by the caller.
+ * Returns null if unavailable; stale data is still returned as initial data.
  */
 async function loadPrefetchedSnow() {
   try {
     const basePath = process.env.NEXT_PUBLIC_BASE_PATH || '/skimail-mvp';
-    const res = await fetch(`${basePath}/data/snow.json`);
-    if (!res.ok) return null;
-    const json = await res.json();
+    const [snowRes, keysRes] = await Promise.all([
+      fetch(`${basePath}/data/snow.json`),
+      fetch(`${basePath}/data/snow-keys.json`),
+    ]);
+    if (!snowRes.ok || !keysRes.ok) return null;
+    const [json, { slugs }] = await Promise.all([snowRes.json(), keysRes.json()]);
+    const data = [];
+    json.index.forEach((i, j) => {
+      const record = { slug: slugs[i] };
+      for (const f of json.fields) record[f] = json.values[f][j];
+      data.push(record);
+    });
+    const decoded = { fetchedAt: json.fetchedAt, fetchedAtISO: json.fetchedAtISO, count: json.count, data };
     if (!json.fetchedAt || Date.now() - json.fetchedAt > PREFETCH_STALE_MS) {
       console.log('Pre-fetched snow data is stale, will refresh from API');
-      return json; // still return it as initial data even if stale
+      return decoded;
     }
     console.log(`Loaded pre-fetched snow data: ${json.count} resorts from ${json.fetchedAtISO}`);
-    return json;
+    return decoded;
   } catch {
     return null;
   }
@@ -162,10 +177,19 @@ export function useBatchSnowData(resorts, enabled = true, visibleSlugs = null) {
   const allData = useMemo(() => {
     const map = new Map();
 
-    // Seed with prefetch data
+    // Seed with prefetch data, joined to the resort it belongs to
     if (prefetchData?.data) {
+      const bySlug = new Map(resorts.map((r) => [r.properties.slug, r]));
       for (const d of prefetchData.data) {
-        map.set(d.slug, { ...d, fetchedAt: prefetchData.fetchedAt });
+        const resort = bySlug.get(d.slug);
+        if (!resort) continue;
+        map.set(d.slug, {
+          ...d,
+          name: resort.properties.name,
+          coordinates: resort.geometry.coordinates,
+          pass: resort.properties.pass,
+          fetchedAt: prefetchData.fetchedAt,
+        });
       }
     }
 
@@ -180,7 +204,7 @@ export function useBatchSnowData(resorts, enabled = true, visibleSlugs = null) {
 
     return Array.from(map.values());
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [prefetchData, queriesDataKey]);
+  }, [prefetchData, resorts, queriesDataKey]);
 
   const isLoading = !prefetchLoaded || queries.some((q) => q.isLoading);
 
@@ -0,0 +1,84 @@
+"use client";
+
+import { useState, useEffect, useMemo, useCallback } from "react";
+import { useQueryState } from "nuqs";
+import useMapStore from "../store/useMapStore";
+import { loadCore, loadResortsInBounds, loadAllResorts } from "../utils/resortShards";
+import { setPercentileResorts } from "../utils/percentiles";
+import regionsManifest from "../../../assets/regions.json";
+
+const regionBoundsById = {};
+regionsManifest.forEach((r) => {
+  if (r.bounds) regionBoundsById[r.id] = [r.bounds[0][0], r.bounds[0][1], r.bounds[1][0], r.bounds[1][1]];
+});
+
+/**
+ * useResorts — the resort FeatureCollection, loaded from the shards built by
+ * scripts/build_resort_shards.py instead of bundling assets/resorts.json.
+ *
+ * Pass resorts (core.json) load up front. Independent resorts are fetched
+ * only when something can show them:
+ *   - Independent toggle on → the shards under the map viewport and the nav region
+ *   - a search query, or ?resort= naming a resort outside the core → every shard
+ * Fetched independents are kept, so the collection only grows.
+ */
+export default function useResorts() {
+  const showIndependent = useMapStore((s) => s.showIndependent);
+  const mapBounds = useMapStore((s) => s.mapBounds);
+  const navRegion = useMapStore((s) => s.navRegion);
+  const searching = useMapStore((s) => Boolean((s.searchQuery || "").trim()));
+  const [resortSlug] = useQueryState("resort");
+
+  const [core, setCore] = useState(null);
+  const [independents, setIndependents] = useState(() => new Map()); // slug -> feature
+
+  useEffect(() => {
+    loadCore()
+      .then((collection) => {
+        setPercentileResorts(collection.features);
+        setCore(collection.features);
+      })
+      .catch((err) => console.error(err));
+  }, []);
+
+  const add = useCallback((features) => {
+    setIndependents((prev) => {
+      let next = null;
+      features.forEach((f) => {
+        const slug = f.properties.slug;
+        if (prev.has(slug)) return;
+        if (!next) next = new Map(prev);
+        next.set(slug, f);
+      });
+      return next || prev;
+    });
+  }, []);
+
+  const needAll =
+    searching ||
+    Boolean(resortSlug && core && !core.some((f) => f.properties.slug === resortSlug));
+
+  useEffect(() => {
+    if (!needAll) return;
+    loadAllResorts().then(add).catch((err) => console.error(err));
+  }, [needAll, add]);
+
+  useEffect(() => {
+    if (!showIndependent || !mapBounds) return;
+    loadResortsInBounds(mapBounds).then(add).catch((err) => console.error(err));
+  }, [showIndependent, mapBounds, add]);
+
+  const regionBounds = navRegion ? regionBoundsById[navRegion] : null;
+  useEffect(() => {
+    if (!showIndependent || !regionBounds) return;
+    loadResortsInBounds(regionBounds).then(add).catch((err) => console.error(err));
+  }, [showIndependent, regionBounds, add]);
+
+  return useMemo(
+    () => ({
+      type: "FeatureCollection",
+      features: core ? [...core, ...independents.values()] : [],
+    }),
+    [core, independents]
+  );
+}
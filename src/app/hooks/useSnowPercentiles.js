@@ -0,0 +1,33 @@
+"use client";
+
+import { useState, useEffect } from "react";
+import { getSnowPercentiles } from "../utils/percentiles";
+
+/**
+ * useSnowPercentiles — where a resort's current snow sits among its own
+ * history for this time of season: { snowfall_7d, snow_depth } percentiles,
+ * or null while loading, off-season, or without precomputed tables.
+ */
+export default function useSnowPercentiles(resort, snow) {
+  const [pct, setPct] = useState(null);
+  const slug = resort?.properties.slug;
+  const lat = resort?.geometry.coordinates[1];
+  const snowfall7d = snow?.snowfall_7d;
+  const snowDepth = snow?.snow_depth;
+
+  useEffect(() => {
+    setPct(null);
+    if (!slug || (snowfall7d == null && snowDepth == null)) return;
+    let cancelled = false;
+    getSnowPercentiles(slug, lat, { snowfall_7d: snowfall7d, snow_depth: snowDepth })
+      .then((result) => {
+        if (!cancelled) setPct(result);
+      })
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+    };
+  }, [slug, lat, snowfall7d, snowDepth]);
+
+  return pct;
+}
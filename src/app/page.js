@@ -6,7 +6,7 @@ import { MobileCarousel } from "./components/MobileCarousel.jsx";
 import QueryProvider from "./providers/QueryProvider.jsx";
 import useMapStore from "./store/useMapStore";
 import useNavState from "./hooks/useNavState";
-import resortCollection from "../../assets/resorts.json";
+import useResorts from "./hooks/useResorts";
 import regionsManifest from "../../assets/regions.json";
 
 /**
@@ -21,6 +21,8 @@ import regionsManifest from "../../assets/regions.json";
  * Camera follows nav state. No zoom-threshold UI logic.
  */
 function AppContent() {
+  // Pass resorts up front, independents as the view needs them (see useResorts).
+  const resortCollection = useResorts();
   const resorts = resortCollection.features;
   const nav = useNavState(resortCollection);
 
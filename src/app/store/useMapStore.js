@@ -101,6 +101,11 @@ const useMapStore = create(
       currentZoom: 1.2,
       setCurrentZoom: (z) => set({ currentZoom: z }),
 
+      // ── Map viewport [west, south, east, north] (set by MapExplore on moveEnd) ──
+      // Drives which resort shards useResorts fetches.
+      mapBounds: null,
+      setMapBounds: (b) => set({ mapBounds: b }),
+
       // ── Piste data for current detail resort ──
       pisteData: null,
       setPisteData: (d) => set({ pisteData: d }),
@@ -1,16 +1,21 @@
-import resortCollection from "../../../assets/resorts.json";
-
 const STATS = ["avg_snowfall", "vertical_drop", "skiable_acres"];
 
-// Precompute sorted arrays for each stat
+// Sorted arrays for each stat, filled by setPercentileResorts once the
+// resorts load (see hooks/useResorts.js).
 const sortedStats = {};
-STATS.forEach((stat) => {
-  const values = resortCollection.features
-    .map((f) => parseFloat(f.properties[stat]))
-    .filter((v) => !isNaN(v) && v > 0)
-    .sort((a, b) => a - b);
-  sortedStats[stat] = values;
-});
+
+/**
+ * Rank stats against these resorts. The pass resorts in core.json are enough:
+ * independents carry no avg_snowfall, vertical_drop or skiable_acres.
+ */
+export function setPercentileResorts(features) {
+  STATS.forEach((stat) => {
+    sortedStats[stat] = features
+      .map((f) => parseFloat(f.properties[stat]))
+      .filter((v) => !isNaN(v) && v > 0)
+      .sort((a, b) => a - b);
+  });
+}
 
 /**
  * Returns 0-100 percentile for a given stat and value.
@@ -30,3 +35,105 @@ export function getPercentile(stat, value) {
 }
 
 export { sortedStats };
+
+// Snow percentiles for the time of season, precomputed from archived history
+// by scripts/build_snow_percentiles.py. snow-percentiles.json holds the
+// layout and the table row of each snow-keys.json resort index; each row of
+// snow-percentiles.bin is days x fields x percentiles bytes, fetched on its
+// own with a Range request.
+
+const basePath = process.env.NEXT_PUBLIC_BASE_PATH || "/skimail-mvp";
+
+let snowIndexPromise = null;
+const snowRows = new Map(); // table row -> Promise<Uint8Array>
+let snowTable = null; // whole table, if the server ignored a Range request
+
+function fetchJson(file) {
+  return fetch(`${basePath}/data/${file}`).then((res) => {
+    if (!res.ok) throw new Error(`${file}: ${res.status}`);
+    return res.json();
+  });
+}
+
+/** Percentile index plus a slug -> resort index map. Resolves to null if not built. */
+export function loadSnowPercentiles() {
+  if (!snowIndexPromise) {
+    snowIndexPromise = Promise.all([fetchJson("snow-percentiles.json"), fetchJson("snow-keys.json")])
+      .then(([index, { slugs }]) => ({ ...index, keyIndex: new Map(slugs.map((s, i) => [s, i])) }))
+      .catch(() => null);
+  }
+  return snowIndexPromise;
+}
+
+function loadSnowRow(index, row) {
+  if (snowTable) return Promise.resolve(snowTable.subarray(row * index.rowBytes, (row + 1) * index.rowBytes));
+  if (!snowRows.has(row)) {
+    const start = row * index.rowBytes;
+    const promise = fetch(`${basePath}/data/snow-percentiles.bin?v=${index.version}`, {
+      headers: { Range: `bytes=${start}-${start + index.rowBytes - 1}` },
+    }).then(async (res) => {
+      if (!res.ok) throw new Error(`snow-percentiles.bin: ${res.status}`);
+      const bytes = new Uint8Array(await res.arrayBuffer());
+      if (res.status === 206) return bytes;
+      snowTable = bytes;
+      return bytes.subarray(start, start + index.rowBytes);
+    });
+    promise.catch(() => snowRows.delete(row));
+    snowRows.set(row, promise);
+  }
+  return snowRows.get(row);
+}
+
+/** Day of the season (0-based) for a date at latitude lat, or null outside the season. */
+export function dayOfSeason(index, lat, date = new Date()) {
+  const season = index.hemispheres[lat >= 0 ? "north" : "south"];
+  if (!season) return null;
+  const [month, day] = season.start.split("-").map(Number);
+  let year = date.getUTCFullYear();
+  if (Date.UTC(year, month - 1, day) > date.getTime()) year--;
+  const d = Math.floor((date.getTime() - Date.UTC(year, month - 1, day)) / 86400000);
+  return d < index.days ? d : null;
+}
+
+/**
+ * 0-100 percentile of value among the stored percentile points, linear
+ * between points. Ties resolve to the highest point the value reaches.
+ */
+function rank(points, qs, value) {
+  let i = -1;
+  while (i + 1 < points.length && points[i + 1] <= value) i++;
+  if (i < 0) return points[0] > 0 ? Math.round((qs[0] * value) / points[0]) : 0;
+  if (i === points.length - 1) {
+    const top = points[i];
+    return Math.round(qs[i] + (100 - qs[i]) * (top > 0 ? 1 - top / value : value > 0 ? 1 : 0));
+  }
+  const span = points[i + 1] - points[i];
+  return Math.round(qs[i] + ((qs[i + 1] - qs[i]) * (value - points[i])) / span);
+}
+
+/**
+ * Where a resort's snow values sit among its history for this time of
+ * season: { snowfall_7d, snow_depth } as 0-100 percentiles (null where no
+ * history). Resolves to null off-season or without a table.
+ */
+export async function getSnowPercentiles(slug, lat, snow, date = new Date()) {
+  const index = await loadSnowPercentiles();
+  const key = index?.keyIndex.get(slug);
+  const row = key === undefined ? -1 : index.rows[key];
+  if (row < 0) return null;
+  const day = dayOfSeason(index, lat, date);
+  if (day === null) return null;
+  const bytes = await loadSnowRow(index, row);
+  const nq = index.percentiles.length;
+  const result = {};
+  index.fields.forEach(({ name, scale }, f) => {
+    const offset = (day * index.fields.length + f) * nq;
+    const raw = bytes.subarray(offset, offset + nq);
+    const value = snow?.[name];
+    result[name] =
+      value == null || raw[0] === index.missing
+        ? null
+        : rank(Array.from(raw, (v) => v * scale), index.percentiles, value);
+  });
+  return result;
+}
@@ -0,0 +1,79 @@
+// Viewport loading for the resort shards built by scripts/build_resort_shards.py.
+//
+// public/data/resorts/manifest.json lists core.json (every pass resort) and
+// the quadtree shards of independents, each with the bbox of the resorts it
+// holds. Load the core once, then only the shards the viewport touches.
+
+const basePath = process.env.NEXT_PUBLIC_BASE_PATH || "/skimail-mvp";
+const shardUrl = (file) => `${basePath}/data/resorts/${file}`;
+
+const cache = new Map(); // file -> Promise<FeatureCollection>
+
+function loadFile(file, version) {
+  if (!cache.has(file)) {
+    const promise = fetch(`${shardUrl(file)}?v=${version}`).then((res) => {
+      if (!res.ok) throw new Error(`Resort shard ${file}: ${res.status}`);
+      return res.json();
+    });
+    // Let a failed fetch be retried on the next viewport change.
+    promise.catch(() => cache.delete(file));
+    cache.set(file, promise);
+  }
+  return cache.get(file);
+}
+
+let manifestPromise = null;
+
+export function loadManifest() {
+  if (!manifestPromise) {
+    manifestPromise = fetch(shardUrl("manifest.json")).then((res) => {
+      if (!res.ok) throw new Error(`Resort manifest: ${res.status}`);
+      return res.json();
+    });
+    manifestPromise.catch(() => {
+      manifestPromise = null;
+    });
+  }
+  return manifestPromise;
+}
+
+/** All pass resorts, as a FeatureCollection. */
+export async function loadCore() {
+  const manifest = await loadManifest();
+  return loadFile(manifest.core.file, manifest.version);
+}
+
+/**
+ * Whether [west, south, east, north] boxes overlap. A viewport crossing the
+ * antimeridian has west > east and is tested as its two halves.
+ */
+export function bboxIntersects(a, b) {
+  if (a[0] > a[2]) {
+    return bboxIntersects([a[0], a[1], 180, a[3]], b) || bboxIntersects([-180, a[1], a[2], a[3]], b);
+  }
+  return a[0] <= b[2] && b[0] <= a[2] && a[1] <= b[3] && b[1] <= a[3];
+}
+
+/** Manifest entries of the shards intersecting a [west, south, east, north] viewport. */
+export function shardsForBounds(manifest, bounds) {
+  return manifest.shards.filter((s) => bboxIntersects(bounds, s.bbox));
+}
+
+/**
+ * Independent resorts in the shards intersecting the viewport, as an array of
+ * features. Shards already fetched are served from memory.
+ */
+export async function loadResortsInBounds(bounds) {
+  const manifest = await loadManifest();
+  const collections = await Promise.all(
+    shardsForBounds(manifest, bounds).map((s) => loadFile(s.file, manifest.version)),
+  );
+  return collections.flatMap((c) => c.features);
+}
+
+/** Every independent resort, as an array of features. Used for search and deep links. */
+export async function loadAllResorts() {
+  const manifest = await loadManifest();
+  const collections = await Promise.all(manifest.shards.map((s) => loadFile(s.file, manifest.version)));
+  return collections.flatMap((c) => c.features);
+}